@@ -0,0 +1,160 @@
+"""Benchmarks for InventoryStore against synthetic inventories.
+
+Measures single-item insert and bulk import throughput and the queries the app runs: the
+snapshot the window's cache is built from (and its first page), search, statistics and upcoming
+expiries, then the in-memory cache and CSV export, at several table sizes.
+Results can be saved as a baseline and later runs compared against it:
+
+    python benchmarks/bench_inventory_store.py --sizes 1000,100000,1000000 --json baseline.json
+    python benchmarks/bench_inventory_store.py --compare baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_cache import InventoryCache
+from inventory_store import InventoryStore
+
+CATEGORIES = ["Dairy", "Vegetables", "Meat", "Grains", "Fruits", "Other"]
+WORDS = ["milk", "yoghurt", "cheese", "bread", "rice", "apple", "banana", "beef",
+         "chicken", "carrot", "potato", "onion", "butter", "pasta", "salmon", "spinach"]
+
+# A run slower than the baseline by more than this factor is a regression
+REGRESSION_FACTOR = 1.25
+
+
+def synthetic_rows(count, seed=42):
+    rng = random.Random(seed)
+    today = date.today()
+    for i in range(count):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+        expiry = today + timedelta(days=rng.randint(-30, 120))
+        notes = rng.choice(["", "", "opened", "for breakfast", "freezer", "use first"])
+        yield (name, rng.choice(CATEGORIES), expiry.isoformat(), notes)
+
+
+# Bulk load synthetic items, bypassing the per-item add path
+def populate(store, count):
+    with store.conn:
+        store.conn.executemany(
+            "INSERT INTO food_items (name, category, expiry_date, notes) VALUES (?, ?, ?, ?)",
+            synthetic_rows(count))
+
+
+# Milliseconds per call: (best, median) over `repeat` runs
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), statistics.median(timings)
+
+
+def run_size(size, repeat, inserts, workdir):
+    path = os.path.join(workdir, f"bench_{size}.db")
+    store = InventoryStore(path)
+    load_start = time.perf_counter()
+    populate(store, size)
+    load_seconds = time.perf_counter() - load_start
+
+    results = {}
+    expiry = date.today() + timedelta(days=10)
+
+    def add_items():
+        for i in range(inserts):
+            store.add_item(f"bench item {i}", "Dairy", expiry, "")
+
+    best, median = measure(add_items, 1)
+    results['insert_per_item'] = (best / inserts, median / inserts)
+
+    imports = inserts * 50
+    records = [(i, {'name': name, 'category': category, 'expiry_date': expiry_date, 'notes': notes})
+               for i, (name, category, expiry_date, notes) in enumerate(synthetic_rows(imports, seed=7))]
+
+    def bulk_import():
+        for _ in store.import_items(records):
+            pass
+
+    best, median = measure(bulk_import, 1)
+    results['import_per_item'] = (best / imports, median / imports)
+
+    results['first_page'] = measure(lambda: store.snapshot_rows(limit=100), repeat)
+    results['snapshot_rows'] = measure(store.snapshot_rows, max(1, repeat // 3))
+    results['search'] = measure(lambda: store.search_ids("yog", ranked=False), repeat)
+    results['statistics'] = measure(store.statistics, repeat)
+    results['upcoming_expiries'] = measure(store.upcoming_expiries, repeat)
+
+    # In-memory sorting and filtering as the GUI does it
+    def build_cache():
+        cache = InventoryCache(store.snapshot_rows())
+        cache.order("expiry_date")
+        return cache
+
+    results['cache_snapshot'] = measure(build_cache, max(1, repeat // 3))
+    cache = build_cache()
+    cache.order("name")
+    results['cache_sort_filter'] = measure(lambda: cache.ordered("name", "Dairy"), repeat)
+
+    export_path = os.path.join(workdir, f"export_{size}.csv")
+    results['export_csv'] = measure(lambda: store.export_csv(export_path), max(1, repeat // 3))
+
+    store.close()
+    os.remove(path)
+    os.remove(export_path)
+    return load_seconds, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000",
+                        help="comma-separated table sizes (default: 1000,100000)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query benchmark")
+    parser.add_argument("--inserts", type=int, default=200, help="single-item adds to time")
+    parser.add_argument("--json", help="write median timings to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    medians = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            load_seconds, results = run_size(size, args.repeat, args.inserts, workdir)
+            print(f"\n{size:,} rows (synthetic load {load_seconds:.1f}s)")
+            print(f"  {'benchmark':<24}{'best ms':>12}{'median ms':>12}")
+            for name, (best, median) in results.items():
+                print(f"  {name:<24}{best:>12.3f}{median:>12.3f}")
+            medians[str(size)] = {name: median for name, (best, median) in results.items()}
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(medians, file, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = 0
+        print(f"\nCompared with {args.compare}:")
+        for size, results in medians.items():
+            for name, median in results.items():
+                before = baseline.get(size, {}).get(name)
+                if not before:
+                    continue
+                ratio = median / before
+                flag = "  REGRESSION" if ratio > REGRESSION_FACTOR else ""
+                regressions += bool(flag)
+                print(f"  {size:>9} {name:<24}{before:>10.3f} -> {median:>10.3f} ms ({ratio:.2f}x){flag}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Maintenance run on a synthetic inventory while another station writes.
+
+Fills a temporary database, deletes part of it to leave free pages, then
+runs every maintenance step (backup, log pruning, ANALYZE, vacuum) while a
+writer process adds items as fast as it can. Prints the maintenance report
+and the writer's latency during the run, and fails if the backup is not
+intact or a write took longer than --max-write-ms:
+
+    python benchmarks/bench_maintenance.py --items 100000
+    python benchmarks/bench_maintenance.py --items 1000000 --max-write-ms 500
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_inventory_store import populate
+from db_maintenance import list_backups, run_maintenance
+from inventory_store import InventoryStore
+
+
+def writer(path, start_event, stop_event, results):
+    store = InventoryStore(path)
+    expiry = date.today() + timedelta(days=30)
+    latencies = []
+    errors = []
+    start_event.wait()
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        try:
+            store.add_item(f"writer item {len(latencies)}", "Dairy", expiry, "")
+        except sqlite3.Error as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - started)
+    store.close()
+    results.put((sorted(latencies), errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000, help="synthetic items in the test database")
+    parser.add_argument("--delete", type=float, default=0.3, help="share of the items deleted before the run")
+    parser.add_argument("--max-write-ms", type=float, help="fail when a write takes longer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "maintenance.db")
+        store = InventoryStore(path)
+        populate(store, args.items)
+        store.c.execute("SELECT id FROM food_items ORDER BY id DESC LIMIT ?", (int(args.items * args.delete),))
+        store.delete_items([row[0] for row in store.c.fetchall()])
+        # The first run rebuilds the file to turn on incremental vacuum
+        run_maintenance(store)
+
+        store.c.execute("SELECT id FROM food_items ORDER BY id DESC LIMIT ?", (int(args.items * args.delete / 2),))
+        store.delete_items([row[0] for row in store.c.fetchall()])
+
+        start_event = multiprocessing.Event()
+        stop_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=writer, args=(path, start_event, stop_event, results))
+        process.start()
+        start_event.set()
+        time.sleep(0.5)
+        started = time.perf_counter()
+        report = run_maintenance(store)
+        elapsed = time.perf_counter() - started
+        time.sleep(0.5)
+        stop_event.set()
+        latencies, errors = results.get()
+        process.join()
+
+        backup_path = list_backups(path, os.path.join(workdir, "backups"))[-1]
+        backup = sqlite3.connect(backup_path)
+        intact = backup.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        backup.close()
+        store.close()
+
+    print(f"Maintenance of {args.items:,} items in {elapsed:.2f}s")
+    print(f"{'step':<12}{'ms':>10}{'MB after':>10}  detail")
+    for step, seconds, file_bytes, detail in report:
+        print(f"{step:<12}{seconds * 1000:>10.1f}{file_bytes / 1e6:>10.1f}  {detail}")
+    worst_ms = latencies[-1] * 1000 if latencies else 0
+    print(f"Writer: {len(latencies)} writes, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, max {worst_ms:.1f} ms, {len(errors)} errors")
+
+    if not intact or errors or (args.max_write_ms is not None and worst_ms > args.max_write_ms):
+        print(f"FAILED: backup {'intact' if intact else 'damaged'}, {len(errors)} write errors, "
+              f"longest write {worst_ms:.0f} ms")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
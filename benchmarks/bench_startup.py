@@ -0,0 +1,98 @@
+"""Startup time of the tracker window on a synthetic inventory.
+
+Launches food_tracker_improved.py (a display is needed) on a temporary
+database with timings recorded to a JSON lines file, and reports how long
+after launch the event loop was running, the first rows were painted and
+the full list was loaded, as the median over several runs. Each run is
+stopped as soon as the full list is in:
+
+    python benchmarks/bench_startup.py --items 100000 --runs 5
+    python benchmarks/bench_startup.py --max-first-rows-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_inventory_store import populate
+from inventory_store import DEFAULT_DB_PATH, InventoryStore
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "food_tracker_improved.py")
+
+# Startup phases recorded by the app, in the order they happen
+MILESTONES = ["window", "first_rows", "all_rows"]
+
+
+# Seconds from launch to each milestone, read from the timings log
+def run_once(workdir, timeout):
+    log_path = os.path.join(workdir, "timings.jsonl")
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    env = dict(os.environ, FOOD_TRACKER_TIMINGS=log_path)
+    env.pop("FOOD_TRACKER_CPROFILE", None)
+
+    launched = time.time()
+    app = subprocess.Popen([sys.executable, APP], cwd=workdir, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    reached = {}
+    try:
+        deadline = time.time() + timeout
+        while "all_rows" not in reached:
+            if app.poll() is not None:
+                raise SystemExit(f"The app exited with code {app.returncode}:\n{app.stderr.read().decode()}")
+            if time.time() > deadline:
+                raise SystemExit(f"The list did not load within {timeout}s")
+            time.sleep(0.01)
+            if os.path.exists(log_path):
+                with open(log_path, encoding="utf-8") as log:
+                    for line in log:
+                        entry = json.loads(line)
+                        if entry['operation'] == "startup":
+                            reached[entry['phase']] = entry['time'] - launched
+    finally:
+        app.terminate()
+        app.wait()
+    return reached
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000, help="synthetic items in the test database")
+    parser.add_argument("--runs", type=int, default=5, help="launches to take the median of")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for each launch")
+    parser.add_argument("--max-first-rows-ms", type=float, help="fail when the first rows take longer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = InventoryStore(os.path.join(workdir, DEFAULT_DB_PATH))
+        populate(store, args.items)
+        store.close()
+
+        # An untimed first launch warms the file cache
+        run_once(workdir, args.timeout)
+        runs = [run_once(workdir, args.timeout) for _ in range(args.runs)]
+
+    print(f"Startup with {args.items:,} items, median of {args.runs} runs (ms after launch)")
+    medians = {}
+    for milestone in MILESTONES:
+        times = [run[milestone] * 1000 for run in runs if milestone in run]
+        if times:
+            medians[milestone] = statistics.median(times)
+            print(f"{milestone:<12}{medians[milestone]:>10.0f}{min(times):>10.0f} min{max(times):>10.0f} max")
+
+    if args.max_first_rows_ms is not None and medians.get("first_rows", float("inf")) > args.max_first_rows_ms:
+        print(f"FAILED: first rows after {medians.get('first_rows', float('inf')):.0f} ms "
+              f"(maximum {args.max_first_rows_ms:.0f} ms)")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
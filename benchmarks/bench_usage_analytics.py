@@ -0,0 +1,141 @@
+"""Usage analytics over a synthetic usage log of millions of events.
+
+Fills a temporary database with lots of many products and a year of
+consume, delete and add events, then times the first pass of
+update_daily_usage() over the whole log, an incremental pass over a batch
+of new events, and the rate and forecast queries:
+
+    python benchmarks/bench_usage_analytics.py --events 2000000 --products 5000
+    python benchmarks/bench_usage_analytics.py --batch 10000 --max-update-ms 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_inventory_store import CATEGORIES
+from inventory_store import LOG_INSERT_SQL, InventoryStore, epoch_day
+from usage_analytics import category_rates, lots_at_risk, order_suggestions, product_rates, project_lots
+
+# Event kinds and their share of the log
+ACTIONS = [("consume", 60), ("delete", 25), ("add", 15)]
+
+
+def product(n):
+    return f"product {n}", CATEGORIES[n % len(CATEGORIES)]
+
+
+# `count` usage_log rows for LOG_INSERT_SQL spread evenly over `days` days
+# ending at `end`, oldest first
+def synthetic_events(count, products, days, end, seed):
+    rng = random.Random(seed)
+    actions = rng.choices([action for action, _ in ACTIONS], [weight for _, weight in ACTIONS], k=count)
+    names = [product(n) for n in range(products)]
+    # ISO dates from a week before the first day to a month after the last,
+    # formatted once rather than per event
+    first = end - timedelta(days=days)
+    dates = [(first + timedelta(days=offset)).isoformat() for offset in range(-7, days + 31)]
+    for i in range(count):
+        seconds = i * days * 86400 // count
+        day, seconds = divmod(seconds, 86400)
+        name, category = names[int(rng.random() * products)]
+        stamp = f"{dates[day + 7]} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        yield (name, actions[i], stamp, category, None, 1 + int(rng.random() * 6),
+               dates[day + int(rng.random() * 38)])
+
+
+def add_events(store, events):
+    with store.conn:
+        store.conn.executemany(LOG_INSERT_SQL, events)
+
+
+def populate_lots(store, lots, products, seed=42):
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for _ in range(lots):
+        name, category = product(rng.randrange(products))
+        expiry = today + timedelta(days=rng.randint(-5, 60))
+        rows.append((name, category, expiry.isoformat(), "", rng.randint(1, 12)))
+    with store.conn:
+        store.conn.executemany("INSERT INTO food_items (name, category, expiry_date, notes, quantity) "
+                               "VALUES (?, ?, ?, ?, ?)", rows)
+
+
+# Milliseconds per call of fn(): (result of the last call, median, best)
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(times), min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000000, help="synthetic log events")
+    parser.add_argument("--products", type=int, default=5000, help="distinct products")
+    parser.add_argument("--lots", type=int, default=100000, help="lots in stock")
+    parser.add_argument("--days", type=int, default=365, help="days of history the events cover")
+    parser.add_argument("--batch", type=int, default=10000, help="new events for the incremental update")
+    parser.add_argument("--repeat", type=int, default=5, help="runs to take the median of")
+    parser.add_argument("--max-update-ms", type=float, help="fail when the incremental update takes longer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = InventoryStore(os.path.join(workdir, "analytics.db"))
+        today = date.today()
+        setup_started = time.perf_counter()
+        populate_lots(store, args.lots, args.products)
+        add_events(store, synthetic_events(args.events, args.products, args.days, today, seed=1))
+        print(f"{args.events:,} events, {args.products:,} products, {args.lots:,} lots "
+              f"(setup {time.perf_counter() - setup_started:.1f}s)")
+
+        started = time.perf_counter()
+        days_written = store.update_usage_analytics()
+        full_ms = (time.perf_counter() - started) * 1000
+        print(f"{'full update':<22}{full_ms:>10.0f} ms  {args.events / full_ms * 1000:>12,.0f} events/s  "
+              f"{days_written:,} product days")
+
+        # Each incremental run reads a fresh batch logged today
+        incremental = []
+        for run in range(args.repeat):
+            add_events(store, synthetic_events(args.batch, args.products, 1, today + timedelta(days=1),
+                                               seed=100 + run))
+            started = time.perf_counter()
+            store.update_usage_analytics()
+            incremental.append((time.perf_counter() - started) * 1000)
+        update_ms = statistics.median(incremental)
+        print(f"{'incremental update':<22}{update_ms:>10.1f} ms  {args.batch / update_ms * 1000:>12,.0f} events/s")
+        _, median, best = measure(store.update_usage_analytics, args.repeat)
+        print(f"{'no new events':<22}{median:>10.2f} ms  (best {best:.2f})")
+
+        day = epoch_day(today)
+        queries = [
+            ("category rates", lambda: len(category_rates(store.c, day))),
+            ("product rates", lambda: len(product_rates(store.c, day))),
+            ("lot projection", lambda: project_lots(store.c, store.expiry_day_sql, day)),
+            ("lots at risk", lambda: len(lots_at_risk(store.c))),
+            ("order suggestions", lambda: len(order_suggestions(store.c, day))),
+        ]
+        for label, query in queries:
+            rows, median, best = measure(query, args.repeat)
+            print(f"{label:<22}{median:>10.1f} ms  (best {best:.1f}){rows:>10,} rows")
+        store.close()
+
+    if args.max_update_ms is not None and update_ms > args.max_update_ms:
+        print(f"FAILED: incremental update took {update_ms:.0f} ms (maximum {args.max_update_ms:.0f} ms)")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Load test for inventory_server.py on localhost.
+
+Starts the server on a temporary database filled with synthetic items
+(or targets one already running with --port), then has concurrent
+keep-alive clients send a mix of page reads, item reads, conditional
+reads, writes and expiring/stats queries for a fixed time. Prints
+requests per second and latency percentiles per request kind, and fails
+on any error response or below --min-rps:
+
+    python benchmarks/load_test_server.py --items 100000 --clients 32 --seconds 10
+    python benchmarks/load_test_server.py --port 8080 --min-rps 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_inventory_store import CATEGORIES, populate
+from inventory_store import InventoryStore
+
+SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inventory_server.py")
+
+# Request kinds and their share of the traffic
+MIX = [
+    ("page", 40),
+    ("next_page", 15),
+    ("item", 15),
+    ("conditional_page", 10),
+    ("create", 8),
+    ("update", 5),
+    ("expiring", 4),
+    ("stats", 3),
+]
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=()):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        data = b"" if body is None else json.dumps(body).encode()
+        lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(data)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        length = int(response_headers.get('content-length', 0))
+        payload = json.loads(await self.reader.readexactly(length)) if length else None
+        return status, response_headers, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def client_loop(port, deadline, rng, results, known_ids):
+    client = Client(port)
+    kinds = [kind for kind, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    cursor = None
+    etag = None
+    expiry = date.today() + timedelta(days=10)
+    try:
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            headers = ()
+            if kind == "page" or (kind == "next_page" and cursor is None):
+                method, path, body = "GET", "/items?sort=expiry_date&limit=50", None
+            elif kind == "next_page":
+                method, path, body = "GET", f"/items?sort=expiry_date&limit=50&after={cursor}", None
+            elif kind == "conditional_page":
+                method, path, body = "GET", "/items?limit=50", None
+                if etag:
+                    headers = [("If-None-Match", etag)]
+            elif kind == "item":
+                method, path, body = "GET", f"/items/{rng.choice(known_ids)}", None
+            elif kind == "create":
+                method, path, body = "POST", "/items", {
+                    'name': f"load test {rng.randrange(10 ** 6)}", 'category': rng.choice(CATEGORIES),
+                    'expiry_date': expiry.isoformat(), 'notes': ""}
+            elif kind == "update":
+                method, path, body = "PUT", f"/items/{rng.choice(known_ids)}", {
+                    'name': f"updated {rng.randrange(10 ** 6)}", 'category': rng.choice(CATEGORIES),
+                    'expiry_date': expiry.isoformat(), 'notes': "load test"}
+            elif kind == "expiring":
+                method, path, body = "GET", "/expiring?days=1", None
+            else:
+                method, path, body = "GET", "/stats", None
+
+            started = time.perf_counter()
+            status, response_headers, payload = await client.request(method, path, body, headers)
+            results.append((kind, status, time.perf_counter() - started))
+
+            if kind in ("page", "next_page") and status == 200:
+                cursor = payload['next']
+            elif kind == "conditional_page" and status == 200:
+                etag = response_headers.get('etag')
+    finally:
+        client.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Server did not start on port {port}")
+
+
+async def run_clients(port, clients, seconds):
+    # Item reads and updates pick from the ids of the first page
+    client = Client(port)
+    status, _, payload = await client.request("GET", "/items?limit=500")
+    client.close()
+    known_ids = [item['id'] for item in payload['items']]
+    if not known_ids:
+        raise SystemExit("The inventory is empty")
+
+    results = []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(port, deadline, random.Random(n), results, known_ids)
+                           for n in range(clients)))
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000, help="synthetic items in the test database")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent connections")
+    parser.add_argument("--seconds", type=float, default=10, help="test duration")
+    parser.add_argument("--workers", type=int, default=4, help="server database threads")
+    parser.add_argument("--port", type=int, help="test a server already running on this port")
+    parser.add_argument("--min-rps", type=float, default=0, help="fail below this many requests per second")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        port = args.port
+        if port is None:
+            path = os.path.join(workdir, "load.db")
+            store = InventoryStore(path)
+            populate(store, args.items)
+            store.close()
+            port = free_port()
+            server = subprocess.Popen([sys.executable, SERVER, "--db", path, "--port", str(port),
+                                       "--workers", str(args.workers)], stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            results, elapsed = asyncio.run(run_clients(port, args.clients, args.seconds))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print(f"{args.clients} clients for {elapsed:.1f}s: {len(results)} requests, "
+          f"{len(results) / elapsed:,.0f} requests/s")
+    print(f"{'kind':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    errors = 0
+    for kind, _ in MIX:
+        timings = sorted(seconds * 1000 for k, _, seconds in results if k == kind)
+        if not timings:
+            continue
+        statuses = sorted({status for k, status, _ in results if k == kind})
+        errors += sum(1 for k, status, _ in results if k == kind and status >= 400)
+        print(f"{kind:<18}{len(timings):>8}{percentile(timings, 0.5):>10.2f}"
+              f"{percentile(timings, 0.95):>10.2f}{percentile(timings, 0.99):>10.2f}  {statuses}")
+
+    rps = len(results) / elapsed
+    if errors or rps < args.min_rps:
+        print(f"FAILED: {errors} error responses, {rps:,.0f} requests/s (minimum {args.min_rps:,.0f})")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
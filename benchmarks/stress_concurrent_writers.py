@@ -0,0 +1,104 @@
+"""Stress test: several processes writing to one database at the same time.
+
+Each writer process opens its own InventoryStore and adds, edits and deletes
+items in a loop, as a kitchen station would. The run fails if any write
+raised an error, such as "database is locked":
+
+    python benchmarks/stress_concurrent_writers.py --writers 8 --ops 500
+    python benchmarks/stress_concurrent_writers.py --journal-mode delete --busy-timeout 0
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_store import InventoryStore
+
+
+def writer(path, number, ops, settings, start_event, results):
+    store = InventoryStore(path, **settings)
+    expiry = date.today() + timedelta(days=number)
+    errors = []
+    added = 0
+    start_event.wait()
+    started = time.perf_counter()
+    for i in range(ops):
+        try:
+            item_id = store.add_item(f"station {number} item {i}", "Dairy", expiry, "")
+            added += 1
+            if i % 5 == 0:
+                store.update_item(item_id, f"station {number} item {i}", "Meat", expiry, "edited")
+            if i % 10 == 0:
+                store.delete_item(item_id, f"station {number} item {i}")
+                added -= 1
+        except sqlite3.Error as e:
+            errors.append(str(e))
+    results.put((number, added, time.perf_counter() - started, errors))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8, help="concurrent writer processes")
+    parser.add_argument("--ops", type=int, default=500, help="items added per writer")
+    parser.add_argument("--journal-mode", default="wal", help="journal mode (default: wal)")
+    parser.add_argument("--synchronous", default="normal", help="synchronous level (default: normal)")
+    parser.add_argument("--busy-timeout", type=int, default=5000, help="lock wait in milliseconds")
+    parser.add_argument("--db", help="database to write to (default: a temporary file)")
+    args = parser.parse_args()
+
+    settings = {'journal_mode': args.journal_mode, 'synchronous': args.synchronous,
+                'busy_timeout_ms': args.busy_timeout}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.db or os.path.join(workdir, "stress.db")
+        # Create the schema once so the writers do not race on migrations
+        InventoryStore(path, **settings).close()
+
+        start_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=writer,
+                                             args=(path, number, args.ops, settings, start_event, results))
+                     for number in range(args.writers)]
+        for process in processes:
+            process.start()
+
+        started = time.perf_counter()
+        start_event.set()
+        outcomes = sorted(results.get() for _ in processes)
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+
+        conn = sqlite3.connect(path)
+        rows = conn.execute("SELECT COUNT(*) FROM food_items").fetchone()[0]
+        logged = conn.execute("SELECT COUNT(*) FROM usage_log").fetchone()[0]
+        conn.close()
+
+    print(f"{args.writers} writers x {args.ops} adds, journal_mode={args.journal_mode}, "
+          f"synchronous={args.synchronous}, busy_timeout={args.busy_timeout}ms")
+    failures = 0
+    for number, added, seconds, errors in outcomes:
+        failures += len(errors)
+        print(f"  writer {number}: {added} items kept in {seconds:.2f}s, {len(errors)} errors")
+        for message in sorted(set(errors)):
+            print(f"    {errors.count(message)} x {message}")
+
+    expected = sum(added for _, added, _, _ in outcomes)
+    writes = args.writers * args.ops * (1 + 1 / 5 + 1 / 10)
+    print(f"Total: {writes / elapsed:,.0f} writes/s over {elapsed:.2f}s, "
+          f"{rows} rows ({expected} expected), {logged} log entries")
+    if failures or rows != expected:
+        print(f"FAILED: {failures} write errors")
+        sys.exit(1)
+    print("OK: no write errors")
+
+
+if __name__ == "__main__":
+    main()
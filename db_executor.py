@@ -0,0 +1,118 @@
+import queue
+import threading
+
+
+class Job:
+    __slots__ = ('fn', 'on_done', 'on_error', 'key')
+
+    def __init__(self, fn, on_done, on_error, key):
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+
+
+class DatabaseExecutor:
+    """Runs database work on one dedicated thread that owns the store.
+
+    Jobs are callables taking the store. Their results are handed back by
+    dispatch_completed(), which the GUI calls from its own thread, so
+    callbacks never run on the worker. A job submitted with a key replaces
+    a still-queued job with the same key, so a burst of refreshes or page
+    loads runs once, with the newest arguments. idle_task(store), if given,
+    runs whenever no job has arrived for idle_seconds.
+    """
+
+    def __init__(self, open_store, on_error=None, idle_task=None, idle_seconds=1.0):
+        self.open_store = open_store
+        self.default_on_error = on_error
+        self.idle_task = idle_task
+        self.idle_seconds = idle_seconds
+        self.store = None
+        self.startup_error = None
+        self.jobs = queue.Queue()
+        self.completed = queue.Queue()
+        self.pending = {}       # key -> job still waiting in the queue
+        self.outstanding = 0    # submitted jobs whose callback has not run
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="database", daemon=True)
+
+    # Start the worker and wait for the store to open. The store is returned
+    # so callers can read its settings; its methods must only be called
+    # through submit().
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        if self.startup_error is not None:
+            raise self.startup_error
+        return self.store
+
+    def run(self):
+        try:
+            self.store = self.open_store()
+        except Exception as e:
+            self.startup_error = e
+            return
+        finally:
+            self.ready.set()
+
+        while True:
+            try:
+                job = self.jobs.get(timeout=self.idle_seconds if self.idle_task else None)
+            except queue.Empty:
+                try:
+                    self.idle_task(self.store)
+                except Exception as e:
+                    print(f"Database idle task failed: {e}")
+                continue
+            if job is None:
+                break
+            with self.lock:
+                if self.pending.get(job.key) is job:
+                    del self.pending[job.key]
+            try:
+                result = job.fn(self.store)
+            except Exception as e:
+                self.completed.put((job.on_error or self.default_on_error, e))
+            else:
+                self.completed.put((job.on_done, result))
+        self.store.close()
+
+    def submit(self, fn, on_done=None, on_error=None, key=None):
+        with self.lock:
+            job = self.pending.get(key) if key is not None else None
+            if job is not None:
+                # Still queued: run the newest request in its place
+                job.fn = fn
+                job.on_done = on_done
+                job.on_error = on_error
+                return
+            job = Job(fn, on_done, on_error, key)
+            if key is not None:
+                self.pending[key] = job
+            self.outstanding += 1
+        self.jobs.put(job)
+
+    # Run the callbacks of finished jobs; call from the GUI thread
+    def dispatch_completed(self):
+        while True:
+            try:
+                callback, value = self.completed.get_nowait()
+            except queue.Empty:
+                return
+            with self.lock:
+                self.outstanding -= 1
+            if callback is not None:
+                callback(value)
+            elif isinstance(value, Exception):
+                print(f"Database error: {value}")
+
+    # True when no job is queued, running or waiting for its callback
+    def idle(self):
+        with self.lock:
+            return self.outstanding == 0
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
@@ -0,0 +1,149 @@
+"""Scheduled upkeep of the database file.
+
+A run takes an online backup, prunes the usage log, refreshes the query
+planner statistics and gives free pages back to the file system. The time
+each step took and the file size after it go to maintenance_log and are
+returned as the run's report. The app runs it in the background once
+MAINTENANCE_INTERVAL_HOURS have passed since the last run from any
+station; from a scheduled job:
+
+    python food_tracker_cli.py maintain --backup-dir backups
+    python food_tracker_cli.py maintain --if-due
+    python food_tracker_cli.py maintain --history
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from instrumentation import timings
+from inventory_store import ANALYZE_LIMIT
+
+MAINTENANCE_INTERVAL_HOURS = 24
+
+# Backups go to this directory next to the database, which keeps the
+# newest BACKUPS_KEPT of them
+BACKUP_DIR = "backups"
+BACKUPS_KEPT = 7
+
+# Log events pruned by apply_log_retention() are appended here, in the
+# backup directory
+LOG_ARCHIVE_NAME = "usage_log_archive.jsonl.gz"
+
+# How often the background thread checks whether a run is due
+MAINTENANCE_POLL_SECONDS = 3600
+
+
+def backup_dir_for(db_path, backup_dir=None):
+    return backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR)
+
+# Backups of the database in `backup_dir`, oldest first. The timestamp in
+# the name sorts them.
+def list_backups(db_path, backup_dir):
+    prefix = os.path.splitext(os.path.basename(db_path))[0] + "-"
+    if not os.path.isdir(backup_dir):
+        return []
+    return sorted(os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+                  if name.startswith(prefix) and name.endswith(".db"))
+
+def backup(store, backup_dir, keep, now):
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(store.path))[0]
+    target = os.path.join(backup_dir, f"{stem}-{now:%Y%m%d-%H%M%S}.db")
+    pages = store.backup(target)
+    removed = 0
+    for old in list_backups(store.path, backup_dir)[:-keep]:
+        os.remove(old)
+        removed += 1
+    return f"{os.path.basename(target)}, {pages} pages, {removed} old backups removed"
+
+def prune_log(store, today, archive_path):
+    return f"{store.apply_log_retention(today, archive_path=archive_path)} events archived and rolled up"
+
+def analyze(store):
+    store.analyze()
+    return f"up to {ANALYZE_LIMIT} rows sampled per index"
+
+def vacuum(store):
+    freed, rebuilt = store.incremental_vacuum()
+    if rebuilt:
+        return "rebuilt once to turn on incremental vacuum"
+    return f"{freed} free pages returned"
+
+# Run every step; returns the report as [(step, seconds, file bytes after,
+# detail)], the first row giving the size before the run. The run ends
+# early, between steps, once should_stop() returns true.
+def run_maintenance(store, backup_dir=None, keep=BACKUPS_KEPT, now=None, should_stop=None):
+    now = now or datetime.now()
+    run_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    backup_dir = backup_dir_for(store.path, backup_dir)
+    archive_path = os.path.join(backup_dir, LOG_ARCHIVE_NAME)
+
+    report = []
+    def record(step, seconds, detail):
+        row = (step, seconds, store.database_bytes(), detail)
+        store.record_maintenance(run_at, *row)
+        report.append(row)
+
+    record("start", 0.0, "")
+    steps = [
+        ("backup", lambda: backup(store, backup_dir, keep, now)),
+        ("prune_log", lambda: prune_log(store, now.date(), archive_path)),
+        ("analyze", lambda: analyze(store)),
+        ("vacuum", lambda: vacuum(store)),
+    ]
+    for step, run in steps:
+        if should_stop and should_stop():
+            break
+        started = time.perf_counter()
+        with timings.timer("maintenance", step):
+            detail = run()
+        record(step, time.perf_counter() - started, detail)
+    return report
+
+def maintenance_due(store, now=None, interval_hours=MAINTENANCE_INTERVAL_HOURS):
+    last = store.last_maintenance()
+    if last is None:
+        return True
+    return (now or datetime.now()) - datetime.strptime(last, "%Y-%m-%d %H:%M:%S") >= timedelta(hours=interval_hours)
+
+
+class MaintenanceScheduler:
+    """Runs maintenance on a background thread whenever it is due.
+
+    open_store is called on that thread for a store of its own, so backups
+    and vacuuming never hold up the window's database thread. Failures are
+    printed and retried at the next check.
+    """
+
+    def __init__(self, open_store, backup_dir=None, poll_seconds=MAINTENANCE_POLL_SECONDS):
+        self.open_store = open_store
+        self.backup_dir = backup_dir
+        self.poll_seconds = poll_seconds
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name="maintenance", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    # Waits for a run in progress to finish its current step
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread.ident is not None:
+            self.thread.join()
+
+    def run(self):
+        store = self.open_store()
+        try:
+            while not self.stopping:
+                try:
+                    if maintenance_due(store):
+                        run_maintenance(store, self.backup_dir, should_stop=lambda: self.stopping)
+                except (sqlite3.Error, OSError) as e:
+                    print(f"Database maintenance failed: {e}")
+                self.wakeup.wait(self.poll_seconds)
+        finally:
+            store.close()
@@ -0,0 +1,256 @@
+"""Background expiry notifications, batched into one digest per category.
+
+Upcoming threshold crossings (an item starting to expire soon, an item
+expiring) are kept in a heap ordered by time, and the notifier thread
+sleeps until the next one, the next midnight or the next check for changes
+made by other connections, whichever comes first. Run on its own, without
+the GUI:
+
+    python expiry_notifier.py --db food_database.db
+    python expiry_notifier.py --once
+"""
+import argparse
+import heapq
+import threading
+from datetime import datetime, time, timedelta
+
+from inventory_store import DEFAULT_DB_PATH, EXPIRING_SOON_DAYS, InventoryStore
+
+# Items expiring this many days beyond the "soon" window are scheduled too;
+# the window is reloaded every midnight
+SCHEDULE_HORIZON_DAYS = 7
+
+# How often to look for changes made by other connections or stations
+DATA_POLL_SECONDS = 30
+
+# Rate limit: at most one round of digests per interval, and at most this
+# many notifications per round (the rest are summed up in the last one)
+DIGEST_MIN_INTERVAL_SECONDS = 60
+MAX_DIGESTS_PER_ROUND = 6
+DIGEST_NAMES_SHOWN = 5
+
+STATUS_TEXT = {
+    'expired': "expired",
+    'soon': "expiring soon",
+    'invalid': "with an invalid expiry date",
+}
+
+def midnight(day):
+    return datetime.combine(day, time())
+
+# Alert status of an item from its days left, None while it is still fresh
+def alert_status(days_left, soon_days=EXPIRING_SOON_DAYS):
+    if days_left is None:
+        return 'invalid'
+    if days_left < 0:
+        return 'expired'
+    if days_left <= soon_days:
+        return 'soon'
+    return None
+
+# Alerts as (category, status, name, expiry_date) for rows from
+# InventoryStore.upcoming_expiries()
+def expiry_alerts(rows, soon_days=EXPIRING_SOON_DAYS):
+    alerts = []
+    for item_id, name, category, expiry_date, days_left in rows:
+        status = alert_status(days_left, soon_days)
+        if status:
+            alerts.append((category or "Other", status, name, expiry_date))
+    return alerts
+
+# One (title, message) per category, at most max_digests of them
+def digest_messages(alerts, max_digests=MAX_DIGESTS_PER_ROUND):
+    by_category = {}
+    for category, status, name, expiry_date in alerts:
+        by_category.setdefault(category, {}).setdefault(status, []).append(name)
+
+    messages = []
+    categories = sorted(by_category)
+    if len(categories) > max_digests:
+        # Leave room for the summary of the rest
+        shown_categories, rest = categories[:max_digests - 1], categories[max_digests - 1:]
+    else:
+        shown_categories, rest = categories, []
+    for category in shown_categories:
+        lines = []
+        for status, text in STATUS_TEXT.items():
+            names = by_category[category].get(status)
+            if not names:
+                continue
+            shown = ", ".join(names[:DIGEST_NAMES_SHOWN])
+            if len(names) > DIGEST_NAMES_SHOWN:
+                shown += f" and {len(names) - DIGEST_NAMES_SHOWN} more"
+            lines.append(f"{len(names)} {text}: {shown}")
+        messages.append((f"Food Expiry Alert: {category}", "\n".join(lines)))
+
+    if rest:
+        count = sum(len(names) for category in rest for names in by_category[category].values())
+        messages.append(("Food Expiry Alert",
+                         f"{count} more items need attention in {', '.join(rest)}"))
+    return messages
+
+
+class ExpiryScheduler:
+    """Heap of upcoming expiry thresholds and the alerts already given.
+
+    load() replaces the schedule from fresh rows and returns alerts for
+    items that are already past a threshold; due() pops and returns the
+    alerts whose time has come. An item is alerted once per status and
+    expiry date, so reloading does not repeat alerts.
+    """
+
+    def __init__(self, soon_days=EXPIRING_SOON_DAYS):
+        self.soon_days = soon_days
+        self.heap = []          # (when, item id, category, status, name, expiry_date)
+        self.notified = {}      # item id -> (expiry_date, status) last alerted
+
+    # rows from InventoryStore.upcoming_expiries() as of `today`
+    def load(self, rows, today):
+        heap = []
+        alerts = []
+        notified = {}
+        for item_id, name, category, expiry_date, days_left in rows:
+            category = category or "Other"
+            status = alert_status(days_left, self.soon_days)
+            if status:
+                if self.notified.get(item_id) != (expiry_date, status):
+                    alerts.append((category, status, name, expiry_date))
+                notified[item_id] = (expiry_date, status)
+            if days_left is None or days_left < 0:
+                continue
+            expiry = today + timedelta(days=days_left)
+            if status is None:
+                heap.append((midnight(expiry - timedelta(days=self.soon_days)),
+                             item_id, category, 'soon', name, expiry_date))
+            heap.append((midnight(expiry + timedelta(days=1)), item_id, category, 'expired', name, expiry_date))
+
+        # Items no longer listed were deleted or moved out of the window
+        self.notified = notified
+        heapq.heapify(heap)
+        self.heap = heap
+        return alerts
+
+    def due(self, now):
+        alerts = []
+        while self.heap and self.heap[0][0] <= now:
+            when, item_id, category, status, name, expiry_date = heapq.heappop(self.heap)
+            if self.notified.get(item_id) != (expiry_date, status):
+                self.notified[item_id] = (expiry_date, status)
+                alerts.append((category, status, name, expiry_date))
+        return alerts
+
+    def next_time(self):
+        return self.heap[0][0] if self.heap else None
+
+
+class ExpiryNotifier:
+    """Runs an ExpiryScheduler on a background thread.
+
+    open_store is called on that thread for a store of its own; send(title,
+    message) delivers one digest notification and may be called from it.
+    """
+
+    def __init__(self, open_store, send, soon_days=EXPIRING_SOON_DAYS,
+                 min_interval=DIGEST_MIN_INTERVAL_SECONDS, clock=datetime.now):
+        self.open_store = open_store
+        self.send = send
+        self.soon_days = soon_days
+        self.min_interval = timedelta(seconds=min_interval)
+        self.clock = clock
+        self.scheduler = ExpiryScheduler(soon_days)
+        self.pending = []       # alerts held back by the rate limit
+        self.last_sent = None
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name="expiry-notifier", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread.ident is not None:
+            self.thread.join()
+
+    def run(self):
+        store = self.open_store()
+        try:
+            # The schedule is reloaded each day and whenever the items
+            # change, from this process or any other
+            loaded_day = loaded_version = None
+            while not self.stopping:
+                now = self.clock()
+                version = store.inventory_version()
+                if now.date() != loaded_day or version != loaded_version:
+                    loaded_day, loaded_version = now.date(), version
+                    rows = store.upcoming_expiries(loaded_day, self.soon_days + SCHEDULE_HORIZON_DAYS)
+                    self.pending.extend(self.scheduler.load(rows, loaded_day))
+                self.pending.extend(self.scheduler.due(now))
+                next_send = self.flush(now)
+
+                wake_times = [midnight(now.date() + timedelta(days=1)),
+                              now + timedelta(seconds=DATA_POLL_SECONDS)]
+                for when in (self.scheduler.next_time(), next_send):
+                    if when is not None:
+                        wake_times.append(when)
+                self.wakeup.wait(max(0.0, (min(wake_times) - now).total_seconds()))
+                self.wakeup.clear()
+        finally:
+            store.close()
+
+    # Send the pending alerts unless the rate limit holds them back; returns
+    # when they may be sent, or None if nothing is waiting
+    def flush(self, now):
+        if not self.pending:
+            return None
+        if self.last_sent is not None and now - self.last_sent < self.min_interval:
+            return self.last_sent + self.min_interval
+        alerts, self.pending = self.pending, []
+        self.last_sent = now
+        for title, message in digest_messages(alerts):
+            try:
+                self.send(title, message)
+            except Exception as e:
+                print(f"Could not show notification: {e}")
+        return None
+
+
+# Desktop notification through plyer, or a printed line where it is missing
+def send_notification(title, message):
+    try:
+        from plyer import notification
+    except ImportError:
+        print(f"{title}\n{message}\n")
+        return
+    notification.notify(title=title, message=message, timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file")
+    parser.add_argument("--once", action="store_true", help="send the current digest and exit")
+    parser.add_argument("--print", action="store_true", help="print digests instead of notifying")
+    args = parser.parse_args()
+
+    send = (lambda title, message: print(f"{title}\n{message}\n")) if args.print else send_notification
+    if args.once:
+        store = InventoryStore(args.db)
+        try:
+            rows = store.upcoming_expiries()
+        finally:
+            store.close()
+        for title, message in digest_messages(expiry_alerts(rows)):
+            send(title, message)
+        return
+
+    notifier = ExpiryNotifier(lambda: InventoryStore(args.db), send)
+    notifier.start()
+    try:
+        notifier.thread.join()
+    except KeyboardInterrupt:
+        notifier.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Food inventory from the command line, for scripts and scheduled jobs.
+
+Needs no display: tkinter is never imported, and plyer only when
+`expiring --notify` shows a notification. Add --json to print JSON for
+piping into other tools:
+
+    python food_tracker_cli.py add "Greek yoghurt" 2025-07-01 --category Dairy --quantity 6
+    python food_tracker_cli.py consume "Greek yoghurt" 2 --category Dairy
+    python food_tracker_cli.py products --category Dairy
+    python food_tracker_cli.py list --category Dairy --sort name --search yog
+    python food_tracker_cli.py expiring --days 7 --json
+    python food_tracker_cli.py import items.csv
+    python food_tracker_cli.py export inventory.csv.gz
+    python food_tracker_cli.py stats
+    python food_tracker_cli.py forecast --horizon 14
+    python food_tracker_cli.py vacuum
+    python food_tracker_cli.py maintain --if-due
+"""
+import argparse
+import contextlib
+import json
+import sqlite3
+import sys
+
+from db_maintenance import BACKUPS_KEPT, maintenance_due, run_maintenance
+from expiry_notifier import alert_status, digest_messages, expiry_alerts, send_notification
+from inventory_store import (DEFAULT_DB_PATH, EXPIRING_SOON_DAYS, InventoryStore, parse_expiry_date,
+                             read_import_file)
+from usage_analytics import ORDER_HORIZON_DAYS, RATE_WINDOW_DAYS
+
+ITEM_FIELDS = ['id', 'name', 'category', 'expiry_date', 'notes', 'quantity', 'status']
+PRODUCT_FIELDS = ['name', 'category', 'quantity', 'lots', 'first_expiry_date']
+EXPIRING_FIELDS = ['id', 'name', 'category', 'expiry_date', 'days_left', 'status']
+# usage_forecast() sections, their titles and fields
+FORECAST_SECTIONS = [
+    ('categories', "Consumption and waste by category (units per day)",
+     ['category', 'consumed_per_day', 'wasted_per_day', 'waste_share']),
+    ('products', "Consumption and waste by product (units per day)",
+     ['name', 'category', 'consumed_per_day', 'wasted_per_day', 'waste_share']),
+    ('at_risk', "Likely to expire before they are used",
+     ['id', 'name', 'category', 'expiry_date', 'quantity', 'expected_unused']),
+    ('orders', "Suggested orders",
+     ['name', 'category', 'used_per_day', 'in_stock', 'order']),
+]
+MAINTENANCE_FIELDS = ['step', 'seconds', 'file_bytes', 'detail']
+IMPORT_ERRORS_SHOWN = 10
+
+
+# Messages the store prints while opening (schema upgrades and the like)
+# go to stderr, so they never end up in piped output
+def open_store(path):
+    with contextlib.redirect_stdout(sys.stderr):
+        return InventoryStore(path)
+
+# dumps() rather than dump(), which always takes the slow pure Python encoder
+def print_json(data):
+    sys.stdout.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+# Rows as aligned columns under a header
+def print_table(fields, rows):
+    rows = [["" if value is None else str(value) for value in row] for row in rows]
+    widths = [max([len(field)] + [len(row[i]) for row in rows]) for i, field in enumerate(fields)]
+    for row in [fields] + rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+def print_rows(args, fields, rows):
+    if args.json:
+        print_json([dict(zip(fields, row)) for row in rows])
+    elif rows:
+        print_table(fields, rows)
+    else:
+        print("No items")
+
+
+def cmd_add(store, args):
+    item_id = store.add_item(args.name, args.category, args.expiry_date, args.notes, args.quantity)
+    if args.json:
+        print_json({'id': item_id})
+    else:
+        print(f"Added item {item_id}")
+    return 0
+
+def cmd_consume(store, args):
+    try:
+        rows, deleted_ids = store.consume(args.name, args.category, args.units)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print_json({'lots': [{'id': row[0], 'quantity': row[5]} for row in rows], 'deleted': deleted_ids})
+    else:
+        print(f"Took {args.units} of {args.name}: {len(deleted_ids)} lots used up"
+              + "".join(f", lot {row[0]} has {row[5]} left" for row in rows))
+    return 0
+
+def cmd_products(store, args):
+    rows, _ = store.product_summaries(args.category, args.search, limit=args.limit)
+    print_rows(args, PRODUCT_FIELDS, rows)
+    return 0
+
+def cmd_import(store, args):
+    read = imported = 0
+    errors = []
+    for read, imported, errors in store.import_items(read_import_file(args.file)):
+        pass
+    if args.json:
+        print_json({'read': read, 'imported': imported,
+                    'errors': [{'line': line, 'error': message} for line, message in errors]})
+    else:
+        print(f"Imported {imported} of {read} records")
+        for line_number, message in errors[:IMPORT_ERRORS_SHOWN]:
+            print(f"  line {line_number}: {message}", file=sys.stderr)
+        if len(errors) > IMPORT_ERRORS_SHOWN:
+            print(f"  ... and {len(errors) - IMPORT_ERRORS_SHOWN} more", file=sys.stderr)
+    return 1 if errors else 0
+
+def cmd_list(store, args):
+    rows = store.list_items(args.category, args.sort, args.search, args.status, args.desc, args.limit)
+    print_rows(args, ITEM_FIELDS, rows)
+    return 0
+
+def cmd_expiring(store, args):
+    rows = store.upcoming_expiries(days=args.days)
+    rows.sort(key=lambda row: (row[4] is not None, row[4] or 0, row[0]))
+    # Items beyond the usual soon window but within --days are still fresh
+    print_rows(args, EXPIRING_FIELDS, [row + (alert_status(row[4]) or 'fresh',) for row in rows])
+    if args.notify:
+        for title, message in digest_messages(expiry_alerts(rows)):
+            send_notification(title, message)
+    return 0
+
+def cmd_stats(store, args):
+    stats = store.statistics()
+    if args.json:
+        print_json({
+            'total': stats['total'],
+            'expired': stats['expired'],
+            'soon': stats['soon'],
+            'categories': dict(stats['categories']),
+            'actions': dict(stats['actions']),
+        })
+        return 0
+    print(f"Total items: {stats['total']}")
+    print(f"Expired: {stats['expired']}")
+    print(f"Expiring soon: {stats['soon']}")
+    print("\nBy category:")
+    for category, count in stats['categories']:
+        print(f"  {category}: {count}")
+    print("\nMost common actions:")
+    for action, count in stats['actions']:
+        print(f"  {action}: {count}")
+    return 0
+
+def cmd_forecast(store, args):
+    forecast = store.usage_forecast(window_days=args.window, horizon_days=args.horizon, limit=args.limit)
+    if args.json:
+        print_json({key: [dict(zip(fields, row)) for row in forecast[key]]
+                    for key, _, fields in FORECAST_SECTIONS})
+        return 0
+    print(f"Over the last {args.window} days, orders to last {args.horizon} days")
+    for key, title, fields in FORECAST_SECTIONS:
+        print(f"\n{title}:")
+        rows = [[round(value, 2) if isinstance(value, float) else value for value in row] for row in forecast[key]]
+        if rows:
+            print_table(fields, rows)
+        else:
+            print("  None")
+    return 0
+
+def cmd_export(store, args):
+    written = store.export_csv(args.file)
+    if args.json:
+        print_json({'file': args.file, 'rows': written})
+    else:
+        print(f"Exported {written} items to {args.file}")
+    return 0
+
+def cmd_vacuum(store, args):
+    before, after = store.vacuum()
+    if args.json:
+        print_json({'bytes_before': before, 'bytes_after': after})
+    else:
+        print(f"Database file: {before:,} bytes before, {after:,} bytes after")
+    return 0
+
+def cmd_maintain(store, args):
+    if args.history:
+        rows = store.maintenance_history(args.history)
+        fields = ['run_at'] + MAINTENANCE_FIELDS
+    elif args.if_due and not maintenance_due(store):
+        rows, fields = [], MAINTENANCE_FIELDS
+    else:
+        rows = run_maintenance(store, args.backup_dir, args.keep)
+        fields = MAINTENANCE_FIELDS
+    if args.json:
+        print_json([dict(zip(fields, row)) for row in rows])
+    elif rows:
+        print_table(fields, [[round(value, 3) if isinstance(value, float) else value for value in row]
+                             for row in rows])
+    else:
+        print("Not due yet" if args.if_due else "No maintenance runs yet")
+    return 0
+
+
+def expiry_date_arg(text):
+    try:
+        return parse_expiry_date(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {text!r}, expected YYYY-MM-DD")
+
+def positive_int(text):
+    if not text.isdigit() or int(text) < 1:
+        raise argparse.ArgumentTypeError(f"invalid count {text!r}, expected a whole number of at least 1")
+    return int(text)
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=DEFAULT_DB_PATH, help="database file")
+    common.add_argument("--json", action="store_true", help="print JSON")
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    add = commands.add_parser("add", parents=[common], help="add an item")
+    add.add_argument("name")
+    add.add_argument("expiry_date", type=expiry_date_arg, help="YYYY-MM-DD")
+    add.add_argument("--category", default="Other")
+    add.add_argument("--notes", default="")
+    add.add_argument("--quantity", type=positive_int, default=1, help="units in this lot (default: 1)")
+    add.set_defaults(run=cmd_add)
+
+    consume = commands.add_parser("consume", parents=[common], help="take units of a product, soonest expiry first")
+    consume.add_argument("name")
+    consume.add_argument("units", type=positive_int)
+    consume.add_argument("--category", default="Other")
+    consume.set_defaults(run=cmd_consume)
+
+    products = commands.add_parser("products", parents=[common], help="quantities per product, over all its lots")
+    products.add_argument("--category", help="only this category")
+    products.add_argument("--search", help="text the name must contain")
+    products.add_argument("--limit", type=int, help="at most this many products")
+    products.set_defaults(run=cmd_products)
+
+    import_ = commands.add_parser("import", parents=[common], help="add items from a CSV or JSON lines file")
+    import_.add_argument("file")
+    import_.set_defaults(run=cmd_import)
+
+    list_ = commands.add_parser("list", parents=[common], help="list items")
+    list_.add_argument("--category", help="only this category")
+    list_.add_argument("--status", choices=["expired", "soon", "fresh"], help="only items with this status")
+    list_.add_argument("--search", help="words to search names and notes for")
+    list_.add_argument("--sort", default="expiry_date", choices=["expiry_date", "name", "category"])
+    list_.add_argument("--desc", action="store_true", help="reverse the sort order")
+    list_.add_argument("--limit", type=int, help="at most this many items")
+    list_.set_defaults(run=cmd_list)
+
+    expiring = commands.add_parser("expiring", parents=[common], help="items expired or expiring soon")
+    expiring.add_argument("--days", type=int, default=EXPIRING_SOON_DAYS,
+                          help=f"days ahead to include (default: {EXPIRING_SOON_DAYS})")
+    expiring.add_argument("--notify", action="store_true", help="also show desktop notifications")
+    expiring.set_defaults(run=cmd_expiring)
+
+    stats = commands.add_parser("stats", parents=[common], help="inventory statistics")
+    stats.set_defaults(run=cmd_stats)
+
+    forecast = commands.add_parser("forecast", parents=[common],
+                                   help="consumption and waste rates, likely waste and suggested orders")
+    forecast.add_argument("--window", type=positive_int, default=RATE_WINDOW_DAYS,
+                          help=f"days of history the rates cover (default: {RATE_WINDOW_DAYS})")
+    forecast.add_argument("--horizon", type=positive_int, default=ORDER_HORIZON_DAYS,
+                          help=f"days the suggested orders should last (default: {ORDER_HORIZON_DAYS})")
+    forecast.add_argument("--limit", type=int, default=50, help="at most this many products and lots")
+    forecast.set_defaults(run=cmd_forecast)
+
+    export = commands.add_parser("export", parents=[common], help="export every item to CSV (.csv.gz to compress)")
+    export.add_argument("file")
+    export.set_defaults(run=cmd_export)
+
+    vacuum = commands.add_parser("vacuum", parents=[common], help="compact the database file")
+    vacuum.set_defaults(run=cmd_vacuum)
+
+    maintain = commands.add_parser("maintain", parents=[common],
+                                   help="back up, prune the log, analyze and vacuum, with a report")
+    maintain.add_argument("--backup-dir", help="where backups and the log archive go "
+                                               "(default: backups next to the database)")
+    maintain.add_argument("--keep", type=positive_int, default=BACKUPS_KEPT,
+                          help=f"backups to keep (default: {BACKUPS_KEPT})")
+    maintain.add_argument("--if-due", action="store_true", help="only run if the last run is a day old")
+    maintain.add_argument("--history", type=positive_int, metavar="RUNS", help="show the last RUNS reports instead")
+    maintain.set_defaults(run=cmd_maintain)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        store = open_store(args.db)
+    except sqlite3.Error as e:
+        print(f"Error: could not open {args.db}: {e}", file=sys.stderr)
+        return 1
+    try:
+        return args.run(store, args)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,52 +1,39 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog, simpledialog
-from datetime import datetime, timedelta
-from plyer import notification
-import random
-import sqlite3
-import csv
-import os
-
-# Database setup
-conn = sqlite3.connect('food_database.db')
-c = conn.cursor()
-
-# Check existing schema and add missing columns if needed
-c.execute("PRAGMA table_info(food_items)")
-columns = [column[1] for column in c.fetchall()]
-
-# Create tables if they don't exist
-c.execute('''CREATE TABLE IF NOT EXISTS food_items
-             (id INTEGER PRIMARY KEY, name TEXT, expiry_date DATE)''')
-
-# Add category column if it doesn't exist
-if 'category' not in columns:
-    try:
-        c.execute("ALTER TABLE food_items ADD COLUMN category TEXT DEFAULT 'Other'")
-        print("Added 'category' column to existing database")
-    except sqlite3.Error as e:
-        print(f"Error adding category column: {e}")
+import threading
+from datetime import date
+from db_executor import DatabaseExecutor
+from db_maintenance import MaintenanceScheduler
+from expiry_notifier import ExpiryNotifier, digest_messages, expiry_alerts, send_notification
+from inventory_cache import BULK_CHANGE_ITEMS, SORT_KEYS, InventoryCache
+from inventory_store import (EXPIRING_SOON_DAYS, ConnectionPool, InventoryStore, epoch_day, export_items,
+                             parse_expiry_date, read_import_file)
+from instrumentation import profiler_from_env, timings
+from usage_analytics import ORDER_HORIZON_DAYS, RATE_WINDOW_DAYS
 
-# Add notes column if it doesn't exist
-if 'notes' not in columns:
-    try:
-        c.execute("ALTER TABLE food_items ADD COLUMN notes TEXT")
-        print("Added 'notes' column to existing database")
-    except sqlite3.Error as e:
-        print(f"Error adding notes column: {e}")
+# Whole-session cProfile dump when FOOD_TRACKER_CPROFILE is set, covering
+# the Tk thread and the database thread from the moment each starts
+profiler = profiler_from_env()
+if profiler:
+    profiler.enable()
 
-# Create usage_log table if it doesn't exist
-c.execute('''CREATE TABLE IF NOT EXISTS usage_log
-             (id INTEGER PRIMARY KEY, item_name TEXT, action TEXT, timestamp TEXT)''')
+def open_store():
+    if profiler:
+        profiler.enable()
+    return InventoryStore()
 
-conn.commit()
+# Database setup: the store and its connection live on the database thread.
+# Handlers submit work to it and get their results back on the Tk thread;
+# `store` is only read here for its settings.
+# Buffered usage log events are written whenever the thread is idle.
+db = DatabaseExecutor(open_store, idle_task=lambda s: s.flush_usage_log(due_only=True))
+store = db.start()
 
-# Define log_usage
-def log_usage(item_name, action):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO usage_log (item_name, action, timestamp) VALUES (?, ?, ?)",
-              (item_name, action, timestamp))
-    conn.commit()
+# Connections for work that runs outside the database thread, like exports
+pool = ConnectionPool(store.path)
 
 # GUI setup
 root = tk.Tk()
@@ -84,6 +71,214 @@ def setup_styles():
     
     return bg, fg, button_bg
 
+# Results of database jobs are dispatched from the event loop, which is
+# polled only while jobs are outstanding
+DB_POLL_MS = 15
+db_poll_state = {'after_id': None}
+
+def poll_database():
+    db_poll_state['after_id'] = None
+    db.dispatch_completed()
+    if not db.idle():
+        db_poll_state['after_id'] = root.after(DB_POLL_MS, poll_database)
+
+# Queue fn(store) on the database thread; on_done/on_error run on the Tk thread.
+# Work submitted with a key replaces queued work with the same key.
+def run_db(fn, on_done=None, on_error=None, key=None):
+    db.submit(fn, on_done, on_error, key)
+    if db_poll_state['after_id'] is None:
+        db_poll_state['after_id'] = root.after(DB_POLL_MS, poll_database)
+
+def show_load_error(e):
+    messagebox.showerror("Database Error", f"Error loading data: {e}\n\nPlease restart the application.")
+
+# Every item is held in an InventoryCache: sorting, filtering and scrolling
+# read it instead of SQLite, and each add, edit or delete updates it. The
+# snapshot is read again after imports and when another connection (another
+# station, say) has changed the items.
+CACHE_CHECK_MS = 5000
+
+cache_state = {
+    'cache': None,          # None until the first snapshot arrives
+    'versions': None,       # (inventory_version, data_version) the cache is current with
+}
+
+# Runs on the database thread, so the orders of the sort options are
+# built there too; the heading-only sorts are built on first use
+def read_snapshot(s):
+    versions = (s.inventory_version(), s.data_version())
+    with timings.timer("load_snapshot", "query") as timer:
+        rows = s.snapshot_rows()
+        timer.rows = len(rows)
+    cache = InventoryCache(rows)
+    for sort_by in ("expiry_date", "name", "category"):
+        cache.order(sort_by)
+    return versions, cache
+
+# Reading the snapshot again keeps the list scrolled to the row at the top
+# and the selection
+def load_snapshot():
+    def loaded(result):
+        first_load = cache_state['versions'] is None
+        cache_state['versions'], cache_state['cache'] = result
+        if not first_load and view_state['ids']:
+            view_state['anchor'] = (view_state['ids'][view_state['offset']], view_state['offset'])
+        refresh_items()
+        if first_load:
+            finish_startup()
+
+    run_db(read_snapshot, loaded, show_load_error, key='snapshot')
+
+# Startup shows the first rows by expiry date straight away and reads the
+# full snapshot once they are painted. Until then the cache holds just
+# those rows and no versions.
+FIRST_PAGE_ROWS = 100
+
+def load_first_page():
+    def loaded(rows):
+        cache_state['cache'] = InventoryCache(rows)
+        refresh_items()
+        root.update_idletasks()
+        timings.record("startup", "first_rows", time.perf_counter() - STARTED, len(rows))
+        load_snapshot()
+
+    root.title("Food Expiry Tracker (loading...)")
+    run_db(lambda s: s.snapshot_rows(limit=FIRST_PAGE_ROWS), loaded, show_load_error)
+
+# Work that can wait until the whole list is shown
+def finish_startup():
+    root.title("Food Expiry Tracker")
+    timings.record("startup", "all_rows", time.perf_counter() - STARTED, len(cache_state['cache'].items))
+    expiry_notifier.start()
+    maintenance.start()
+    if store.malformed_expiry_rows:
+        show_malformed_dates()
+
+# Report expiry dates the day-number conversion could not read
+def show_malformed_dates():
+    messagebox.showwarning(
+        "Invalid Expiry Dates",
+        "These items have expiry dates that could not be read and are shown as expired:\n\n"
+        + "\n".join(f"• {name} (ID {item_id}): {expiry_date}" for item_id, name, expiry_date in store.malformed_expiry_rows[:20]))
+
+# The snapshot is read again only when another connection changed the
+# items: inventory_version counts changes to food_items from any
+# connection, this one's included, and data_version changes only with
+# commits from other connections, log and maintenance writes included.
+# Changes to the first with none to the second were this window's own,
+# which the cache already has.
+def check_for_changes():
+    root.after(CACHE_CHECK_MS, check_for_changes)
+    if cache_state['versions'] is None:
+        # Still loading
+        return
+    if epoch_day(date.today()) != view_state['today']:
+        update_day()
+
+    def checked(versions):
+        inventory, data = cache_state['versions']
+        if versions[0] != inventory and versions[1] != data:
+            load_snapshot()
+        else:
+            cache_state['versions'] = versions
+
+    run_db(lambda s: (s.inventory_version(), s.data_version()), checked)
+
+# Apply written rows (as read by snapshot_rows) and deleted ids to the cache.
+# A few changes are applied to the displayed list in place, so only the
+# affected rows of the tree are touched; more rebuild the list.
+def apply_changes(rows=(), deleted_ids=()):
+    cache = cache_state['cache']
+    if cache is None:
+        # The snapshot may have been read before the change
+        load_snapshot()
+        return
+    changed_ids = {row[0] for row in rows}
+    changed_ids.update(deleted_ids)
+    view_state['selected'].difference_update(deleted_ids)
+    lists = view_lists() if len(changed_ids) <= BULK_CHANGE_ITEMS else None
+    if lists is None:
+        cache.update(rows, deleted_ids)
+        refresh_items()
+        return
+
+    # Old positions are found with the old items, before the cache changes
+    for item_id in changed_ids:
+        remove_from_view(lists, cache.items.get(item_id))
+    cache.update(rows, deleted_ids)
+    for row in rows:
+        add_to_view(lists, cache.items[row[0]])
+    view_state['ids'] = search_state['results'][search_state['shown']][0]
+    render_view(changed_ids)
+
+# The result lists an in-place change has to keep current: the base result
+# set and the search shown. None when the shown list cannot be updated in
+# memory, as for relevance order and full-text results.
+def view_lists():
+    results = search_state['results']
+    query = search_state['shown']
+    if search_state['sort_by'] not in SORT_KEYS or query not in results or results[query][1] is None:
+        return None
+    # Other cached searches would go stale, they are searched again instead
+    for q in [q for q in results if q not in ('', query)]:
+        del results[q]
+    return [(q,) + results[q] for q in sorted({'', query})]
+
+# Where an item with sort key `key` is, or belongs, in a displayed list
+def view_position(ids, key):
+    sort_key = SORT_KEYS[search_state['sort_by']]
+    items = cache_state['cache'].items
+    descending = view_state['descending']
+    lo, hi = 0, len(ids)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        mid_key = sort_key(items[ids[mid]])
+        if (mid_key > key) if descending else (mid_key < key):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def remove_from_view(lists, item):
+    if item is None:
+        return
+    key = SORT_KEYS[search_state['sort_by']](item)
+    for query, ids, names in lists:
+        i = view_position(ids, key)
+        if i < len(ids) and ids[i] == item.id:
+            del ids[i]
+            del names[i]
+            # Keep the rows on screen where they are
+            if query == search_state['shown'] and i < view_state['offset']:
+                view_state['offset'] -= 1
+
+def add_to_view(lists, item):
+    category = filter_combobox.get()
+    if category != "All" and item.category != category:
+        return
+    key = SORT_KEYS[search_state['sort_by']](item)
+    for query, ids, names in lists:
+        if query not in item.name_lower:
+            continue
+        i = view_position(ids, key)
+        ids.insert(i, item.id)
+        names.insert(i, item.name_lower)
+        if query == search_state['shown'] and i < view_state['offset']:
+            view_state['offset'] += 1
+
+# At midnight only rows whose status changed get new tags: items that
+# expired and items that entered the expiring soon window
+def update_day():
+    cache = cache_state['cache']
+    today = epoch_day(date.today())
+    first, last = sorted((view_state['today'], today))
+    view_state['today'] = today
+    changed = set(cache.ids_expiring_between(first, last - 1))
+    changed.update(cache.ids_expiring_between(first + EXPIRING_SOON_DAYS + 1, last + EXPIRING_SOON_DAYS))
+    for iid in tree.get_children():
+        if int(iid) in changed:
+            tree.item(iid, tags=(cache.items[int(iid)].status(today),))
+
 # Toggle Dark Mode
 def toggle_dark_mode():
     global is_dark_mode
@@ -116,29 +311,45 @@ def add_item():
     category = category_combobox.get()
     expiry_date = expiry_entry.get()
     notes = notes_entry.get()
+    quantity = quantity_entry.get().strip() or "1"
 
     if name == '' or expiry_date == '' or category == '':
         messagebox.showerror("Error", "Please enter food name, category, and expiry date")
         return
 
     try:
-        expiry_date = datetime.strptime(expiry_date, "%Y-%m-%d").date()
+        expiry_date = parse_expiry_date(expiry_date)
     except ValueError:
         messagebox.showerror("Error", "Invalid date format")
         return
 
-    try:
-        c.execute("INSERT INTO food_items (name, category, expiry_date, notes) VALUES (?, ?, ?, ?)",
-                  (name, category, expiry_date, notes))
-        log_usage(name, "add")
-        conn.commit()
+    if not quantity.isdigit() or int(quantity) < 1:
+        messagebox.showerror("Error", "Quantity must be a whole number of at least 1")
+        return
+    quantity = int(quantity)
+
+    started = time.perf_counter()
+
+    def add(s):
+        with timings.timer("add_item", "commit"):
+            item_id = s.add_item(name, category, expiry_date, notes, quantity)
+        with timings.timer("add_item", "query") as timer:
+            rows = s.snapshot_rows([item_id])
+            timer.rows = len(rows)
+        return rows
+
+    def added(rows):
+        timings.record("add_item", "latency", time.perf_counter() - started)
         name_entry.delete(0, tk.END)
         expiry_entry.delete(0, tk.END)
         notes_entry.delete(0, tk.END)
+        quantity_entry.delete(0, tk.END)
+        quantity_entry.insert(0, "1")
+        with timings.timer("add_item", "render"):
+            apply_changes(rows)
         messagebox.showinfo("Success", "Food item added successfully")
-        refresh_items()
-    except sqlite3.Error as e:
-        messagebox.showerror("Error", f"Failed to add item: {e}")
+
+    run_db(add, added, lambda e: messagebox.showerror("Error", f"Failed to add item: {e}"))
 
 # Edit selected item
 def edit_item():
@@ -147,12 +358,13 @@ def edit_item():
         return
         
     selected_item = tree.selection()[0]
-    item_id = tree.item(selected_item, 'values')[0]
+    item_id = int(tree.item(selected_item, 'values')[0])
     
     # Get current values
-    c.execute("SELECT name, category, expiry_date, notes FROM food_items WHERE id=?", (item_id,))
-    item = c.fetchone()
-    
+    item = cache_state['cache'].items.get(item_id)
+    show_edit_dialog(item_id, item and (item.name, item.category, item.expiry_date, item.notes, item.quantity))
+
+def show_edit_dialog(item_id, item):
     if not item:
         messagebox.showerror("Error", "Item not found")
         return
@@ -160,7 +372,7 @@ def edit_item():
     # Create a dialog for editing
     edit_window = tk.Toplevel(root)
     edit_window.title("Edit Food Item")
-    edit_window.geometry("400x300")
+    edit_window.geometry("400x350")
     edit_window.resizable(False, False)
     
     # Set background based on mode
@@ -187,6 +399,11 @@ def edit_item():
     edit_notes_entry = tk.Entry(edit_window)
     edit_notes_entry.grid(row=3, column=1, padx=10, pady=10, sticky="we")
     edit_notes_entry.insert(0, item[3] if item[3] else "")
+
+    tk.Label(edit_window, text="Quantity:", bg=edit_window['bg'], fg=fg_color).grid(row=4, column=0, padx=10, pady=10, sticky="w")
+    edit_quantity_entry = tk.Entry(edit_window)
+    edit_quantity_entry.grid(row=4, column=1, padx=10, pady=10, sticky="we")
+    edit_quantity_entry.insert(0, str(item[4]))
     
     # Save function for the edit window
     def save_changes():
@@ -194,38 +411,44 @@ def edit_item():
         new_category = edit_category_combo.get()
         new_expiry = edit_expiry_entry.get()
         new_notes = edit_notes_entry.get()
+        new_quantity = edit_quantity_entry.get().strip()
         
         if new_name == '' or new_expiry == '' or new_category == '':
             messagebox.showerror("Error", "Please fill in all required fields", parent=edit_window)
             return
             
         try:
-            new_expiry_date = datetime.strptime(new_expiry, "%Y-%m-%d").date()
+            new_expiry_date = parse_expiry_date(new_expiry)
         except ValueError:
             messagebox.showerror("Error", "Invalid date format", parent=edit_window)
             return
+
+        if not new_quantity.isdigit() or int(new_quantity) < 1:
+            messagebox.showerror("Error", "Quantity must be a whole number of at least 1", parent=edit_window)
+            return
             
-        try:
-            c.execute("UPDATE food_items SET name=?, category=?, expiry_date=?, notes=? WHERE id=?",
-                     (new_name, new_category, new_expiry_date, new_notes, item_id))
-            log_usage(new_name, "edit")
-            conn.commit()
+        def update(s):
+            s.update_item(item_id, new_name, new_category, new_expiry_date, new_notes, int(new_quantity))
+            return s.snapshot_rows([item_id])
+
+        def updated(rows):
             messagebox.showinfo("Success", "Food item updated successfully", parent=edit_window)
             edit_window.destroy()
-            refresh_items()
-        except sqlite3.Error as e:
-            messagebox.showerror("Error", f"Failed to update item: {e}", parent=edit_window)
+            apply_changes(rows)
+
+        run_db(update, updated,
+               lambda e: messagebox.showerror("Error", f"Failed to update item: {e}", parent=edit_window))
     
     # Buttons
     save_button = tk.Button(edit_window, text="Save Changes", 
                            bg="#4CAF50", fg="white",
                            command=save_changes)
-    save_button.grid(row=4, column=0, columnspan=2, padx=10, pady=20, sticky="we")
+    save_button.grid(row=5, column=0, columnspan=2, padx=10, pady=20, sticky="we")
     
     cancel_button = tk.Button(edit_window, text="Cancel", 
                              bg="#F44336", fg="white",
                              command=edit_window.destroy)
-    cancel_button.grid(row=5, column=0, columnspan=2, padx=10, pady=5, sticky="we")
+    cancel_button.grid(row=6, column=0, columnspan=2, padx=10, pady=5, sticky="we")
     
     # Configure grid
     edit_window.columnconfigure(0, weight=1)
@@ -238,173 +461,748 @@ def edit_item():
 
 # Delete selected item
 def delete_selected():
-    if not tree.selection():
+    item_ids = selected_ids()
+    if not item_ids:
         messagebox.showerror("Error", "Please select an item to delete")
         return
+
+    if len(item_ids) > 1:
+        delete_items(item_ids, f"Are you sure you want to delete the {len(item_ids)} selected items?")
+        return
         
-    selected_item = tree.selection()[0]
-    item_id = tree.item(selected_item, 'values')[0]
-    item_name = tree.item(selected_item, 'values')[1]
+    item_id = item_ids[0]
+    item = cache_state['cache'].items.get(item_id)
+    if item is None:
+        messagebox.showerror("Error", "Item not found")
+        return
+    item_name = item.name
     
     confirm = messagebox.askyesno("Confirm Deletion", f"Are you sure you want to delete '{item_name}'?")
     if not confirm:
         return
         
-    try:
-        c.execute("DELETE FROM food_items WHERE id=?", (item_id,))
-        log_usage(item_name, "delete")
-        conn.commit()
-        refresh_items()
+    def deleted(result):
+        apply_changes(deleted_ids=[item_id])
+        if not result:
+            messagebox.showerror("Error", f"Item '{item_name}' was not found; it may have been deleted already")
+            return
         messagebox.showinfo("Success", f"Item '{item_name}' deleted successfully")
-    except sqlite3.Error as e:
-        messagebox.showerror("Error", f"Failed to delete item: {e}")
+
+    run_db(lambda s: s.delete_item(item_id, item_name), deleted,
+           lambda e: messagebox.showerror("Error", f"Failed to delete item: {e}"))
+
+# Bulk actions: each runs as one transaction with its log entries, then
+# updates the cache and the list once. They act on every selected item,
+# including those scrolled out of view.
+def selected_ids():
+    return sorted(view_state['selected'])
+
+def delete_items(item_ids, question):
+    if not messagebox.askyesno("Confirm Deletion", question):
+        return
+
+    def deleted(deleted_ids):
+        # Items not found were deleted elsewhere, they go from the list too
+        apply_changes(deleted_ids=item_ids)
+        missing = len(item_ids) - len(deleted_ids)
+        if missing:
+            messagebox.showwarning("Delete", f"{len(deleted_ids)} items deleted; {missing} were not found, "
+                                             "they may have been deleted already")
+            return
+        messagebox.showinfo("Success", f"{len(deleted_ids)} items deleted successfully")
+
+    run_db(lambda s: s.delete_items(item_ids), deleted,
+           lambda e: messagebox.showerror("Error", f"Failed to delete items: {e}"))
+
+def delete_expired():
+    def found(item_ids):
+        if not item_ids:
+            messagebox.showinfo("Delete Expired", "No items have expired.")
+            return
+        delete_items(item_ids, f"Are you sure you want to delete all {len(item_ids)} expired items?")
+
+    run_db(lambda s: s.expired_item_ids(), found, show_load_error)
+
+def recategorize_selected():
+    item_ids = selected_ids()
+    if not item_ids:
+        messagebox.showerror("Error", "Please select the items to re-categorize")
+        return
+
+    category = ask_category(f"New category for the {len(item_ids)} selected items:")
+    if not category:
+        return
+
+    run_db(lambda s: s.recategorize_items(item_ids, category), apply_changes,
+           lambda e: messagebox.showerror("Error", f"Failed to update items: {e}"))
+
+def shift_expiry_selected():
+    item_ids = selected_ids()
+    if not item_ids:
+        messagebox.showerror("Error", "Please select the items to change")
+        return
+
+    days = simpledialog.askinteger(
+        "Shift Expiry", f"Days to move the expiry date of the {len(item_ids)} selected items by\n"
+        "(negative to move it earlier):", parent=root)
+    if not days:
+        return
+
+    run_db(lambda s: s.shift_expiry(item_ids, days), apply_changes,
+           lambda e: messagebox.showerror("Error", f"Failed to update items: {e}"))
+
+# Take units of the selected item's product from its lots, soonest expiry first
+def consume_selected():
+    if not tree.selection():
+        messagebox.showerror("Error", "Please select an item to consume")
+        return
+    item = cache_state['cache'].items.get(int(tree.item(tree.selection()[0], 'values')[0]))
+    if item:
+        consume_product(item.name, item.category)
+
+def consume_product(name, category, parent=None, on_done=None):
+    units = simpledialog.askinteger(
+        "Consume", f"Units of {name} ({category}) to take, soonest expiry first:",
+        parent=parent or root, minvalue=1, initialvalue=1)
+    if not units:
+        return
+
+    def consumed(result):
+        rows, deleted_ids = result
+        apply_changes(rows, deleted_ids)
+        if on_done:
+            on_done()
+
+    run_db(lambda s: s.consume(name, category, units), consumed,
+           lambda e: messagebox.showerror("Error", f"Could not consume {name}: {e}", parent=parent or root))
+
+# Products window: one row per product (name and category) with its lots
+# summed up, in pages; a product's lots are read when it is expanded
+PRODUCTS_PAGE_SIZE = 200
+
+def show_products():
+    window = tk.Toplevel(root)
+    window.title("Products")
+    window.geometry("600x450")
+
+    table = ttk.Treeview(window, columns=("Quantity", "Lots", "Expiry Date"))
+    table.heading("#0", text="Product")
+    table.column("#0", width=260)
+    for col in ("Quantity", "Lots", "Expiry Date"):
+        table.heading(col, text=col)
+        table.column(col, width=100)
+    table.tag_configure('expired', background='tomato')
+    table.tag_configure('soon', background='khaki')
+    table.tag_configure('fresh', background='palegreen')
+    table.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    state = {
+        'products': {},     # product row iid -> (name, category)
+        'loaded': set(),    # product row iids whose lots are shown
+        'cursor': None,     # where the next page starts, None when done
+    }
+    category = filter_combobox.get()
+    search = search_entry.get().strip()
+
+    def load_page(after=None):
+        run_db(lambda s: s.product_summaries(category, search, after, PRODUCTS_PAGE_SIZE), show_page,
+               show_load_error)
+
+    def show_page(result):
+        rows, state['cursor'] = result
+        for name, category_, quantity, lots, first_expiry in rows:
+            iid = table.insert('', tk.END, text=f"{name} ({category_})", values=(quantity, lots, first_expiry))
+            state['products'][iid] = (name, category_)
+            # Placeholder so the row can be expanded
+            table.insert(iid, tk.END, text="Loading...")
+        more_button.config(state=tk.NORMAL if state['cursor'] else tk.DISABLED)
+
+    def on_open(event):
+        iid = table.focus()
+        if iid not in state['products'] or iid in state['loaded']:
+            return
+        state['loaded'].add(iid)
+        name, category_ = state['products'][iid]
+
+        def show_lots(lots):
+            if not table.exists(iid):
+                return
+            table.delete(*table.get_children(iid))
+            for item_id, expiry_date, quantity, notes, status in lots:
+                text = f"Lot {item_id}" + (f" - {notes}" if notes else "")
+                table.insert(iid, tk.END, text=text, values=(quantity, "", expiry_date), tags=(status,))
+
+        run_db(lambda s: s.product_lots(name, category_), show_lots, show_load_error)
+
+    def reload():
+        table.delete(*table.get_children())
+        state['products'].clear()
+        state['loaded'].clear()
+        load_page()
+
+    def consume():
+        iid = table.focus()
+        if table.parent(iid):
+            iid = table.parent(iid)
+        if iid not in state['products']:
+            messagebox.showerror("Error", "Please select a product to consume", parent=window)
+            return
+        consume_product(*state['products'][iid], parent=window, on_done=reload)
+
+    table.bind("<<TreeviewOpen>>", on_open)
+
+    buttons = tk.Frame(window)
+    buttons.pack(pady=10)
+    tk.Button(buttons, text="Consume...", bg="#8BC34A", fg="white", command=consume).pack(side=tk.LEFT, padx=5)
+    more_button = tk.Button(buttons, text="Show More", command=lambda: load_page(state['cursor']), state=tk.DISABLED)
+    more_button.pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons, text="Close", command=window.destroy).pack(side=tk.LEFT, padx=5)
+    load_page()
+
+# Modal category picker; returns the category or None if cancelled
+def ask_category(prompt):
+    result = []
+    dialog = tk.Toplevel(root)
+    dialog.title("Change Category")
+    dialog.resizable(False, False)
+    dialog.configure(bg="#2E2E2E" if is_dark_mode else "#f4f4f9")
+    fg_color = "white" if is_dark_mode else "#333333"
+
+    tk.Label(dialog, text=prompt, bg=dialog['bg'], fg=fg_color).grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+    combo = ttk.Combobox(dialog, values=["Dairy", "Vegetables", "Meat", "Grains", "Fruits", "Other"])
+    combo.grid(row=1, column=0, columnspan=2, padx=10, pady=5, sticky="we")
+    combo.current(0)
+
+    def ok():
+        if combo.get():
+            result.append(combo.get())
+        dialog.destroy()
+
+    tk.Button(dialog, text="OK", bg="#4CAF50", fg="white", command=ok).grid(row=2, column=0, padx=10, pady=10, sticky="we")
+    tk.Button(dialog, text="Cancel", bg="#F44336", fg="white", command=dialog.destroy).grid(row=2, column=1, padx=10, pady=10, sticky="we")
+
+    dialog.transient(root)
+    dialog.grab_set()
+    root.wait_window(dialog)
+    return result[0] if result else None
+
+# Virtual list state: the tree only holds the rows in the viewport, the
+# ordered ids of the whole result set are kept here and the rows to show
+# are taken from the cache as the scrollbar moves
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 25
+
+view_state = {
+    'ids': [],          # food_items ids in display order
+    'offset': 0,        # position of the first visible row in 'ids'
+    'descending': False,
+    'today': epoch_day(date.today()),   # day the row status tags are for
+    'selected': set(),  # selected ids, in view or not
+    'anchor': None,     # (id, offset) of the top row to scroll back to after a reload
+    'extend_selection': False,  # the last click or key held Shift or Control
+}
+
+# Number of rows that fit in the tree viewport
+def visible_row_count():
+    row_height = ttk.Style().lookup("Treeview", "rowheight")
+    row_height = int(row_height) if row_height else DEFAULT_ROW_HEIGHT
+    height = tree.winfo_height()
+    if height <= 1:
+        # Not mapped yet, fall back to the configured height
+        return int(tree.cget('height'))
+    return max(1, (height - HEADING_HEIGHT) // row_height)
+
+# Fill the tree with the rows at the current scroll offset. Rows already in
+# the tree stay unless their id is in `changed`, so scrolling or changing a
+# few items only inserts and deletes those rows; None replaces every row.
+def render_view(changed=()):
+    ids = view_state['ids']
+    total = len(ids)
+    visible = visible_row_count()
+    offset = max(0, min(view_state['offset'], total - visible))
+    view_state['offset'] = offset
+    # One extra row so the partially visible bottom line is filled too
+    end = min(total, offset + visible + 1)
+    wanted = ids[offset:end]
+
+    if changed is None:
+        kept = set()
+        tree.delete(*tree.get_children())
+    else:
+        # Kept rows are unchanged, so they are already in display order
+        wanted_iids = {str(item_id) for item_id in wanted if item_id not in changed}
+        children = tree.get_children()
+        kept = {iid for iid in children if iid in wanted_iids}
+        stale = [iid for iid in children if iid not in wanted_iids]
+        if stale:
+            tree.delete(*stale)
+
+    cache = cache_state['cache']
+    items = cache.items if cache else {}
+    today = view_state['today']
+    position = 0
+    # Every render is counted, scrolling included; rows are tree inserts
+    with timings.timer("refresh_items", "render") as timer:
+        timer.rows = 0
+        for item_id in wanted:
+            iid = str(item_id)
+            if iid not in kept:
+                item = items.get(item_id)
+                if item is None:
+                    # Deleted since the result set was built
+                    continue
+                tree.insert('', position, iid=iid, values=item.values(), tags=(item.status(today),))
+                timer.rows += 1
+            position += 1
+
+    show_selection()
+    tree.yview_moveto(0)
+    set_scrollbar(offset, visible, total)
+
+# Selection over the whole list. The tree only holds the rows in view, so
+# the selected ids are kept in view_state, followed from the tree's
+# selection events and selected again in the tree after each render.
+SHIFT_OR_CONTROL = 0x0001 | 0x0004
+
+def show_selection():
+    selected = view_state['selected']
+    wanted = [iid for iid in tree.get_children() if int(iid) in selected]
+    if set(wanted) != set(tree.selection()):
+        tree.selection_set(wanted)
+
+def on_tree_select(event):
+    shown = {int(iid) for iid in tree.get_children()}
+    selected = {int(iid) for iid in tree.selection()}
+    if selected == view_state['selected'] & shown:
+        # Unchanged, or just selected again by show_selection()
+        return
+    if view_state['extend_selection']:
+        # Ctrl/Shift: rows out of view stay selected
+        view_state['selected'] = (view_state['selected'] - shown) | selected
+    else:
+        view_state['selected'] = selected
+
+def on_tree_click(event):
+    view_state['extend_selection'] = bool(event.state & SHIFT_OR_CONTROL)
+    row = tree.identify_row(event.y)
+    if row and not view_state['extend_selection']:
+        # A plain click selects just that row, even if it already was the
+        # only one selected in view
+        view_state['selected'] = {int(row)}
+
+# Selected ids dropped from the list, by a new search or filter or by deletes
+def prune_selection(ids):
+    if view_state['selected']:
+        view_state['selected'] &= set(ids)
+
+def set_scrollbar(offset, visible, total):
+    if total:
+        scrollbar.set(offset / total, min(1.0, (offset + visible) / total))
+    else:
+        scrollbar.set(0, 1)
+
+# Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')
+def scroll_view(*args):
+    if args[0] == 'moveto':
+        view_state['offset'] = int(float(args[1]) * len(view_state['ids']))
+    elif args[0] == 'scroll':
+        step = int(args[1])
+        if args[2] == 'pages':
+            step *= visible_row_count()
+        view_state['offset'] += step
+    render_view()
+
+def on_tree_mousewheel(event):
+    if event.num == 4 or event.delta > 0:
+        scroll_view('scroll', -3, 'units')
+    else:
+        scroll_view('scroll', 3, 'units')
+    return "break"
+
+# Keep keyboard navigation working past the edges of the rendered window
+def on_tree_key(event):
+    view_state['extend_selection'] = bool(event.state & SHIFT_OR_CONTROL)
+    children = tree.get_children()
+    if event.keysym in ('Prior', 'Next'):
+        scroll_view('scroll', -1 if event.keysym == 'Prior' else 1, 'pages')
+        return "break"
+    if not children:
+        return None
+
+    visible = min(len(children), visible_row_count())
+    focus = tree.focus()
+    if event.keysym == 'Down' and focus == children[visible - 1]:
+        scroll_view('scroll', 1, 'units')
+        target = tree.get_children()[min(visible, len(tree.get_children())) - 1]
+    elif event.keysym == 'Up' and focus == children[0]:
+        scroll_view('scroll', -1, 'units')
+        target = tree.get_children()[0]
+    else:
+        return None
+    tree.focus(target)
+    tree.selection_set(target)
+    return "break"
 
 # Display items with color coding and sorting
 def refresh_items(sort_by=None):
-    for row in tree.get_children():
-        tree.delete(row)
-
-    search_query = search_entry.get().lower()
+    cache = cache_state['cache']
+    if cache is None:
+        # Shown once the snapshot has loaded
+        return
     selected_category = filter_combobox.get()
 
-    today = datetime.now().date()
-    
-    # Default sort by expiry date if not specified
+    # Default to the sort picked in the combobox, then expiry date
     if sort_by is None or sort_by == "":
-        sort_by = "expiry_date"
+        sort_by = sort_combobox.get() or "expiry_date"
     
-    # Check if database has category column
-    c.execute("PRAGMA table_info(food_items)")
-    columns = [column[1] for column in c.fetchall()]
-    has_category = 'category' in columns
-    has_notes = 'notes' in columns
-    
-    # Construct the query with ORDER BY
-    query = "SELECT id, name"
-    if has_category:
-        query += ", category"
+    # Relevance only orders search results, the base set is by expiry date.
+    # The search box filters this base result set in memory.
+    search_state['sort_by'] = sort_by
+    with timings.timer("refresh_items", "query") as timer:
+        search_state['results'] = {'': cache.ordered(sort_by, selected_category, view_state['descending'])}
+        timer.rows = len(search_state['results'][''][0])
+    search_state['shown'] = None
+    cancel_pending_search()
+    update_heading_arrows(sort_by)
+    run_search()
+
+# Clicking a column heading sorts by it, clicking it again reverses the order
+HEADING_SORTS = {"ID": "id", "Name": "name", "Category": "category", "Expiry Date": "expiry_date",
+                 "Quantity": "quantity", "Notes": "notes"}
+
+def sort_by_heading(column):
+    sort_by = HEADING_SORTS[column]
+    view_state['descending'] = sort_by == sort_combobox.get() and not view_state['descending']
+    sort_combobox.set(sort_by)
+    refresh_items(sort_by)
+
+def on_sort_selected(event):
+    view_state['descending'] = False
+    refresh_items(sort_combobox.get())
+
+def update_heading_arrows(sort_by):
+    for column, heading_sort in HEADING_SORTS.items():
+        arrow = ""
+        if heading_sort == sort_by:
+            arrow = " \u25bc" if view_state['descending'] else " \u25b2"
+        tree.heading(column, text=column + arrow)
+
+# Search: keystrokes are debounced and each query is answered by filtering
+# the cached result of the longest earlier query it extends, so SQLite is
+# only read again when the data, category filter or sort changes
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_CACHE_SIZE = 32
+
+search_state = {
+    'after_id': None,   # pending debounced search
+    'results': {},      # query -> (ids, lowercased names) in display order
+    'sort_by': None,    # sort of the base result set
+    'shown': None,      # query currently displayed
+}
+
+def cancel_pending_search():
+    if search_state['after_id'] is not None:
+        root.after_cancel(search_state['after_id'])
+        search_state['after_id'] = None
+
+def on_search_key(event):
+    # A newer keystroke replaces the pending search
+    cancel_pending_search()
+    search_state['after_id'] = root.after(SEARCH_DEBOUNCE_MS, run_search)
+
+def name_search_results(query):
+    results = search_state['results']
+    # Every query extends '', so there is always a base to refine
+    base = max((q for q in results if q in query and results[q][1] is not None), key=len)
+    base_ids, base_names = results[base]
+    ids = []
+    names = []
+    for item_id, name in zip(base_ids, base_names):
+        if query in name:
+            ids.append(item_id)
+            names.append(name)
+
+    cache_search_result(query, ids, names)
+    return ids
+
+def cache_search_result(query, ids, names):
+    results = search_state['results']
+    if len(results) >= SEARCH_CACHE_SIZE:
+        # Drop the oldest entry, never the base result set
+        del results[next(q for q in results if q)]
+    results[query] = (ids, names)
+
+# Full-text search results, restricted to the base result set
+def fts_search_results(query, matched_ids):
+    results = search_state['results']
+    # Token prefix matches only narrow as the query grows, so the result of
+    # the longest earlier full-text query this one extends is enough to filter
+    base = max((q for q in results if query.startswith(q) and (q == '' or results[q][1] is None)), key=len)
+    candidates = results[base][0]
+
+    if search_state['sort_by'] == "relevance":
+        allowed = set(candidates)
+        ids = [item_id for item_id in matched_ids if item_id in allowed]
     else:
-        query += ", 'Other' as category"
-    
-    query += ", expiry_date"
-    
-    if has_notes:
-        query += ", notes"
+        matched = set(matched_ids)
+        ids = [item_id for item_id in candidates if item_id in matched]
+
+    # Full-text results are not refined in memory, so no names are kept
+    cache_search_result(query, ids, None)
+    return ids
+
+def run_search():
+    search_state['after_id'] = None
+    query = search_entry.get().lower()
+    if query == search_state['shown']:
+        return
+
+    results = search_state['results']
+    if query in results:
+        show_search_results(query, results[query][0])
+    elif store.has_fts:
+        # Full-text lookups run on the database thread; a lookup for a newer
+        # keystroke replaces one that has not started yet
+        def matched(ranked_ids):
+            if search_state['results'] is not results or search_entry.get().lower() != query:
+                # Stale: the base result set or the query changed meanwhile
+                return
+            if ranked_ids is None:
+                show_search_results(query, name_search_results(query))
+            else:
+                show_search_results(query, fts_search_results(query, ranked_ids))
+
+        def failed(e):
+            print(f"Full-text search failed, using name search: {e}")
+            matched(None)
+
+        ranked = search_state['sort_by'] == "relevance"
+        run_db(lambda s: s.search_ids(query, ranked=ranked), matched, failed, key='search')
     else:
-        query += ", '' as notes"
-        
-    query += " FROM food_items"
-    
-    params = []
-    
-    # Add WHERE clauses if needed
-    where_clauses = []
-    
-    if selected_category != "All" and has_category:
-        where_clauses.append("category = ?")
-        params.append(selected_category)
-    
-    if search_query:
-        where_clauses.append("name LIKE ?")
-        params.append(f"%{search_query}%")
-    
-    if where_clauses:
-        query += " WHERE " + " AND ".join(where_clauses)
-    
-    # Add sorting - handle case where column doesn't exist
-    if sort_by == "category" and not has_category:
-        sort_by = "expiry_date"  # Fall back to expiry_date if category doesn't exist
-        
-    query += f" ORDER BY {sort_by}"
-    
+        show_search_results(query, name_search_results(query))
+
+def show_search_results(query, ids):
+    search_state['shown'] = query
+    view_state['ids'] = ids
+    view_state['offset'] = anchored_offset(ids)
+    prune_selection(ids)
+    render_view(None)
+
+# Offset of the anchor row in the new list, its old offset if it has gone;
+# 0 when there is no anchor
+def anchored_offset(ids):
+    anchor, view_state['anchor'] = view_state['anchor'], None
+    if anchor is None:
+        return 0
+    item_id, offset = anchor
     try:
-        c.execute(query, params)
-        items = c.fetchall()
-
-        for item in items:
-            item_id = item[0]
-            name = item[1]
-            category = item[2] if has_category else "Other"
-            expiry_date = item[3] if has_category else item[2]
-            notes = item[4] if has_notes and has_category else ""
-            
-            try:
-                expiry = datetime.strptime(expiry_date, "%Y-%m-%d").date()
-            except (ValueError, TypeError):
-                # Handle case where expiry date is invalid
-                expiry = today - timedelta(days=1)  # Mark as expired
-                
-            if expiry < today:
-                tag = 'expired'
-            elif expiry - today <= timedelta(days=3):
-                tag = 'soon'
-            else:
-                tag = 'fresh'
+        return ids.index(item_id)
+    except ValueError:
+        return offset
 
-            tree.insert('', tk.END, values=(item_id, name, category, expiry_date, notes), tags=(tag,))
-    except sqlite3.Error as e:
-        messagebox.showerror("Database Error", f"Error loading data: {e}\n\nPlease restart the application.")
+# The export streams from a pooled connection in a worker thread; the
+# progress window polls it and can cancel it
+EXPORT_POLL_MS = 100
 
 def export_to_csv():
+    # When the list is filtered, offer to export just what it shows
+    ids = None
+    if filter_combobox.get() != "All" or search_entry.get():
+        answer = messagebox.askyesnocancel(
+            "Export",
+            f"Export only the {len(view_state['ids'])} items shown in the list, in their current order?\n\n"
+            "Choose No to export all items.")
+        if answer is None:
+            return
+        if answer:
+            ids = list(view_state['ids'])
+
     file_path = filedialog.asksaveasfilename(
         defaultextension=".csv", 
-        filetypes=[("CSV files", "*.csv")],
+        filetypes=[("CSV files", "*.csv"), ("Compressed CSV files", "*.csv.gz")],
         initialfile="food_inventory.csv"
     )
     if not file_path:
         return
 
-    c.execute("SELECT id, name, category, expiry_date, notes FROM food_items")
-    items = c.fetchall()
-    
-    try:
-        with open(file_path, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['ID', 'Name', 'Category', 'Expiry Date', 'Notes'])
-            writer.writerows(items)
-        messagebox.showinfo("Export Complete", f"Data exported to {file_path}")
-    except Exception as e:
-        messagebox.showerror("Export Error", f"Failed to export data: {e}")
+    state = {'written': 0, 'total': len(ids) if ids is not None else 0,
+             'result': None, 'error': None, 'done': False}
+    cancel_event = threading.Event()
+
+    def progress(written, total):
+        state['written'] = written
+        state['total'] = total
+
+    def worker():
+        started = time.perf_counter()
+        try:
+            state['result'] = export_items(pool.connection(), file_path, ids, progress, cancel_event)
+        except Exception as e:
+            state['error'] = e
+        finally:
+            pool.release()
+            state['done'] = True
+        timings.record("export_to_csv", "latency", time.perf_counter() - started, state['result'])
+
+    def cancel():
+        cancel_event.set()
+        progress_label.config(text="Cancelling...")
+
+    bg_color = "#2E2E2E" if is_dark_mode else "#f4f4f9"
+    fg_color = "white" if is_dark_mode else "#333333"
+    progress_window = tk.Toplevel(root)
+    progress_window.title("Exporting Items")
+    progress_window.geometry("350x140")
+    progress_window.configure(bg=bg_color)
+    progress_label = tk.Label(progress_window, text="Starting export...", font=("Arial", 11),
+                              bg=bg_color, fg=fg_color)
+    progress_label.pack(padx=20, pady=(20, 5))
+    progress_bar = ttk.Progressbar(progress_window, length=300, mode='determinate')
+    progress_bar.pack(padx=20, pady=5)
+    tk.Button(progress_window, text="Cancel", bg="#F44336", fg="white", command=cancel).pack(pady=10)
+    progress_window.protocol("WM_DELETE_WINDOW", cancel)
+    progress_window.transient(root)
+    progress_window.grab_set()
+
+    def poll():
+        if not state['done']:
+            if state['total']:
+                progress_bar['maximum'] = state['total']
+                progress_bar['value'] = state['written']
+            if not cancel_event.is_set():
+                progress_label.config(text=f"Exported {state['written']} of {state['total']} items")
+            root.after(EXPORT_POLL_MS, poll)
+            return
+
+        progress_window.destroy()
+        if state['error'] is not None:
+            messagebox.showerror("Export Error", f"Failed to export data: {state['error']}")
+        elif state['result'] is None:
+            messagebox.showinfo("Export Cancelled", "The export was cancelled and the partial file removed")
+        else:
+            messagebox.showinfo("Export Complete", f"{state['result']} items exported to {file_path}")
+
+    threading.Thread(target=worker, daemon=True).start()
+    root.after(EXPORT_POLL_MS, poll)
+
+# Bulk import from a CSV (same columns as the export) or JSON lines file.
+# One chunk is written per database job so the window stays live.
+IMPORT_ERRORS_SHOWN = 10
+
+def import_from_file():
+    file_path = filedialog.askopenfilename(
+        filetypes=[("CSV files", "*.csv"), ("JSON lines files", "*.jsonl *.json"), ("All files", "*.*")]
+    )
+    if not file_path:
+        return
+
+    bg_color = "#2E2E2E" if is_dark_mode else "#f4f4f9"
+    fg_color = "white" if is_dark_mode else "#333333"
+    progress_window = tk.Toplevel(root)
+    progress_window.title("Importing Items")
+    progress_window.geometry("350x100")
+    progress_window.configure(bg=bg_color)
+    progress_label = tk.Label(progress_window, text="Starting import...", font=("Arial", 11),
+                              bg=bg_color, fg=fg_color)
+    progress_label.pack(padx=20, pady=30)
+    progress_window.transient(root)
+    progress_window.grab_set()
+
+    steps = store.import_items(read_import_file(file_path))
+    progress = (0, 0, [])
+
+    def step():
+        run_db(lambda s: next(steps, None), stepped, failed)
+
+    def stepped(result):
+        nonlocal progress
+        if result is None:
+            finish()
+            return
+        progress = result
+        read, imported, errors = progress
+        progress_label.config(text=f"Read {read} rows, imported {imported}, {len(errors)} errors")
+        step()
+
+    def failed(e):
+        progress_window.destroy()
+        load_snapshot()
+        messagebox.showerror("Import Error", f"Failed to import data: {e}")
+
+    def finish():
+        progress_window.destroy()
+        load_snapshot()
+        read, imported, errors = progress
+        summary = f"Imported {imported} of {read} rows from {file_path}"
+        if not errors:
+            messagebox.showinfo("Import Complete", summary)
+            return
+        details = "\n".join(f"Line {line}: {message}" for line, message in errors[:IMPORT_ERRORS_SHOWN])
+        if len(errors) > IMPORT_ERRORS_SHOWN:
+            details += f"\n...and {len(errors) - IMPORT_ERRORS_SHOWN} more"
+        messagebox.showwarning("Import Complete", f"{summary}\n\n{len(errors)} rows were skipped:\n{details}")
+
+    step()
 
 # Reminder system
 def check_expiry():
-    today = datetime.now().date()
-    expiry_threshold = today + timedelta(days=3)
-    c.execute("SELECT name, expiry_date FROM food_items WHERE expiry_date <= ?", (expiry_threshold,))
-    expiring_items = c.fetchall()
-    
-    if not expiring_items:
+    started = time.perf_counter()
+
+    def query(s):
+        with timings.timer("check_expiry", "query") as timer:
+            rows = s.upcoming_expiries()
+            timer.rows = len(rows)
+        return rows
+
+    def done(expiring_items):
+        timings.record("check_expiry", "latency", time.perf_counter() - started)
+        notify_expiring(expiring_items)
+
+    run_db(query, done, show_load_error)
+
+def notify_expiring(expiring_items):
+    digests = digest_messages(expiry_alerts(expiring_items))
+    if not digests:
         messagebox.showinfo("Expiry Check", "No items are expiring soon.")
         return
         
     try:
-        for item in expiring_items:
-            name, exp_date = item
-            days_left = (datetime.strptime(exp_date, "%Y-%m-%d").date() - today).days
-            
-            if days_left < 0:
-                status = "EXPIRED"
-            else:
-                status = f"expires in {days_left} days"
-                
-            notification.notify(
-                title="Food Expiry Alert",
-                message=f"{name} {status}!",
-                timeout=5
-            )
+        # Imported on first use, as loading a backend slows startup
+        from plyer import notification
+
+        # One notification per category rather than one per item
+        with timings.timer("check_expiry", "notify") as timer:
+            timer.rows = 0
+            for title, message in digests:
+                notification.notify(
+                    title=title,
+                    message=message,
+                    timeout=5
+                )
+                timer.rows += 1
         
-        # Also show a messagebox with all expiring items
-        expiry_msg = "Items expiring:\n\n"
-        for item in expiring_items:
-            name, exp_date = item
-            expiry_msg += f"• {name} - {exp_date}\n"
-            
+        # Also show the digests in a messagebox
+        expiry_msg = "\n\n".join(f"{title}\n{message}" for title, message in digests)
         messagebox.showwarning("Expiry Alert", expiry_msg)
     except Exception as e:
         messagebox.showerror("Notification Error", f"Could not show notifications: {e}")
 
 # Statistics and insights
 def show_statistics():
+    started = time.perf_counter()
+
+    def query(s):
+        with timings.timer("show_statistics", "query"):
+            return s.statistics()
+
+    def done(stats):
+        timings.record("show_statistics", "latency", time.perf_counter() - started)
+        show_statistics_window(stats)
+
+    run_db(query, done, show_load_error)
+
+def show_statistics_window(stats):
+    started = time.perf_counter()
     stats_window = tk.Toplevel(root)
     stats_window.title("Food Inventory Statistics")
     stats_window.geometry("500x400")
@@ -413,26 +1211,10 @@ def show_statistics():
     fg_color = "white" if is_dark_mode else "#333333"
     stats_window.configure(bg=bg_color)
     
-    # Get statistics
-    today = datetime.now().date()
-    
-    # Total items
-    c.execute("SELECT COUNT(*) FROM food_items")
-    total_items = c.fetchone()[0]
-    
-    # Expired items
-    c.execute("SELECT COUNT(*) FROM food_items WHERE expiry_date < ?", (today,))
-    expired_items = c.fetchone()[0]
-    
-    # Items expiring soon (within 3 days)
-    soon_date = today + timedelta(days=3)
-    c.execute("SELECT COUNT(*) FROM food_items WHERE expiry_date BETWEEN ? AND ?", 
-             (today, soon_date))
-    soon_items = c.fetchone()[0]
-    
-    # Items by category
-    c.execute("SELECT category, COUNT(*) FROM food_items GROUP BY category")
-    categories = c.fetchall()
+    total_items = stats['total']
+    expired_items = stats['expired']
+    soon_items = stats['soon']
+    categories = stats['categories']
     
     # Create statistics display
     tk.Label(stats_window, text="Food Inventory Statistics", font=("Arial", 14, "bold"),
@@ -461,22 +1243,117 @@ def show_statistics():
     tk.Label(stats_window, text="\nRecent Activity:", font=("Arial", 12, "bold"),
             bg=bg_color, fg=fg_color).pack(anchor="w", padx=20, pady=(10, 0))
             
-    c.execute("SELECT action, COUNT(*) FROM usage_log GROUP BY action ORDER BY COUNT(*) DESC LIMIT 5")
-    actions = c.fetchall()
-    
-    for action, count in actions:
+    for action, count in stats['actions']:
         tk.Label(stats_window, text=f"• {action.capitalize()}: {count} times", font=("Arial", 11),
                 bg=bg_color, fg=fg_color).pack(anchor="w", padx=30)
     
     # Close button
     tk.Button(stats_window, text="Close", bg="#4CAF50", fg="white",
              command=stats_window.destroy).pack(pady=20)
+    timings.record("show_statistics", "render", time.perf_counter() - started)
     
     # Make dialog modal
     stats_window.transient(root)
     stats_window.grab_set()
     root.wait_window(stats_window)
 
+# Consumption and waste rates, lots likely to expire unused and suggested
+# orders, worked out from the usage log (see usage_analytics.py)
+FORECAST_ROWS = 200
+
+# Tabs of the forecast window: (title, usage_forecast() key, columns)
+FORECAST_TABS = [
+    ("Likely Wasted", 'at_risk', ("ID", "Name", "Category", "Expiry Date", "Quantity", "Unused")),
+    ("Reorder", 'orders', ("Name", "Category", "Used/Day", "In Stock", "Order")),
+    ("Products", 'products', ("Name", "Category", "Used/Day", "Wasted/Day", "Waste Share")),
+    ("Categories", 'categories', ("Category", "Used/Day", "Wasted/Day", "Waste Share")),
+]
+
+def show_forecast():
+    started = time.perf_counter()
+
+    def query(s):
+        with timings.timer("show_forecast", "query"):
+            return s.usage_forecast(limit=FORECAST_ROWS)
+
+    def done(forecast):
+        timings.record("show_forecast", "latency", time.perf_counter() - started)
+        show_forecast_window(forecast)
+
+    run_db(query, done, show_load_error)
+
+def show_forecast_window(forecast):
+    started = time.perf_counter()
+    window = tk.Toplevel(root)
+    window.title("Consumption Forecast")
+    window.geometry("700x450")
+
+    tk.Label(window, text=f"Rates over the last {RATE_WINDOW_DAYS} days, "
+                          f"orders to last {ORDER_HORIZON_DAYS} days").pack(anchor="w", padx=10, pady=(10, 0))
+    notebook = ttk.Notebook(window)
+    notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    for title, key, columns in FORECAST_TABS:
+        table = ttk.Treeview(notebook, columns=columns, show="headings")
+        for col in columns:
+            table.heading(col, text=col)
+            table.column(col, width=150 if col == "Name" else 90)
+        for row in forecast[key]:
+            table.insert('', tk.END, values=["" if value is None else f"{value:.2f}" if isinstance(value, float)
+                                             else value for value in row])
+        notebook.add(table, text=f"{title} ({len(forecast[key])})")
+
+    tk.Button(window, text="Close", command=window.destroy).pack(pady=10)
+    timings.record("show_forecast", "render", time.perf_counter() - started)
+
+# Timings per operation and phase, refreshed while the panel is open (F12)
+def show_debug_panel():
+    if debug_panel.get('window') is not None:
+        debug_panel['window'].lift()
+        return
+    panel = tk.Toplevel(root)
+    panel.title("Timings")
+    panel.geometry("640x360")
+    debug_panel['window'] = panel
+
+    recording = tk.BooleanVar(value=timings.enabled)
+    def toggle_recording():
+        timings.enabled = recording.get()
+    tk.Checkbutton(panel, text="Record timings", variable=recording, command=toggle_recording).pack(anchor="w", padx=10, pady=5)
+
+    columns = ("Operation", "Phase", "Count", "Mean ms", "Max ms", "Total ms", "Rows")
+    table = ttk.Treeview(panel, columns=columns, show="headings")
+    for col in columns:
+        table.heading(col, text=col)
+        table.column(col, width=110 if col in ("Operation", "Phase") else 70, anchor="w" if col in ("Operation", "Phase") else "e")
+    table.pack(fill=tk.BOTH, expand=True, padx=10)
+
+    def refresh():
+        if debug_panel.get('window') is not panel:
+            return
+        table.delete(*table.get_children())
+        for operation, phase, count, seconds, longest, rows in timings.summary():
+            table.insert('', tk.END, values=(operation, phase, count, f"{seconds * 1000 / count:.2f}",
+                                             f"{longest * 1000:.2f}", f"{seconds * 1000:.1f}", rows or ""))
+        panel.after(DEBUG_PANEL_REFRESH_MS, refresh)
+
+    def close():
+        debug_panel['window'] = None
+        panel.destroy()
+
+    def reset():
+        timings.reset()
+        table.delete(*table.get_children())
+
+    buttons = tk.Frame(panel)
+    buttons.pack(pady=10)
+    tk.Button(buttons, text="Reset", command=reset).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons, text="Close", command=close).pack(side=tk.LEFT, padx=5)
+    panel.protocol("WM_DELETE_WINDOW", close)
+    refresh()
+
+DEBUG_PANEL_REFRESH_MS = 1000
+debug_panel = {'window': None}
+
 # Create main frames for better organization
 main_frame = tk.Frame(root, bg="#f4f4f9")
 main_frame.pack(fill=tk.X, padx=20, pady=10)
@@ -508,8 +1385,14 @@ notes_label.grid(row=3, column=0, padx=10, pady=5, sticky="w")
 notes_entry = tk.Entry(main_frame)
 notes_entry.grid(row=3, column=1, padx=10, pady=5, sticky="we")
 
+quantity_label = tk.Label(main_frame, text="Quantity:", bg="#f4f4f9", fg="#333333")
+quantity_label.grid(row=4, column=0, padx=10, pady=5, sticky="w")
+quantity_entry = tk.Entry(main_frame)
+quantity_entry.grid(row=4, column=1, padx=10, pady=5, sticky="we")
+quantity_entry.insert(0, "1")
+
 add_button = tk.Button(main_frame, text="Add Item", bg="#4CAF50", fg="white", command=add_item)
-add_button.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="we")
+add_button.grid(row=5, column=0, columnspan=2, padx=10, pady=10, sticky="we")
 
 # Search and filter row
 search_frame = tk.Frame(tree_frame, bg="#f4f4f9")
@@ -519,7 +1402,7 @@ search_label = tk.Label(search_frame, text="Search:", bg="#f4f4f9", fg="#333333"
 search_label.pack(side=tk.LEFT, padx=5)
 search_entry = tk.Entry(search_frame, width=20)
 search_entry.pack(side=tk.LEFT, padx=5)
-search_entry.bind("<KeyRelease>", lambda e: refresh_items())
+search_entry.bind("<KeyRelease>", on_search_key)
 
 filter_label = tk.Label(search_frame, text="Filter by Category:", bg="#f4f4f9", fg="#333333")
 filter_label.pack(side=tk.LEFT, padx=5)
@@ -531,31 +1414,46 @@ filter_combobox.bind("<<ComboboxSelected>>", lambda e: refresh_items())
 # Sort options
 sort_label = tk.Label(search_frame, text="Sort by:", bg="#f4f4f9", fg="#333333")
 sort_label.pack(side=tk.LEFT, padx=5)
-sort_combobox = ttk.Combobox(search_frame, values=["expiry_date", "name", "category"], width=15)
+sort_options = ["expiry_date", "name", "category"]
+if store.has_fts:
+    sort_options.append("relevance")
+sort_combobox = ttk.Combobox(search_frame, values=sort_options, width=15)
 sort_combobox.current(0)
 sort_combobox.pack(side=tk.LEFT, padx=5)
-sort_combobox.bind("<<ComboboxSelected>>", lambda e: refresh_items(sort_combobox.get()))
+sort_combobox.bind("<<ComboboxSelected>>", on_sort_selected)
 
 # Treeview
-columns = ("ID", "Name", "Category", "Expiry Date", "Notes")
+columns = ("ID", "Name", "Category", "Expiry Date", "Quantity", "Notes")
 tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
 
 # Define column widths and headings
-column_widths = [50, 150, 100, 100, 300]
+column_widths = [50, 150, 100, 100, 70, 230]
 for i, col in enumerate(columns):
-    tree.heading(col, text=col)
+    tree.heading(col, text=col, command=lambda col=col: sort_by_heading(col))
     tree.column(col, width=column_widths[i])
 
 tree.pack(fill=tk.BOTH, expand=True, pady=10)
 
-# Scrollbar for treeview
-scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
-tree.configure(yscrollcommand=scrollbar.set)
+# Scrollbar for treeview, driven by the virtual list rather than tree.yview
+scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=scroll_view)
 scrollbar.place(relx=1, rely=0, relheight=1, anchor='ne')
 
+# Re-render the window when the viewport changes size or is scrolled
+tree.bind("<Configure>", lambda e: render_view())
+tree.bind("<MouseWheel>", on_tree_mousewheel)
+tree.bind("<Button-4>", on_tree_mousewheel)
+tree.bind("<Button-5>", on_tree_mousewheel)
+for key in ("<Up>", "<Down>", "<Prior>", "<Next>"):
+    tree.bind(key, on_tree_key)
+tree.bind("<Button-1>", on_tree_click)
+tree.bind("<<TreeviewSelect>>", on_tree_select)
+
 # Double-click to edit
 tree.bind("<Double-1>", lambda e: edit_item())
 
+# Timings panel
+root.bind("<F12>", lambda e: show_debug_panel())
+
 # Color coding
 tree.tag_configure('expired', background='tomato')
 tree.tag_configure('soon', background='khaki')
@@ -582,6 +1480,27 @@ stats_button.grid(row=1, column=1, padx=5, pady=10, sticky="we")
 darkmode_button = tk.Button(button_frame, text="Toggle Dark Mode", bg="#555", fg="white", command=toggle_dark_mode)
 darkmode_button.grid(row=1, column=2, padx=5, pady=10, sticky="we")
 
+import_button = tk.Button(button_frame, text="Import from File", bg="#009688", fg="white", command=import_from_file)
+import_button.grid(row=2, column=0, padx=5, pady=10, sticky="we")
+
+delete_expired_button = tk.Button(button_frame, text="Delete All Expired", bg="#E91E63", fg="white", command=delete_expired)
+delete_expired_button.grid(row=2, column=1, padx=5, pady=10, sticky="we")
+
+recategorize_button = tk.Button(button_frame, text="Change Category", bg="#3F51B5", fg="white", command=recategorize_selected)
+recategorize_button.grid(row=2, column=2, padx=5, pady=10, sticky="we")
+
+shift_expiry_button = tk.Button(button_frame, text="Shift Expiry Date", bg="#607D8B", fg="white", command=shift_expiry_selected)
+shift_expiry_button.grid(row=3, column=0, padx=5, pady=10, sticky="we")
+
+consume_button = tk.Button(button_frame, text="Consume...", bg="#8BC34A", fg="white", command=consume_selected)
+consume_button.grid(row=3, column=1, padx=5, pady=10, sticky="we")
+
+products_button = tk.Button(button_frame, text="Products", bg="#00BCD4", fg="white", command=show_products)
+products_button.grid(row=3, column=2, padx=5, pady=10, sticky="we")
+
+forecast_button = tk.Button(button_frame, text="Forecast", bg="#CDDC39", fg="white", command=show_forecast)
+forecast_button.grid(row=4, column=0, padx=5, pady=10, sticky="we")
+
 # Configure grid weights for main window
 main_frame.columnconfigure(0, weight=1)
 main_frame.columnconfigure(1, weight=3)
@@ -589,11 +1508,27 @@ main_frame.columnconfigure(1, weight=3)
 # Initialize styles
 bg, fg, button_bg = setup_styles()
 
-# Initial refresh
-refresh_items()
+# Expiry notifications run in the background: a digest of what needs
+# attention once the list has loaded, then one whenever items start expiring
+expiry_notifier = ExpiryNotifier(lambda: InventoryStore(store.path), send_notification)
+
+# Backups, log pruning, ANALYZE and vacuuming once a day, in the background
+maintenance = MaintenanceScheduler(lambda: InventoryStore(store.path))
 
-# Check for expiring items on startup
-root.after(1000, check_expiry)  # Check after 1 second of startup
+# Initial load, see load_first_page()
+load_first_page()
+root.after(CACHE_CHECK_MS, check_for_changes)
+root.after(0, lambda: timings.record("startup", "window", time.perf_counter() - STARTED))
 
 root.mainloop()
-conn.close() 
\ No newline at end of file
+expiry_notifier.stop()
+maintenance.stop()
+if profiler:
+    # Each thread stops its own profile; the database one runs before close
+    run_db(lambda s: profiler.disable())
+    profiler.disable()
+db.close()
+pool.close()
+if profiler:
+    profiler.dump()
+timings.close()
\ No newline at end of file
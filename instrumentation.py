@@ -0,0 +1,162 @@
+"""Timers and counters for the slow paths of the tracker.
+
+Recording is off by default, and a timer then costs one attribute check.
+It is turned on from the debug panel (F12 in the app), or for a whole
+session with every timing appended to a JSON lines file:
+
+    FOOD_TRACKER_TIMINGS=timings.jsonl python food_tracker_improved.py
+
+A cProfile dump of the window and database threads is written on exit
+when FOOD_TRACKER_CPROFILE names the output file:
+
+    FOOD_TRACKER_CPROFILE=session.prof python food_tracker_improved.py
+    python -m pstats session.prof
+"""
+import json
+import os
+import threading
+import time
+
+TIMINGS_ENV = "FOOD_TRACKER_TIMINGS"
+CPROFILE_ENV = "FOOD_TRACKER_CPROFILE"
+
+
+class NullTimer:
+    """Stands in for Timer while recording is off."""
+
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_TIMER = NullTimer()
+
+
+class Timer:
+    """Times a `with` block; set `rows` inside it to count rows too."""
+
+    __slots__ = ('timings', 'operation', 'phase', 'rows', 'started')
+
+    def __init__(self, timings, operation, phase):
+        self.timings = timings
+        self.operation = operation
+        self.phase = phase
+        self.rows = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.record(self.operation, self.phase, time.perf_counter() - self.started, self.rows)
+        return False
+
+
+class PhaseStats:
+    __slots__ = ('count', 'seconds', 'longest', 'rows')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.longest = 0.0
+        self.rows = 0
+
+
+class Timings:
+    """Per (operation, phase) counts, durations and row counts, recorded
+    from any thread. Phases used by the app: query and commit (SQLite, on
+    the database thread), render (Tk), notify (notifications), latency
+    (from the click until the result is back on the Tk thread)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}         # (operation, phase) -> PhaseStats
+        self.lock = threading.Lock()
+        self.log = None         # JSON lines file, see open_log()
+
+    def timer(self, operation, phase):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, operation, phase)
+
+    def record(self, operation, phase, seconds, rows=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.stats.get((operation, phase))
+            if stats is None:
+                stats = self.stats[(operation, phase)] = PhaseStats()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.longest = max(stats.longest, seconds)
+            if rows is not None:
+                stats.rows += rows
+            if self.log is not None:
+                entry = {'time': round(time.time(), 3), 'operation': operation, 'phase': phase,
+                         'ms': round(seconds * 1000, 3)}
+                if rows is not None:
+                    entry['rows'] = rows
+                self.log.write(json.dumps(entry) + "\n")
+
+    # (operation, phase, count, total seconds, longest seconds, rows), sorted
+    def summary(self):
+        with self.lock:
+            return sorted((operation, phase, s.count, s.seconds, s.longest, s.rows)
+                          for (operation, phase), s in self.stats.items())
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    # Record from now on, appending every timing to `path`
+    def open_log(self, path):
+        self.log = open(path, 'a', buffering=1, encoding='utf-8')
+        self.enabled = True
+
+    def close(self):
+        with self.lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
+
+
+class SessionProfiler:
+    """cProfile across threads: each thread to profile calls enable() and,
+    before dump(), disable() itself, as a profiler only sees the thread
+    that enabled it. cProfile and pstats are imported only here, which
+    keeps them out of every start without profiling."""
+
+    def __init__(self, path):
+        self.path = path
+        self.profiles = []
+        self.local = threading.local()
+
+    def enable(self):
+        import cProfile
+        profile = self.local.profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+
+    def disable(self):
+        self.local.profile.disable()
+
+    def dump(self):
+        import pstats
+        stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(self.path)
+        print(f"Profile written to {self.path}")
+
+
+# Shared by the app and its modules
+timings = Timings()
+
+if os.environ.get(TIMINGS_ENV):
+    timings.open_log(os.environ[TIMINGS_ENV])
+
+# A SessionProfiler when FOOD_TRACKER_CPROFILE is set, else None
+def profiler_from_env():
+    path = os.environ.get(CPROFILE_ENV)
+    return SessionProfiler(path) if path else None
@@ -0,0 +1,167 @@
+from bisect import bisect_left
+
+from inventory_store import EXPIRING_SOON_DAYS
+
+# Changes to more items than this at once rebuild each order in one pass
+# instead of inserting and removing items one at a time
+BULK_CHANGE_ITEMS = 64
+
+# Sort options mapped to key functions over CachedItem. Every key ends with
+# the id, so keys are unique and ties keep a stable order as in SQL.
+SORT_KEYS = {
+    # Unreadable dates have no day number and sort first, like NULL
+    "expiry_date": lambda item: (item.expiry_day is not None, item.expiry_day or 0, item.id),
+    "name": lambda item: (item.name or '', item.id),
+    "category": lambda item: (item.category or '', item.id),
+    "notes": lambda item: (item.notes or '', item.id),
+    "quantity": lambda item: (item.quantity, item.id),
+    "id": lambda item: (item.id,),
+}
+
+
+class CachedItem:
+    __slots__ = ('id', 'name', 'category', 'expiry_date', 'notes', 'quantity', 'expiry_day', 'name_lower')
+
+    # row is (id, name, category, expiry_date, notes, quantity, expiry_day)
+    # as read by InventoryStore.snapshot_rows()
+    def __init__(self, row):
+        self.id, self.name, self.category, self.expiry_date, self.notes, self.quantity, self.expiry_day = row
+        self.name_lower = (self.name or '').lower()
+
+    # Displayed columns
+    def values(self):
+        return (self.id, self.name, self.category, self.expiry_date, self.quantity, self.notes)
+
+    # expired/soon/fresh as of `today` (a day number), as status_sql does
+    def status(self, today):
+        day = self.expiry_day
+        if day is None or day < today:
+            return 'expired'
+        if day <= today + EXPIRING_SOON_DAYS:
+            return 'soon'
+        return 'fresh'
+
+
+class CacheOrder:
+    """Items in one sort order, as parallel lists of sort keys, ids and
+    lowercased names, kept sorted as items change."""
+
+    __slots__ = ('keys', 'ids', 'names')
+
+    def __init__(self, keys, items):
+        self.keys = keys
+        self.ids = [key[-1] for key in keys]
+        self.names = [items[item_id].name_lower for item_id in self.ids]
+
+    def insert(self, key, item):
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, item.id)
+        self.names.insert(i, item.name_lower)
+
+    def remove(self, key):
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            del self.ids[i]
+            del self.names[i]
+
+
+class InventoryCache:
+    """Every item held in memory, so sorting and filtering never read the
+    database.
+
+    Orders are built on first use per sort option and per (sort option,
+    category), then kept current by upsert() and remove(), which the caller
+    makes for every item it adds, edits or deletes. Not thread-safe: build
+    it anywhere, then use it from one thread.
+    """
+
+    def __init__(self, rows):
+        self.items = {}
+        self.by_category = {}   # category -> set of ids
+        for row in rows:
+            item = CachedItem(row)
+            self.items[item.id] = item
+            self.by_category.setdefault(item.category, set()).add(item.id)
+        self.orders = {}        # (sort option, category or None) -> CacheOrder
+
+    def order(self, sort_by="expiry_date", category=None):
+        if category == "All":
+            category = None
+        sort_by = sort_by if sort_by in SORT_KEYS else "expiry_date"
+        order = self.orders.get((sort_by, category))
+        if order is None:
+            if category is None:
+                key = SORT_KEYS[sort_by]
+                keys = sorted([key(item) for item in self.items.values()])
+            else:
+                # Filter the full order rather than sorting again
+                members = self.by_category.get(category, ())
+                keys = [key for key in self.order(sort_by).keys if key[-1] in members]
+            order = self.orders[(sort_by, category)] = CacheOrder(keys, self.items)
+        return order
+
+    # (ids, lowercased names) in display order, as new lists
+    def ordered(self, sort_by="expiry_date", category=None, descending=False):
+        order = self.order(sort_by, category)
+        if descending:
+            return order.ids[::-1], order.names[::-1]
+        return order.ids[:], order.names[:]
+
+    # Add or replace an item from a snapshot row
+    def upsert(self, row):
+        item = CachedItem(row)
+        self.remove(item.id)
+        self.items[item.id] = item
+        self.by_category.setdefault(item.category, set()).add(item.id)
+        for (sort_by, category), order in self.orders.items():
+            if category is None or category == item.category:
+                order.insert(SORT_KEYS[sort_by](item), item)
+        return item
+
+    def remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return None
+        self.by_category[item.category].discard(item_id)
+        for (sort_by, category), order in self.orders.items():
+            if category is None or category == item.category:
+                order.remove(SORT_KEYS[sort_by](item))
+        return item
+
+    # Ids of the items expiring from day `first` to day `last` (day numbers),
+    # found by bisecting the expiry order
+    def ids_expiring_between(self, first, last):
+        order = self.order("expiry_date")
+        start = bisect_left(order.keys, (True, first))
+        end = bisect_left(order.keys, (True, last + 1))
+        return order.ids[start:end]
+
+    # Apply many upserts and removals at once
+    def update(self, rows=(), deleted_ids=()):
+        if len(rows) + len(deleted_ids) <= BULK_CHANGE_ITEMS:
+            for row in rows:
+                self.upsert(row)
+            for item_id in deleted_ids:
+                self.remove(item_id)
+            return
+
+        changed = {row[0] for row in rows}
+        changed.update(deleted_ids)
+        for item_id in changed:
+            item = self.items.pop(item_id, None)
+            if item is not None:
+                self.by_category[item.category].discard(item_id)
+        new_items = [CachedItem(row) for row in rows]
+        for item in new_items:
+            self.items[item.id] = item
+            self.by_category.setdefault(item.category, set()).add(item.id)
+
+        for (sort_by, category), order in self.orders.items():
+            key = SORT_KEYS[sort_by]
+            keys = [k for k in order.keys if k[-1] not in changed]
+            keys.extend(key(item) for item in new_items if category is None or item.category == category)
+            # Two sorted runs, which sort() merges in linear time
+            keys.sort()
+            self.orders[(sort_by, category)] = CacheOrder(keys, self.items)
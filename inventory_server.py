@@ -0,0 +1,431 @@
+"""HTTP/JSON API over the food inventory, for POS and receiving terminals.
+
+Runs on asyncio from the standard library; database work goes to a small
+pool of threads with one store each. Start it next to the database:
+
+    python inventory_server.py --port 8080 --db food_database.db
+
+Endpoints, all JSON:
+
+    GET    /items?limit=50&sort=expiry_date&category=Dairy&after=<cursor>
+    POST   /items              {"name", "category", "expiry_date", "notes", "quantity"}
+    GET    /items/<id>
+    PUT    /items/<id>         same fields as POST
+    DELETE /items/<id>
+    POST   /consume            {"name", "category", "units"}
+    GET    /expiring?days=3&limit=50&category=Dairy&after=<cursor>
+    GET    /stats
+
+Each item is a lot: a quantity of a product (name and category) with one
+expiry date. POSTing an item adds to the lot with the same expiry date and
+notes if there is one; PUT keeps the quantity when it is left out.
+/consume takes units from the product's lots, soonest expiry first, and
+answers with the lots it changed and the ids of those it emptied, or 409
+when too few units are in stock.
+
+GET /items and GET /expiring return {"items": [...], "next": <cursor or
+null>}; pass the cursor as `after` for the next page. Expiring items come
+expired first, by expiry date. List responses carry an ETag, and a
+request sending it back in If-None-Match gets 304 Not Modified until the
+inventory changes.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import signal
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from inventory_store import DEFAULT_DB_PATH, EXPIRING_SOON_DAYS, InventoryStore, parse_expiry_date
+from usage_log import LOG_FLUSH_SECONDS
+
+DEFAULT_PORT = 8080
+
+# Database threads, and jobs allowed to wait for one; requests beyond that
+# get 503 at once instead of queueing without bound
+DB_WORKERS = 4
+MAX_PENDING_JOBS = 256
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BODY_BYTES = 64 * 1024
+ITEM_FIELDS = ['id', 'name', 'category', 'expiry_date', 'notes', 'quantity', 'status']
+# Sort options, each with the types the sort value of its page cursors can
+# have: None for NULLs, and expiry dates are day numbers or ISO text
+# depending on how the store keeps them
+SORT_OPTIONS = {
+    "id": (int,),
+    "expiry_date": (str, int, type(None)),
+    "name": (str, type(None)),
+    "category": (str, type(None)),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StorePool:
+    """A bounded thread pool where each thread has an InventoryStore.
+
+    run() hands a function of the store to a thread and awaits its result.
+    Each store has a lock, held while a job uses it, so flush_logs() can
+    write every store's buffered usage log from any thread.
+    """
+
+    def __init__(self, path, workers=DB_WORKERS, max_pending=MAX_PENDING_JOBS):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.local = threading.local()
+        self.stores = []        # (lock, store) of every worker thread
+        self.stores_lock = threading.Lock()
+
+    # On a worker thread: its store, opened on first use. Stores may be
+    # closed from another thread once the pool has shut down.
+    def slot(self):
+        slot = getattr(self.local, 'slot', None)
+        if slot is None:
+            slot = self.local.slot = (threading.Lock(), InventoryStore(self.path, check_same_thread=False))
+            with self.stores_lock:
+                self.stores.append(slot)
+        return slot
+
+    def call(self, fn):
+        lock, store = self.slot()
+        with lock:
+            return fn(store)
+
+    async def run(self, fn):
+        if self.pending >= self.max_pending:
+            raise ApiError(503, "Server busy, try again")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, fn)
+        finally:
+            self.pending -= 1
+
+    def flush_logs(self):
+        with self.stores_lock:
+            stores = list(self.stores)
+        for lock, store in stores:
+            with lock:
+                store.flush_usage_log(due_only=True)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for lock, store in self.stores:
+            store.close()
+
+
+# Opaque page cursors: the (sort value, id) of the last item, as base64 JSON
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode().rstrip("=")
+
+# The values go into the keyset query as parameters, so anything but
+# scalars of the sort's types (and bools, which JSON tells apart from
+# ints) is rejected here rather than by sqlite3
+def decode_cursor(text, sort_by):
+    try:
+        value, item_id = json.loads(base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)))
+    except (ValueError, TypeError):
+        raise ApiError(400, "Invalid cursor")
+    if type(item_id) is not int or type(value) not in SORT_OPTIONS[sort_by]:
+        raise ApiError(400, "Invalid cursor")
+    return value, item_id
+
+def int_param(query, name, default, minimum, maximum):
+    text = query.get(name, [None])[0]
+    if text is None:
+        return default
+    try:
+        value = int(text)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a whole number")
+    return max(minimum, min(value, maximum))
+
+# The JSON object in a request body
+def json_body(body):
+    try:
+        data = json.loads(body or b"null")
+    except ValueError:
+        raise ApiError(400, "Body is not valid JSON")
+    if not isinstance(data, dict):
+        raise ApiError(400, "Body must be a JSON object")
+    return data
+
+# A whole number of at least 1 from a request body, or None if left out
+def count_field(data, name):
+    value = data.get(name)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ApiError(400, f"{name} must be a whole number of at least 1")
+    return value
+
+# (name, category, expiry date, notes, quantity or None) from a request body
+def item_fields(body):
+    data = json_body(body)
+    name = str(data.get('name') or '').strip()
+    expiry_text = str(data.get('expiry_date') or '').strip()
+    if not name:
+        raise ApiError(400, "name is required")
+    try:
+        expiry = parse_expiry_date(expiry_text)
+    except ValueError:
+        raise ApiError(400, "expiry_date must be a date as YYYY-MM-DD")
+    category = str(data.get('category') or '').strip() or 'Other'
+    return name, category, expiry, str(data.get('notes') or ''), count_field(data, 'quantity')
+
+def item_json(row):
+    return dict(zip(ITEM_FIELDS, row))
+
+# ETag for list responses: the inventory version and the day, as statuses
+# change at midnight
+def list_etag(store):
+    return f'"{store.inventory_version()}-{date.today().isoformat()}"'
+
+
+class InventoryServer:
+    """Routes HTTP requests to the store pool. Connections are kept alive
+    between requests, as terminals poll the same endpoints."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                if len(parts) != 3:
+                    self.write_response(writer, 400, {'error': "Bad request line"}, keep_alive=False)
+                    break
+                method, target, version = parts
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == "HTTP/1.0" else connection != 'close'
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    self.write_response(writer, 413, {'error': "Body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload, extra_headers = await self.dispatch(method, target, headers, body)
+                self.write_response(writer, status, payload, extra_headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Client went away, or sent a line longer than the reader limit
+            pass
+        finally:
+            writer.close()
+
+    def write_response(self, writer, status, payload, extra_headers=(), keep_alive=True):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Content-Length: {len(body)}",
+                 "Connection: " + ("keep-alive" if keep_alive else "close")]
+        if payload is not None:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{name}: {value}" for name, value in extra_headers)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+
+    # (status, JSON payload or None, extra headers) for one request
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            if parts == ["items"]:
+                if method == "GET":
+                    return await self.list_items(query, headers)
+                if method == "POST":
+                    return await self.create_item(body)
+            elif len(parts) == 2 and parts[0] == "items":
+                try:
+                    item_id = int(parts[1])
+                except ValueError:
+                    raise ApiError(404, "No such item")
+                if method == "GET":
+                    return await self.get_item(item_id)
+                if method == "PUT":
+                    return await self.update_item(item_id, body)
+                if method == "DELETE":
+                    return await self.delete_item(item_id)
+            elif parts == ["consume"] and method == "POST":
+                return await self.consume(body)
+            elif parts == ["expiring"] and method == "GET":
+                return await self.expiring(query, headers)
+            elif parts == ["stats"] and method == "GET":
+                return 200, await self.pool.run(lambda s: s.statistics()), ()
+            else:
+                raise ApiError(404, "Not found")
+            raise ApiError(405, f"{method} is not allowed here")
+        except ApiError as e:
+            return e.status, {'error': str(e)}, ()
+        except sqlite3.Error as e:
+            return 500, {'error': f"Database error: {e}"}, ()
+
+    # Runs `read(store)` unless the client's copy is current; returns
+    # (etag, result or None)
+    async def conditional_read(self, headers, read):
+        if_none_match = headers.get('if-none-match')
+
+        def job(store):
+            etag = list_etag(store)
+            if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+                return etag, None
+            return etag, read(store)
+
+        return await self.pool.run(job)
+
+    async def list_items(self, query, headers, sort_by=None, until=None):
+        if sort_by is None:
+            sort_by = query.get('sort', ["id"])[0]
+            if sort_by not in SORT_OPTIONS:
+                raise ApiError(400, f"sort must be one of {', '.join(sorted(SORT_OPTIONS))}")
+        limit = int_param(query, 'limit', PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        category = query.get('category', [None])[0]
+        after = query.get('after', [None])[0]
+        cursor = decode_cursor(after, sort_by) if after else None
+
+        etag, page = await self.conditional_read(
+            headers, lambda s: s.page_items(sort_by, cursor, limit, category, until))
+        if page is None:
+            return 304, None, [("ETag", etag)]
+        rows, next_cursor = page
+        return 200, {'items': [item_json(row) for row in rows],
+                     'next': encode_cursor(next_cursor) if next_cursor else None}, [("ETag", etag)]
+
+    async def expiring(self, query, headers):
+        days = int_param(query, 'days', EXPIRING_SOON_DAYS, 0, 3650)
+        return await self.list_items(query, headers, "expiry_date", date.today() + timedelta(days=days))
+
+    async def get_item(self, item_id):
+        row = await self.pool.run(lambda s: s.fetch_items([item_id]).get(item_id))
+        if row is None:
+            raise ApiError(404, "No such item")
+        return 200, item_json(row), ()
+
+    async def create_item(self, body):
+        name, category, expiry, notes, quantity = item_fields(body)
+
+        def create(store):
+            item_id = store.add_item(name, category, expiry, notes, quantity or 1)
+            return store.fetch_items([item_id])[item_id]
+
+        row = await self.pool.run(create)
+        return 201, item_json(row), [("Location", f"/items/{row[0]}")]
+
+    async def update_item(self, item_id, body):
+        name, category, expiry, notes, quantity = item_fields(body)
+
+        def update(store):
+            if not store.update_item(item_id, name, category, expiry, notes, quantity):
+                return None
+            return store.fetch_items([item_id]).get(item_id)
+
+        row = await self.pool.run(update)
+        if row is None:
+            raise ApiError(404, "No such item")
+        return 200, item_json(row), ()
+
+    async def delete_item(self, item_id):
+        if not await self.pool.run(lambda s: s.delete_items([item_id])):
+            raise ApiError(404, "No such item")
+        return 204, None, ()
+
+    async def consume(self, body):
+        data = json_body(body)
+        name = str(data.get('name') or '').strip()
+        category = str(data.get('category') or '').strip() or 'Other'
+        units = count_field(data, 'units')
+        if not name or units is None:
+            raise ApiError(400, "name and units are required")
+
+        def take(store):
+            rows, deleted_ids = store.consume(name, category, units)
+            lots = store.fetch_items([row[0] for row in rows])
+            return [lots[row[0]] for row in rows], deleted_ids
+
+        try:
+            rows, deleted_ids = await self.pool.run(take)
+        except ValueError as e:
+            raise ApiError(409, str(e))
+        return 200, {'items': [item_json(row) for row in rows], 'deleted': deleted_ids}, ()
+
+
+async def flush_logs_periodically(pool):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(LOG_FLUSH_SECONDS)
+        try:
+            await loop.run_in_executor(None, pool.flush_logs)
+        except sqlite3.Error as e:
+            print(f"Could not write usage log: {e}")
+
+async def serve(path, host, port, workers):
+    pool = StorePool(path, workers)
+    server = InventoryServer(pool)
+    listener = await asyncio.start_server(server.handle_connection, host, port, backlog=512)
+    flusher = asyncio.ensure_future(flush_logs_periodically(pool))
+
+    # Stop cleanly on SIGTERM too, so buffered log events are written
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C still ends asyncio.run() with KeyboardInterrupt
+            pass
+
+    print(f"Serving {path} on http://{host}:{port}/", flush=True)
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        flusher.cancel()
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=DB_WORKERS, help="database threads")
+    args = parser.parse_args()
+
+    # Migrate once up front so the worker threads do not race on it
+    InventoryStore(args.db).close()
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
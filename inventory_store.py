@@ -0,0 +1,1449 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from instrumentation import timings
+from usage_analytics import (ORDER_HORIZON_DAYS, RATE_WINDOW_DAYS, category_rates, lots_at_risk,
+                             order_suggestions, product_rates, project_lots, reset_if_log_empty,
+                             update_daily_usage)
+from usage_log import LOG_INSERT_SQL, UsageLogWriter, usage_event
+
+DEFAULT_DB_PATH = 'food_database.db'
+
+# Connection settings. WAL lets readers work while one connection writes,
+# so several stations can share the database file. WAL needs every process
+# on the same host (it does not work over network file systems); use
+# JOURNAL_MODE = "delete" for a database on a network share.
+JOURNAL_MODE = "wal"
+# NORMAL only syncs at checkpoints in WAL mode: a power cut can lose the
+# last commits but never corrupts the database
+SYNCHRONOUS = "normal"
+# How long a connection waits for another one's lock before failing
+BUSY_TIMEOUT_MS = 5000
+
+JOURNAL_MODES = {"delete", "truncate", "persist", "memory", "wal", "off"}
+SYNCHRONOUS_LEVELS = {"off", "normal", "full", "extra"}
+
+# Full-text search over name, notes and category. Set to False to always
+# use the in-memory name search instead.
+USE_FTS = True
+
+# Expiry storage. With USE_EPOCH_DAYS every row also keeps its expiry as an
+# integer day number (days since 1970-01-01) in expiry_day, and all expiry
+# comparisons and sorting use it. expiry_date stays the displayed ISO text,
+# so older versions of the app can still share the database.
+USE_EPOCH_DAYS = False
+
+EXPIRING_SOON_DAYS = 3
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Columns of a displayed row, in order, followed by the status tag
+ITEM_COLUMNS = "id, name, category, expiry_date, notes, quantity"
+
+# SQLite's limit on bound parameters is 999 on older builds
+SQL_VARIABLE_CHUNK = 500
+
+# Rows written per transaction by import_items()
+IMPORT_CHUNK_SIZE = 5000
+
+# Rows read per statement by export_items() and archive_log_events()
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_HEADER = ['ID', 'Name', 'Category', 'Expiry Date', 'Notes', 'Quantity']
+
+# usage_log events older than this are rolled up into daily counts per
+# action and category (usage_daily) by apply_log_retention()
+LOG_RETENTION_DAYS = 90
+LOG_ARCHIVE_FIELDS = ['id', 'item_name', 'action', 'timestamp', 'category', 'item_id', 'quantity', 'expiry_date']
+
+# Pages copied per step by backup(), 1 MB at the default page size
+BACKUP_STEP_PAGES = 256
+# Outside WAL mode backup() lets go of its read lock between steps for
+# this long, so waiting writers get their turn. Their commits start the
+# copy over; after BACKUP_MAX_RESTARTS of them the rest is copied under
+# one read lock, which holds writers up for that long.
+BACKUP_STEP_PAUSE_SECONDS = 0.05
+BACKUP_MAX_RESTARTS = 3
+# Step results of a backup that had to wait for a lock and copied nothing
+# (SQLITE_BUSY, SQLITE_LOCKED)
+BACKUP_WAIT_STATUSES = (5, 6)
+# Rows ANALYZE samples per index; 0 reads them all
+ANALYZE_LIMIT = 1000
+
+def epoch_day(day):
+    return day.toordinal() - EPOCH_ORDINAL
+
+# Open a connection with the journal, sync and lock-wait settings applied
+def connect(path=DEFAULT_DB_PATH, journal_mode=JOURNAL_MODE, synchronous=SYNCHRONOUS,
+            busy_timeout_ms=BUSY_TIMEOUT_MS, check_same_thread=True):
+    if journal_mode.lower() not in JOURNAL_MODES:
+        raise ValueError(f"Unknown journal mode {journal_mode!r}")
+    if synchronous.lower() not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Unknown synchronous level {synchronous!r}")
+
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, check_same_thread=check_same_thread)
+    # Lets incremental_vacuum() return free pages. It must come before the
+    # journal mode, which writes the file header; an existing database
+    # takes it on at its next vacuum().
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # The journal mode is stored in the file, later connections find it set
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    return conn
+
+
+class ConnectionPool:
+    """Connections to one database, one per thread.
+
+    connection() returns the calling thread's connection, opening it on
+    first use. A thread that is finished with the database calls release()
+    so the next thread reuses its connection instead of opening a new one.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, max_idle=4, **settings):
+        self.path = path
+        self.max_idle = max_idle
+        self.settings = settings
+        self.local = threading.local()
+        self.idle = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                # Handed between threads, but only ever used by one at a time
+                conn = connect(self.path, check_same_thread=False, **self.settings)
+            self.local.conn = conn
+        return conn
+
+    def release(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            return
+        self.local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if not self.closed and len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    # Close the idle connections; ones still held are closed on release()
+    def close(self):
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+ISO_DATE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+
+# Parse a YYYY-MM-DD expiry date, raises ValueError
+def parse_expiry_date(text):
+    if ISO_DATE.fullmatch(text):
+        # Fast path for zero-padded dates, strptime is slow in bulk imports
+        return date(int(text[:4]), int(text[5:7]), int(text[8:]))
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+# Day number of an ISO date column in SQL, NULL unless it is a valid YYYY-MM-DD
+def day_from_text(column):
+    # Round-tripping through julianday() rejects impossible days like 02-30
+    return (f"(CASE WHEN date(julianday({column})) = {column} "
+            f"THEN CAST(julianday({column}) - 2440587.5 AS INTEGER) END)")
+
+# Records from a CSV file (same columns as export_csv) or a JSON lines
+# file, as (line number, dict with lowercase_underscore keys). Lines that
+# are not JSON objects give None so the importer can report them.
+def read_import_file(file_path):
+    if file_path.lower().endswith(('.jsonl', '.json', '.ndjson')):
+        with open(file_path, encoding='utf-8') as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict):
+                    yield line_number, None
+                    continue
+                yield line_number, {key.strip().lower().replace(' ', '_'): value for key, value in record.items()}
+    else:
+        # utf-8-sig drops the byte order mark spreadsheet programs write
+        with open(file_path, newline='', encoding='utf-8-sig') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames:
+                reader.fieldnames = [name.strip().lower().replace(' ', '_') for name in reader.fieldnames]
+            for record in reader:
+                yield reader.line_num, record
+
+# Rows for the given ids keyed by id; `columns` is the SELECT list and
+# `params` are bound before the ids
+def fetch_rows_by_id(c, columns, ids, params=()):
+    rows = {}
+    for i in range(0, len(ids), SQL_VARIABLE_CHUNK):
+        chunk = ids[i:i + SQL_VARIABLE_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        c.execute(f"SELECT {columns} FROM food_items WHERE id IN ({placeholders})",
+                  list(params) + list(chunk))
+        for row in c.fetchall():
+            rows[row[0]] = row
+    return rows
+
+# Run `sql` once per chunk of ids; the statement takes the chunk in place of
+# {ids} after `params`. Returns the total row count.
+def execute_for_ids(c, sql, ids, params=()):
+    changed = 0
+    for i in range(0, len(ids), SQL_VARIABLE_CHUNK):
+        chunk = ids[i:i + SQL_VARIABLE_CHUNK]
+        c.execute(sql.format(ids=",".join("?" * len(chunk))), list(params) + list(chunk))
+        changed += c.rowcount
+    return changed
+
+# Append the usage_log events from before `cutoff` to a gzip-compressed
+# JSON lines file, a page at a time by id; returns how many
+def archive_log_events(c, cutoff, file_path):
+    written = 0
+    last_id = 0
+    with gzip.open(file_path, 'at', encoding='utf-8') as archive:
+        while True:
+            c.execute("SELECT id, item_name, action, timestamp, category, item_id, quantity, expiry_date "
+                      "FROM usage_log WHERE timestamp < ? AND id > ? ORDER BY id LIMIT ?",
+                      (cutoff, last_id, EXPORT_CHUNK_SIZE))
+            rows = c.fetchall()
+            if not rows:
+                return written
+            for row in rows:
+                archive.write(json.dumps(dict(zip(LOG_ARCHIVE_FIELDS, row)), ensure_ascii=False) + "\n")
+            written += len(rows)
+            last_id = rows[-1][0]
+
+class BackupRestarted(Exception):
+    """A stepped backup that writes from other connections kept starting over."""
+
+# Copy the database of `conn` to `target_path` with the backup API, see
+# InventoryStore.backup(). With `hold_lock` every step reads within one
+# read transaction; without it the lock goes between steps and
+# BackupRestarted is raised after `max_restarts` restarts. Returns the
+# page count.
+def copy_database(conn, target_path, pages, progress, hold_lock, max_restarts=BACKUP_MAX_RESTARTS):
+    state = {'count': 0, 'remaining': None, 'restarts': 0}
+    def step(status, remaining, count):
+        # A step that copied pages yet left no fewer remaining started over
+        if (status not in BACKUP_WAIT_STATUSES and state['remaining'] is not None
+                and remaining >= state['remaining']):
+            state['restarts'] += 1
+            if not hold_lock and state['restarts'] > max_restarts:
+                raise BackupRestarted()
+        state['count'], state['remaining'] = count, remaining
+        if progress:
+            progress(remaining, count)
+        if not hold_lock and remaining:
+            time.sleep(BACKUP_STEP_PAUSE_SECONDS)
+
+    target = sqlite3.connect(target_path)
+    try:
+        if hold_lock:
+            conn.execute("BEGIN")
+            # The first read takes the lock (in WAL mode, the snapshot);
+            # fetching the row finishes the statement, the lock lasts
+            # until commit
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchall()
+        try:
+            conn.backup(target, pages=pages, progress=step)
+        finally:
+            if hold_lock:
+                conn.commit()
+    finally:
+        target.close()
+    return state['count']
+
+# Pages of exported rows: the given ids in that order, or every item by id.
+# Each page is its own short statement (keyset paging on id for the whole
+# table), so no read lock is held between pages.
+def iter_export_pages(c, ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    if ids is None:
+        last_id = -2 ** 63
+        while True:
+            c.execute(f"SELECT {ITEM_COLUMNS} FROM food_items WHERE id > ? ORDER BY id LIMIT ?",
+                      (last_id, chunk_size))
+            rows = c.fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+    else:
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            rows = fetch_rows_by_id(c, ITEM_COLUMNS, chunk)
+            # Items deleted since the ids were taken are skipped
+            yield [rows[item_id] for item_id in chunk if item_id in rows]
+
+# Stream items to a CSV file, gzip-compressed when the name ends in .gz.
+# Works on any connection, so it can run in a thread with its own.
+# progress(written, total) is called after every page. Setting cancel_event
+# stops the export. The rows go to a .part file next to `file_path`, which
+# takes its name once complete and is removed if the export fails or is
+# cancelled. Returns the rows written, or None if the export was cancelled.
+def export_items(conn, file_path, ids=None, progress=None, cancel_event=None,
+                 chunk_size=EXPORT_CHUNK_SIZE):
+    c = conn.cursor()
+    if ids is None:
+        c.execute("SELECT COUNT(*) FROM food_items")
+        total = c.fetchone()[0]
+    else:
+        total = len(ids)
+
+    opener = gzip.open if file_path.lower().endswith('.gz') else open
+    partial_path = file_path + ".part"
+    written = 0
+    cancelled = False
+    pages = iter_export_pages(c, ids, chunk_size)
+    try:
+        with opener(partial_path, 'wt', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_HEADER)
+            while True:
+                with timings.timer("export_to_csv", "query") as timer:
+                    rows = next(pages, None)
+                    timer.rows = len(rows or ())
+                if rows is None:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+                with timings.timer("export_to_csv", "write") as timer:
+                    writer.writerows(rows)
+                    timer.rows = len(rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(written, total)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    if cancelled:
+        os.remove(partial_path)
+        return None
+    os.replace(partial_path, file_path)
+    return written
+
+# Each word is matched as a token prefix, e.g. "gre app" -> "gre"* "app"*
+def fts_match_expression(query):
+    tokens = re.findall(r"\w+", query)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+# Schema migrations. PRAGMA user_version records how many have been
+# applied; new schema changes are appended to MIGRATIONS and never edited.
+
+# 1: tables and the columns older databases were created without
+def migrate_base_tables(c):
+    c.execute("PRAGMA table_info(food_items)")
+    columns = [column[1] for column in c.fetchall()]
+
+    if not columns:
+        c.execute('''CREATE TABLE food_items
+                     (id INTEGER PRIMARY KEY, name TEXT, expiry_date DATE,
+                      category TEXT DEFAULT 'Other', notes TEXT)''')
+    else:
+        if 'category' not in columns:
+            c.execute("ALTER TABLE food_items ADD COLUMN category TEXT DEFAULT 'Other'")
+            print("Added 'category' column to existing database")
+        if 'notes' not in columns:
+            c.execute("ALTER TABLE food_items ADD COLUMN notes TEXT")
+            print("Added 'notes' column to existing database")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS usage_log
+                 (id INTEGER PRIMARY KEY, item_name TEXT, action TEXT, timestamp TEXT)''')
+
+# 2: indexes for the expiry range scans, the category filter and the sorts
+def migrate_add_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_food_items_expiry ON food_items (expiry_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_food_items_category_expiry ON food_items (category, expiry_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_food_items_name ON food_items (name)")
+
+# Summary tables behind statistics(): item counts per category and per
+# expiry date, and log entries per action. Triggers keep them current, so
+# reading them costs O(categories + distinct dates) rather than O(rows).
+# Keys may be NULL, hence IS rather than = when matching them.
+STATS_TABLES = {
+    # table: (key column, count column, recount query)
+    'stats_category': ('category', 'item_count',
+                       "SELECT category, SUM({units}) FROM food_items GROUP BY category"),
+    'stats_expiry_date': ('expiry_date', 'item_count',
+                          "SELECT expiry_date, SUM({units}) FROM food_items GROUP BY expiry_date"),
+    'stats_action': ('action', 'action_count',
+                     "SELECT action, COUNT(*) FROM usage_log GROUP BY action"),
+}
+
+# What a food_items row adds to the item counts, {row} being "new." or
+# "old." in the triggers. Rows counted one each until they became lots
+# (migration 6); since migration 9 the units of each lot are counted.
+ROW_UNITS = "1"
+LOT_UNITS = "{row}quantity"
+
+# SQL adding (sign 1) or subtracting (sign -1) `amount` to the count of
+# `value` in a summary table; rows that drop to zero are removed
+def stats_change_sql(table, value, amount, sign):
+    key, count, _ = STATS_TABLES[table]
+    if sign > 0:
+        return (f"INSERT INTO {table} ({key}, {count}) SELECT {value}, 0 "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {key} IS {value});\n"
+                f"UPDATE {table} SET {count} = {count} + {amount} WHERE {key} IS {value};")
+    return (f"UPDATE {table} SET {count} = {count} - {amount} WHERE {key} IS {value};\n"
+            f"DELETE FROM {table} WHERE {key} IS {value} AND {count} <= 0;")
+
+# The summary triggers counting `units` (ROW_UNITS or LOT_UNITS) per row.
+# Counting lot units, a change of quantity moves the counts as well.
+def stats_triggers(units):
+    new, old = units.format(row="new."), units.format(row="old.")
+    updated_columns = "category, expiry_date, quantity" if units == LOT_UNITS else "category, expiry_date"
+    return {
+        'food_items_stats_insert': f'''CREATE TRIGGER IF NOT EXISTS food_items_stats_insert
+            AFTER INSERT ON food_items BEGIN
+                {stats_change_sql('stats_category', 'new.category', new, 1)}
+                {stats_change_sql('stats_expiry_date', 'new.expiry_date', new, 1)}
+            END''',
+        'food_items_stats_delete': f'''CREATE TRIGGER IF NOT EXISTS food_items_stats_delete
+            AFTER DELETE ON food_items BEGIN
+                {stats_change_sql('stats_category', 'old.category', old, -1)}
+                {stats_change_sql('stats_expiry_date', 'old.expiry_date', old, -1)}
+            END''',
+        'food_items_stats_update': f'''CREATE TRIGGER IF NOT EXISTS food_items_stats_update
+            AFTER UPDATE OF {updated_columns} ON food_items BEGIN
+                {stats_change_sql('stats_category', 'old.category', old, -1)}
+                {stats_change_sql('stats_category', 'new.category', new, 1)}
+                {stats_change_sql('stats_expiry_date', 'old.expiry_date', old, -1)}
+                {stats_change_sql('stats_expiry_date', 'new.expiry_date', new, 1)}
+            END''',
+        'usage_log_stats_insert': f'''CREATE TRIGGER IF NOT EXISTS usage_log_stats_insert
+            AFTER INSERT ON usage_log BEGIN
+                {stats_change_sql('stats_action', 'new.action', 1, 1)}
+            END''',
+        'usage_log_stats_delete': f'''CREATE TRIGGER IF NOT EXISTS usage_log_stats_delete
+            AFTER DELETE ON usage_log BEGIN
+                {stats_change_sql('stats_action', 'old.action', 1, -1)}
+            END''',
+    }
+
+STATS_TRIGGERS = stats_triggers(LOT_UNITS)
+
+# Replace the summary table contents with a full recount
+def fill_statistics(c, units=LOT_UNITS):
+    for table, (key, count, recount) in STATS_TABLES.items():
+        c.execute(f"DELETE FROM {table}")
+        c.execute(f"INSERT INTO {table} ({key}, {count}) {recount.format(units=units.format(row=''))}")
+
+# 3: summary tables for the statistics window
+def migrate_add_statistics(c):
+    c.execute("CREATE TABLE IF NOT EXISTS stats_category (category TEXT PRIMARY KEY, item_count INTEGER NOT NULL)")
+    c.execute("CREATE TABLE IF NOT EXISTS stats_expiry_date (expiry_date DATE PRIMARY KEY, item_count INTEGER NOT NULL)")
+    c.execute("CREATE TABLE IF NOT EXISTS stats_action (action TEXT PRIMARY KEY, action_count INTEGER NOT NULL)")
+    for sql in stats_triggers(ROW_UNITS).values():
+        c.execute(sql)
+    fill_statistics(c, ROW_UNITS)
+
+# 4: category and item id on log events, daily rollups of old events
+def migrate_add_usage_rollups(c):
+    c.execute("PRAGMA table_info(usage_log)")
+    columns = [column[1] for column in c.fetchall()]
+    if 'category' not in columns:
+        c.execute("ALTER TABLE usage_log ADD COLUMN category TEXT")
+    if 'item_id' not in columns:
+        c.execute("ALTER TABLE usage_log ADD COLUMN item_id INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_usage_log_timestamp ON usage_log (timestamp)")
+    c.execute('''CREATE TABLE IF NOT EXISTS usage_daily
+                 (day TEXT NOT NULL, action TEXT NOT NULL, category TEXT NOT NULL,
+                  event_count INTEGER NOT NULL, PRIMARY KEY (day, action, category))''')
+
+# A counter bumped by every change to food_items, so readers such as the
+# HTTP API can tell whether anything changed without reading the items
+VERSION_TRIGGERS = {
+    f'food_items_version_{event.lower()}': f'''CREATE TRIGGER IF NOT EXISTS food_items_version_{event.lower()}
+        AFTER {event} ON food_items BEGIN
+            UPDATE inventory_version SET version = version + 1;
+        END'''
+    for event in ("INSERT", "UPDATE", "DELETE")
+}
+
+# 5: the inventory change counter
+def migrate_add_inventory_version(c):
+    c.execute("CREATE TABLE IF NOT EXISTS inventory_version "
+              "(id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)")
+    c.execute("INSERT OR IGNORE INTO inventory_version (id, version) VALUES (0, 0)")
+    for sql in VERSION_TRIGGERS.values():
+        c.execute(sql)
+
+# 6: a quantity per row, making each row a lot of a product (a product
+# being a name and category). Rows of the same product, expiry date and
+# notes, as repeated receiving used to create, become one lot.
+def migrate_add_lots(c):
+    c.execute("PRAGMA table_info(food_items)")
+    if 'quantity' not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE food_items ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0)")
+    # A product's lots in expiry order, for first-expired-first-out. It
+    # leads with the name, so it serves the name sort in place of the
+    # name index, which writes no longer pay for.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_food_items_product_expiry ON food_items (name, category, expiry_date)")
+    c.execute("DROP INDEX IF EXISTS idx_food_items_name")
+
+    c.execute("CREATE TEMP TABLE lot_merges (id INTEGER PRIMARY KEY, quantity INTEGER)")
+    c.execute("INSERT INTO lot_merges SELECT MIN(id), SUM(quantity) FROM food_items "
+              "GROUP BY name, category, expiry_date, notes HAVING COUNT(*) > 1")
+    c.execute("UPDATE food_items SET quantity = (SELECT quantity FROM lot_merges WHERE lot_merges.id = food_items.id) "
+              "WHERE id IN (SELECT id FROM lot_merges)")
+    c.execute("DELETE FROM food_items WHERE id NOT IN "
+              "(SELECT MIN(id) FROM food_items GROUP BY name, category, expiry_date, notes)")
+    merged = c.rowcount
+    c.execute("DROP TABLE lot_merges")
+    if merged:
+        print(f"Merged {merged} duplicate items into lots")
+
+# 7: units and lot expiry date on log events, and the per product daily
+# consumption and waste behind usage_analytics.py
+def migrate_add_usage_analytics(c):
+    c.execute("PRAGMA table_info(usage_log)")
+    columns = [column[1] for column in c.fetchall()]
+    if 'quantity' not in columns:
+        c.execute("ALTER TABLE usage_log ADD COLUMN quantity INTEGER")
+    if 'expiry_date' not in columns:
+        c.execute("ALTER TABLE usage_log ADD COLUMN expiry_date TEXT")
+    # Clustered by day, so the rates read the days of their window in one run
+    c.execute('''CREATE TABLE IF NOT EXISTS usage_product_daily
+                 (day INTEGER NOT NULL, name TEXT NOT NULL, category TEXT NOT NULL,
+                  consumed INTEGER NOT NULL, wasted INTEGER NOT NULL,
+                  PRIMARY KEY (day, name, category)) WITHOUT ROWID''')
+    c.execute("CREATE TABLE IF NOT EXISTS usage_analytics_state "
+              "(id INTEGER PRIMARY KEY CHECK (id = 0), last_log_id INTEGER NOT NULL)")
+    c.execute("INSERT OR IGNORE INTO usage_analytics_state (id, last_log_id) VALUES (0, 0)")
+
+# 8: the time and file size after each step of a maintenance run
+def migrate_add_maintenance_log(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS maintenance_log
+                 (id INTEGER PRIMARY KEY, run_at TEXT NOT NULL, step TEXT NOT NULL, seconds REAL NOT NULL,
+                  file_bytes INTEGER NOT NULL, detail TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_run_at ON maintenance_log (run_at)")
+
+# 9: item counts in the summary tables add up the units of each lot
+def migrate_count_lot_units(c):
+    for trigger in ('food_items_stats_insert', 'food_items_stats_delete', 'food_items_stats_update'):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        c.execute(STATS_TRIGGERS[trigger])
+    fill_statistics(c)
+
+MIGRATIONS = [
+    migrate_base_tables,
+    migrate_add_indexes,
+    migrate_add_statistics,
+    migrate_add_usage_rollups,
+    migrate_add_inventory_version,
+    migrate_add_lots,
+    migrate_add_usage_analytics,
+    migrate_add_maintenance_log,
+    migrate_count_lot_units,
+]
+
+FTS_TRIGGERS = {
+    'food_items_fts_insert': '''CREATE TRIGGER IF NOT EXISTS food_items_fts_insert
+        AFTER INSERT ON food_items BEGIN
+            INSERT INTO food_items_fts (rowid, name, notes, category)
+            VALUES (new.id, new.name, new.notes, new.category);
+        END''',
+    'food_items_fts_delete': '''CREATE TRIGGER IF NOT EXISTS food_items_fts_delete
+        AFTER DELETE ON food_items BEGIN
+            INSERT INTO food_items_fts (food_items_fts, rowid, name, notes, category)
+            VALUES ('delete', old.id, old.name, old.notes, old.category);
+        END''',
+    'food_items_fts_update': '''CREATE TRIGGER IF NOT EXISTS food_items_fts_update
+        AFTER UPDATE OF name, notes, category ON food_items BEGIN
+            INSERT INTO food_items_fts (food_items_fts, rowid, name, notes, category)
+            VALUES ('delete', old.id, old.name, old.notes, old.category);
+            INSERT INTO food_items_fts (rowid, name, notes, category)
+            VALUES (new.id, new.name, new.notes, new.category);
+        END''',
+}
+
+EXPIRY_DAY_TRIGGERS = {
+    'food_items_expiry_day_insert': f'''CREATE TRIGGER IF NOT EXISTS food_items_expiry_day_insert
+        AFTER INSERT ON food_items BEGIN
+            UPDATE food_items SET expiry_day = {day_from_text("new.expiry_date")} WHERE id = new.id;
+        END''',
+    'food_items_expiry_day_update': f'''CREATE TRIGGER IF NOT EXISTS food_items_expiry_day_update
+        AFTER UPDATE OF expiry_date ON food_items BEGIN
+            UPDATE food_items SET expiry_day = {day_from_text("new.expiry_date")} WHERE id = new.id;
+        END''',
+}
+
+
+class InventoryStore:
+    """Food inventory in a SQLite database, usable without a display.
+
+    Opening a store migrates the schema and sets up the optional full-text
+    index and day-number columns. Methods raise sqlite3.Error on database
+    failures and leave reporting them to the caller.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, use_fts=USE_FTS, use_epoch_days=USE_EPOCH_DAYS, **settings):
+        self.path = path
+        # settings are passed to connect()
+        self.conn = connect(path, **settings)
+        self.c = self.conn.cursor()
+        # Log events are buffered; see log_usage()
+        self.usage_log = UsageLogWriter(self.conn)
+
+        # Rows whose expiry date could not be converted to a day number
+        self.malformed_expiry_rows = []
+
+        self.run_migrations()
+        self.has_fts = self.setup_fts(use_fts)
+        self.conn.commit()
+        self.has_epoch_days = self.setup_epoch_days(use_epoch_days)
+
+        # Column used for expiry range filters and sorting
+        if self.has_epoch_days:
+            self.expiry_column = "expiry_day"
+            self.expiry_day_sql = "expiry_day"
+        else:
+            self.expiry_column = "expiry_date"
+            self.expiry_day_sql = day_from_text("expiry_date")
+
+        # expired/soon/fresh computed by SQLite, see status_params().
+        # Invalid dates count as expired.
+        day = self.expiry_day_sql
+        self.status_sql = (f"CASE WHEN {day} IS NULL OR {day} < ? THEN 'expired' "
+                           f"WHEN {day} <= ? THEN 'soon' ELSE 'fresh' END")
+
+        # Sort options mapped to ORDER BY columns
+        self.sort_columns = {
+            "expiry_date": self.expiry_column,
+            "name": "name",
+            "category": "category",
+        }
+
+    def close(self):
+        try:
+            self.usage_log.flush()
+        except sqlite3.Error as e:
+            print(f"Could not write {len(self.usage_log.buffer)} usage log events: {e}")
+        self.conn.close()
+
+    # Run the migrations this database has not seen yet
+    def run_migrations(self):
+        c = self.c
+        c.execute("PRAGMA user_version")
+        version = c.fetchone()[0]
+        if version > len(MIGRATIONS):
+            print(f"Database schema version {version} is newer than this application")
+            return
+
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            # Each migration and its version bump commit together. The write
+            # lock is taken up front and the version read again, as another
+            # process may have run this migration since it was first read.
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.execute("PRAGMA user_version")
+                if c.fetchone()[0] >= number:
+                    self.conn.commit()
+                    continue
+                migration(c)
+                c.execute(f"PRAGMA user_version = {number}")
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+            print(f"Upgraded database schema to version {number}")
+
+    def setup_fts(self, use_fts):
+        c = self.c
+        c.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'food_items_fts_%'")
+        existing_triggers = {row[0] for row in c.fetchall()}
+
+        if not use_fts:
+            # Stop maintaining the index; it is rebuilt when FTS is turned back on
+            for trigger in existing_triggers:
+                c.execute(f"DROP TRIGGER {trigger}")
+            return False
+
+        try:
+            # External content table: the text lives in food_items only
+            c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS food_items_fts
+                         USING fts5(name, notes, category, content='food_items',
+                                    content_rowid='id', prefix='2 3')''')
+        except sqlite3.OperationalError as e:
+            # FTS5 not compiled into this SQLite, the triggers would break writes
+            for trigger in existing_triggers:
+                c.execute(f"DROP TRIGGER {trigger}")
+            print(f"Full-text search unavailable, using name search: {e}")
+            return False
+
+        for sql in FTS_TRIGGERS.values():
+            c.execute(sql)
+
+        if existing_triggers != set(FTS_TRIGGERS):
+            # New index, or rows were written while it was not maintained
+            c.execute("INSERT INTO food_items_fts (food_items_fts) VALUES ('rebuild')")
+            print("Built full-text search index")
+        return True
+
+    def setup_epoch_days(self, use_epoch_days):
+        self.c.execute("PRAGMA table_info(food_items)")
+        converted = 'expiry_day' in [column[1] for column in self.c.fetchall()]
+        if not use_epoch_days:
+            # Once converted the triggers keep expiry_day current regardless
+            return False
+        if not converted:
+            self.convert_to_epoch_days()
+        return True
+
+    # One-time conversion of existing rows to day numbers
+    def convert_to_epoch_days(self):
+        c = self.c
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("PRAGMA table_info(food_items)")
+            if 'expiry_day' in [column[1] for column in c.fetchall()]:
+                # Another process converted it first
+                self.conn.commit()
+                return
+            c.execute("ALTER TABLE food_items ADD COLUMN expiry_day INTEGER")
+            c.execute(f"UPDATE food_items SET expiry_day = {day_from_text('expiry_date')}")
+            converted = c.rowcount
+
+            # Legacy rows that strptime accepts but are not canonical ISO text,
+            # e.g. "2025-4-5", are rewritten; anything else is reported
+            c.execute("SELECT id, name, expiry_date FROM food_items WHERE expiry_day IS NULL")
+            repaired = 0
+            for item_id, name, expiry_date in c.fetchall():
+                try:
+                    expiry = parse_expiry_date(str(expiry_date).strip())
+                except ValueError:
+                    self.malformed_expiry_rows.append((item_id, name, expiry_date))
+                    continue
+                c.execute("UPDATE food_items SET expiry_date = ?, expiry_day = ? WHERE id = ?",
+                          (expiry.isoformat(), epoch_day(expiry), item_id))
+                repaired += 1
+
+            c.execute("CREATE INDEX IF NOT EXISTS idx_food_items_expiry_day ON food_items (expiry_day)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_food_items_category_expiry_day "
+                      "ON food_items (category, expiry_day)")
+            for sql in EXPIRY_DAY_TRIGGERS.values():
+                c.execute(sql)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        malformed = self.malformed_expiry_rows
+        print(f"Converted {converted - len(malformed)} expiry dates to day numbers "
+              f"({repaired} reformatted, {len(malformed)} malformed)")
+        for item_id, name, expiry_date in malformed:
+            print(f"  Malformed expiry date for item {item_id} ({name}): {expiry_date!r}")
+
+    # Value to compare against expiry_column for a given date
+    def expiry_param(self, day):
+        return epoch_day(day) if self.has_epoch_days else day.isoformat()
+
+    # Parameters for status_sql: (today, last day that counts as soon)
+    def status_params(self, today=None):
+        today = today or datetime.now().date()
+        return [epoch_day(today), epoch_day(today) + EXPIRING_SOON_DAYS]
+
+    # Buffer a usage_log event. Events are written in batches when enough
+    # have built up; flush_usage_log() writes the rest, close() flushes too.
+    # Call only outside a transaction, a flush commits.
+    def log_usage(self, item_name, action, category=None, item_id=None, quantity=None, expiry_date=None):
+        self.usage_log.add(item_name, action, category, item_id, quantity, expiry_date)
+        self.usage_log.flush_if_due()
+
+    # Write buffered log events if the oldest has waited long enough; for
+    # callers with idle time such as the database thread
+    def flush_usage_log(self, due_only=False):
+        if due_only:
+            self.usage_log.flush_if_due()
+        else:
+            self.usage_log.flush()
+
+    # expiry_date is a datetime.date. The quantity is added to the lot of the
+    # same product, expiry date and notes if there is one, otherwise it
+    # makes a new lot; returns the lot's id.
+    def add_item(self, name, category, expiry_date, notes='', quantity=1):
+        try:
+            self.c.execute("SELECT MIN(id) FROM food_items "
+                           "WHERE name = ? AND category = ? AND expiry_date = ? AND notes IS ?",
+                           (name, category, expiry_date.isoformat(), notes))
+            item_id = self.c.fetchone()[0]
+            if item_id is not None:
+                self.c.execute("UPDATE food_items SET quantity = quantity + ? WHERE id = ?", (quantity, item_id))
+            if item_id is None or self.c.rowcount == 0:
+                self.c.execute("INSERT INTO food_items (name, category, expiry_date, notes, quantity) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (name, category, expiry_date.isoformat(), notes, quantity))
+                item_id = self.c.lastrowid
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self.log_usage(name, "add", category, item_id, quantity, expiry_date.isoformat())
+        return item_id
+
+    # Add items from (line number, record) pairs as read by read_import_file().
+    # Each chunk is validated, then written with its log entries in one
+    # transaction. Records of the same lot (product, expiry date and notes)
+    # add up into one, as they do with lots already stored. Yields (records
+    # read, items imported, errors) after every chunk, errors being a list
+    # of (line number, message).
+    def import_items(self, records, chunk_size=IMPORT_CHUNK_SIZE):
+        read = imported = pending = 0
+        errors = []
+        chunk = {}      # (name, category, expiry_date, notes) -> quantity
+        # Reading and validating (date parsing) is timed apart from writing
+        parse_started = time.perf_counter()
+        for line_number, record in records:
+            read += 1
+            if record is None:
+                errors.append((line_number, "Not a valid record"))
+            else:
+                name = str(record.get('name') or '').strip()
+                expiry_text = str(record.get('expiry_date') or '').strip()
+                quantity_text = str(record.get('quantity') or '1').strip()
+                if not name:
+                    errors.append((line_number, "Missing name"))
+                elif not quantity_text.isdigit() or int(quantity_text) < 1:
+                    errors.append((line_number, f"Invalid quantity {quantity_text!r}"))
+                else:
+                    try:
+                        expiry = parse_expiry_date(expiry_text)
+                    except ValueError:
+                        errors.append((line_number, f"Invalid expiry date {expiry_text!r}"))
+                    else:
+                        lot = (name, str(record.get('category') or '').strip() or 'Other',
+                               expiry.isoformat(), str(record.get('notes') or ''))
+                        chunk[lot] = chunk.get(lot, 0) + int(quantity_text)
+                        pending += 1
+
+            if pending >= chunk_size:
+                timings.record("import_from_file", "parse", time.perf_counter() - parse_started, pending)
+                with timings.timer("import_from_file", "commit") as timer:
+                    timer.rows = self.write_import_chunk([lot + (quantity,) for lot, quantity in chunk.items()])
+                imported += pending
+                chunk = {}
+                pending = 0
+                yield read, imported, errors
+                parse_started = time.perf_counter()
+
+        if chunk:
+            timings.record("import_from_file", "parse", time.perf_counter() - parse_started, pending)
+            with timings.timer("import_from_file", "commit") as timer:
+                timer.rows = self.write_import_chunk([lot + (quantity,) for lot, quantity in chunk.items()])
+            imported += pending
+        yield read, imported, errors
+
+    # rows are (name, category, expiry_date, notes, quantity), one per lot.
+    # Quantities of lots already stored are added to them, the rest are
+    # inserted. The writes are set-based statements that go through the
+    # usual triggers (full-text index, summary counts, day numbers, change
+    # counter): suspending those would change the schema, which costs every
+    # other connection its prepared statements, and would leave other
+    # stations' writes unindexed meanwhile.
+    def write_import_chunk(self, rows):
+        c = self.c
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # The write lock is held, so every new id is above this one
+            c.execute("SELECT COALESCE(MAX(id), 0) FROM food_items")
+            last_id = c.fetchone()[0]
+
+            # Match the lots against stored ones through the product index
+            c.execute("CREATE TEMP TABLE IF NOT EXISTS import_lots (name TEXT, category TEXT, expiry_date TEXT, "
+                      "notes TEXT, quantity INTEGER, lot_id INTEGER)")
+            c.execute("CREATE INDEX IF NOT EXISTS temp.idx_import_lots_lot_id ON import_lots (lot_id)")
+            c.execute("DELETE FROM import_lots")
+            c.executemany("INSERT INTO import_lots (name, category, expiry_date, notes, quantity) "
+                          "VALUES (?, ?, ?, ?, ?)", rows)
+            c.execute("UPDATE import_lots SET lot_id = (SELECT MIN(id) FROM food_items f "
+                      "WHERE f.name = import_lots.name AND f.category = import_lots.category "
+                      "AND f.expiry_date = import_lots.expiry_date AND f.notes IS import_lots.notes)")
+            c.execute("UPDATE food_items SET quantity = quantity + "
+                      "(SELECT quantity FROM import_lots WHERE lot_id = food_items.id) "
+                      "WHERE id IN (SELECT lot_id FROM import_lots)")
+            c.execute("INSERT INTO usage_log (item_name, action, timestamp, category, item_id, quantity, expiry_date) "
+                      "SELECT name, 'add', ?, category, lot_id, quantity, expiry_date FROM import_lots "
+                      "WHERE lot_id IS NOT NULL", (timestamp,))
+
+            c.execute("INSERT INTO food_items (name, category, expiry_date, notes, quantity) "
+                      "SELECT name, category, expiry_date, notes, quantity FROM import_lots "
+                      "WHERE lot_id IS NULL ORDER BY rowid")
+            c.execute("INSERT INTO usage_log (item_name, action, timestamp, category, item_id, quantity, expiry_date) "
+                      "SELECT name, 'add', ?, category, id, quantity, expiry_date FROM food_items WHERE id > ?",
+                      (timestamp, last_id))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return len(rows)
+
+    # Returns False if there was no such item. The quantity is kept unless given.
+    def update_item(self, item_id, name, category, expiry_date, notes='', quantity=None):
+        try:
+            self.c.execute("UPDATE food_items SET name=?, category=?, expiry_date=?, notes=?, "
+                           "quantity=COALESCE(?, quantity) WHERE id=?",
+                           (name, category, expiry_date.isoformat(), notes, quantity, item_id))
+            updated = self.c.rowcount > 0
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        if updated:
+            self.log_usage(name, "edit", category, item_id)
+        return updated
+
+    # Returns False if there was no such item, as when another station
+    # deleted it first; only a delete that happened is logged
+    def delete_item(self, item_id, item_name):
+        c = self.c
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("SELECT category, quantity, expiry_date FROM food_items WHERE id=?", (item_id,))
+            row = c.fetchone()
+            if row is not None:
+                c.execute("DELETE FROM food_items WHERE id=?", (item_id,))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        if row is None:
+            return False
+        category, quantity, expiry_date = row
+        self.log_usage(item_name, "delete", category, item_id, quantity, expiry_date)
+        return True
+
+    # Bulk changes. Each runs as one transaction that also writes its log
+    # events, one per item, and returns what the cache needs to follow it.
+
+    # Delete the given items; returns the ids that existed
+    def delete_items(self, item_ids):
+        c = self.c
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            rows = fetch_rows_by_id(c, "id, name, category, quantity, expiry_date", list(item_ids))
+            execute_for_ids(c, "DELETE FROM food_items WHERE id IN ({ids})", list(rows))
+            c.executemany(LOG_INSERT_SQL, [usage_event(name, "delete", category, item_id, quantity, expiry_date)
+                                           for item_id, name, category, quantity, expiry_date in rows.values()])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return list(rows)
+
+    # Take `units` of a product (name and category) from its lots, first
+    # expired first out, through the product index. Lots past their date or
+    # with an unreadable one are passed over. Emptied lots are deleted.
+    # Raises ValueError if fewer units are in stock. Returns (snapshot rows
+    # of the lots taken from and kept, ids of the lots deleted).
+    def consume(self, name, category, units, today=None):
+        if units < 1:
+            raise ValueError("The number of units must be at least 1")
+        today = today or datetime.now().date()
+        c = self.c
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute(f"SELECT id, quantity, expiry_date FROM food_items "
+                      f"WHERE name = ? AND category = ? AND {self.expiry_day_sql} >= ? "
+                      f"ORDER BY {self.expiry_column}, id", (name, category, epoch_day(today)))
+            taken = []          # (id, units left in the lot, units taken, expiry date)
+            remaining = units
+            for item_id, quantity, expiry_date in c.fetchall():
+                if remaining == 0:
+                    break
+                used = min(quantity, remaining)
+                taken.append((item_id, quantity - used, used, expiry_date))
+                remaining -= used
+            if remaining:
+                raise ValueError(f"Only {units - remaining} of {name} ({category}) in stock")
+
+            deleted_ids = [item_id for item_id, left, _, _ in taken if left == 0]
+            kept = [(left, item_id) for item_id, left, _, _ in taken if left > 0]
+            execute_for_ids(c, "DELETE FROM food_items WHERE id IN ({ids})", deleted_ids)
+            c.executemany("UPDATE food_items SET quantity = ? WHERE id = ?", kept)
+            c.executemany(LOG_INSERT_SQL, [usage_event(name, "consume", category, item_id, used, expiry_date)
+                                           for item_id, _, used, expiry_date in taken])
+            rows = self.snapshot_rows([item_id for _, item_id in kept])
+            self.conn.commit()
+        except (sqlite3.Error, ValueError):
+            self.conn.rollback()
+            raise
+        return rows, deleted_ids
+
+    # Products (name and category) with their lots summed up, as (name,
+    # category, quantity, lots, first expiry date), by name then category.
+    # Keyset paged like page_items(): `after` is the (name, category) of
+    # the last product of the previous page. Returns (rows, cursor); with no
+    # limit, every product and no cursor.
+    def product_summaries(self, category=None, search=None, after=None, limit=200):
+        where = []
+        params = []
+        if category and category != "All":
+            where.append("category = ?")
+            params.append(category)
+        if search:
+            where.append("instr(lower(name), ?) > 0")
+            params.append(search.lower())
+        if after is not None:
+            where.append("(name, category) > (?, ?)")
+            params += list(after)
+        query = "SELECT name, category, SUM(quantity), COUNT(*), MIN(expiry_date) FROM food_items"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " GROUP BY name, category ORDER BY name, category"
+        if limit is None:
+            self.c.execute(query, params)
+            return self.c.fetchall(), None
+        query += " LIMIT ?"
+        params.append(limit + 1)
+        self.c.execute(query, params)
+        rows = self.c.fetchall()
+        cursor = rows[limit - 1][:2] if len(rows) > limit else None
+        return rows[:limit], cursor
+
+    # Lots of one product as (id, expiry_date, quantity, notes, status), in
+    # the order consume() takes them
+    def product_lots(self, name, category, today=None):
+        self.c.execute(f"SELECT id, expiry_date, quantity, notes, {self.status_sql} FROM food_items "
+                       f"WHERE name = ? AND category = ? ORDER BY {self.expiry_column}, id",
+                       self.status_params(today) + [name, category])
+        return self.c.fetchall()
+
+    # Ids of items whose expiry date has passed. Unreadable dates are left
+    # out, they are shown as expired but may still be good.
+    def expired_item_ids(self, today=None):
+        today = today or datetime.now().date()
+        self.c.execute(f"SELECT id FROM food_items WHERE {self.expiry_day_sql} < ?", (epoch_day(today),))
+        return [row[0] for row in self.c.fetchall()]
+
+    # Move the given items to `category`; returns their snapshot rows
+    def recategorize_items(self, item_ids, category):
+        return self.bulk_edit(item_ids, "UPDATE food_items SET category = ? WHERE id IN ({ids})", (category,))
+
+    # Move the expiry dates of the given items by `days` (negative for
+    # earlier); unreadable dates are left alone. Returns snapshot rows.
+    def shift_expiry(self, item_ids, days):
+        return self.bulk_edit(item_ids, "UPDATE food_items SET expiry_date = date(expiry_date, ?) "
+                                        f"WHERE id IN ({{ids}}) AND {day_from_text('expiry_date')} IS NOT NULL",
+                              (f"{days:+d} days",))
+
+    def bulk_edit(self, item_ids, sql, params):
+        c = self.c
+        item_ids = list(item_ids)
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            execute_for_ids(c, sql, item_ids, params)
+            rows = self.snapshot_rows(item_ids)
+            c.executemany(LOG_INSERT_SQL, [usage_event(row[1], "edit", row[2], row[0]) for row in rows])
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return rows
+
+    # Items as (id, name, category, expiry_date, notes, quantity, status),
+    # filtered by category, status and a search (full-text when available,
+    # otherwise a name substring), in the order of a sort option
+    def list_items(self, category=None, sort_by="expiry_date", search=None, status=None,
+                   descending=False, limit=None, today=None):
+        params = self.status_params(today)
+        where = []
+        if category and category != "All":
+            where.append("category = ?")
+            params.append(category)
+        if search:
+            match = fts_match_expression(search) if self.has_fts else None
+            if match:
+                where.append("id IN (SELECT rowid FROM food_items_fts WHERE food_items_fts MATCH ?)")
+                params.append(match)
+            else:
+                where.append("instr(lower(name), ?) > 0")
+                params.append(search.lower())
+        if status:
+            where.append(f"{self.status_sql} = ?")
+            params += self.status_params(today) + [status]
+
+        query = f"SELECT {ITEM_COLUMNS}, {self.status_sql} FROM food_items"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        direction = " DESC" if descending else ""
+        order_by = self.sort_columns.get(sort_by, self.expiry_column)
+        query += f" ORDER BY {order_by}{direction}, id{direction}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        self.c.execute(query, params)
+        return self.c.fetchall()
+
+    # One page of items with their status, for keyset pagination: the
+    # first `limit` items after the cursor `after`, which is the
+    # (sort value, id) of the last item of the previous page, or None for
+    # the first page. `until` (a date) keeps only items expiring by then.
+    # Returns (rows, cursor of the next page or None).
+    def page_items(self, sort_by="id", after=None, limit=50, category=None, until=None, today=None):
+        column = "id" if sort_by == "id" else self.sort_columns.get(sort_by, self.expiry_column)
+        params = self.status_params(today)
+        where = []
+        if category and category != "All":
+            where.append("category = ?")
+            params.append(category)
+        if until is not None:
+            where.append(f"{self.expiry_column} <= ?")
+            params.append(self.expiry_param(until))
+        if after is not None:
+            value, last_id = after
+            if column == "id":
+                where.append("id > ?")
+                params.append(last_id)
+            elif value is None:
+                # NULLs sort first
+                where.append(f"({column} IS NULL AND id > ? OR {column} IS NOT NULL)")
+                params.append(last_id)
+            else:
+                where.append(f"({column}, id) > (?, ?)")
+                params += [value, last_id]
+
+        query = f"SELECT {ITEM_COLUMNS}, {self.status_sql}, {column} FROM food_items"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {column}, id LIMIT ?" if column != "id" else " ORDER BY id LIMIT ?"
+        params.append(limit + 1)
+        self.c.execute(query, params)
+        rows = self.c.fetchall()
+        cursor = (rows[limit - 1][-1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [row[:-1] for row in rows[:limit]], cursor
+
+    # (id, name, category, expiry_date, notes, quantity, expiry_day) of every
+    # item, or of the given ids, for InventoryCache. expiry_day is None for
+    # dates that cannot be read, whether or not day numbers are stored. With
+    # `limit`, only the first items by expiry date, for a quick first page.
+    def snapshot_rows(self, ids=None, limit=None):
+        columns = f"{ITEM_COLUMNS}, {self.expiry_day_sql}"
+        if ids is None and limit is not None:
+            self.c.execute(f"SELECT {columns} FROM food_items ORDER BY {self.expiry_column}, id LIMIT ?", (limit,))
+            return self.c.fetchall()
+        if ids is None:
+            self.c.execute(f"SELECT {columns} FROM food_items")
+            return self.c.fetchall()
+        return list(fetch_rows_by_id(self.c, columns, ids).values())
+
+    # Displayed rows plus status tag for the given ids, keyed by id
+    def fetch_items(self, ids, today=None):
+        return fetch_rows_by_id(self.c, f"{ITEM_COLUMNS}, {self.status_sql}", ids, self.status_params(today))
+
+    # Ids matching a full-text query, best match first when ranked. None
+    # when there is no index or the query has no words to match.
+    def search_ids(self, query, ranked=True):
+        if not self.has_fts:
+            return None
+        match = fts_match_expression(query)
+        if not match:
+            return None
+        sql = "SELECT rowid FROM food_items_fts WHERE food_items_fts MATCH ?"
+        if ranked:
+            # bm25 scoring is the expensive part of a broad prefix query
+            sql += " ORDER BY rank"
+        self.c.execute(sql, (match,))
+        return [row[0] for row in self.c.fetchall()]
+
+    # (id, name, category, expiry_date, days_left) of items expired or
+    # expiring within `days`, and of items with unreadable dates, for which
+    # days_left is None
+    def upcoming_expiries(self, today=None, days=EXPIRING_SOON_DAYS):
+        today = today or datetime.now().date()
+        threshold = today + timedelta(days=days)
+        self.c.execute(f"SELECT id, name, category, expiry_date, {self.expiry_day_sql} - ? FROM food_items "
+                       f"WHERE {self.expiry_column} <= ? OR {self.expiry_day_sql} IS NULL",
+                       (epoch_day(today), self.expiry_param(threshold)))
+        return self.c.fetchall()
+
+    # Changes whenever food_items does, from any connection
+    def inventory_version(self):
+        self.c.execute("SELECT version FROM inventory_version")
+        return self.c.fetchone()[0]
+
+    # Changes whenever another connection commits to the database
+    def data_version(self):
+        self.c.execute("PRAGMA data_version")
+        return self.c.fetchone()[0]
+
+    # Read from the summary tables, see STATS_TABLES
+    def statistics(self, today=None):
+        today = today or datetime.now().date()
+        c = self.c
+        # Count the buffered log events too
+        self.usage_log.flush()
+
+        c.execute("SELECT category, item_count FROM stats_category ORDER BY category")
+        categories = c.fetchall()
+        total = sum(count for _, count in categories)
+
+        # Same comparisons as the item queries, made once per distinct date.
+        # With day numbers, dates that do not convert are not counted.
+        if self.has_epoch_days:
+            bucket, today_param = day_from_text("expiry_date"), epoch_day(today)
+            soon_param = today_param + EXPIRING_SOON_DAYS
+        else:
+            bucket, today_param = "expiry_date", today.isoformat()
+            soon_param = (today + timedelta(days=EXPIRING_SOON_DAYS)).isoformat()
+        c.execute(f"SELECT COALESCE(SUM(CASE WHEN {bucket} < ? THEN item_count END), 0), "
+                  f"COALESCE(SUM(CASE WHEN {bucket} BETWEEN ? AND ? THEN item_count END), 0) "
+                  f"FROM stats_expiry_date", (today_param, today_param, soon_param))
+        expired, soon = c.fetchone()
+
+        c.execute("SELECT action, action_count FROM stats_action ORDER BY action_count DESC LIMIT 5")
+        actions = c.fetchall()
+
+        return {
+            'total': total,
+            'expired': expired,
+            'soon': soon,
+            'categories': categories,
+            'actions': actions,
+        }
+
+    # Roll usage_log events older than `days` up into usage_daily and delete
+    # them. Returns the number of events rolled up. The action counts in
+    # statistics() then cover the retained events only; usage analytics
+    # read the events before they go. With `archive_path` the events are
+    # also appended to that gzip-compressed JSON lines file.
+    def apply_log_retention(self, today=None, days=LOG_RETENTION_DAYS, archive_path=None):
+        self.usage_log.flush()
+        cutoff = ((today or datetime.now().date()) - timedelta(days=days)).isoformat()
+        c = self.c
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("SELECT 1 FROM usage_log WHERE timestamp < ? LIMIT 1", (cutoff,))
+            if c.fetchone() is None:
+                self.conn.commit()
+                return 0
+            c.execute('''INSERT INTO usage_daily (day, action, category, event_count)
+                         SELECT substr(timestamp, 1, 10), COALESCE(action, ''), COALESCE(category, ''), COUNT(*)
+                         FROM usage_log WHERE timestamp < ? GROUP BY 1, 2, 3
+                         ON CONFLICT (day, action, category) DO UPDATE
+                         SET event_count = event_count + excluded.event_count''', (cutoff,))
+
+            update_daily_usage(c)
+            if archive_path:
+                archive_log_events(c, cutoff, archive_path)
+
+            # The delete trigger keeps the action counts; suspending it
+            # would be a schema change, see write_import_chunk()
+            c.execute("DELETE FROM usage_log WHERE timestamp < ?", (cutoff,))
+            rolled_up = c.rowcount
+            reset_if_log_empty(c)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return rolled_up
+
+    # Read the log events added since the last update into the usage
+    # analytics tables; returns the number of product days written
+    def update_usage_analytics(self):
+        self.usage_log.flush()
+        self.c.execute("BEGIN IMMEDIATE")
+        try:
+            written = update_daily_usage(self.c)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return written
+
+    # Consumption and waste rates over the last `window_days` and the
+    # forecasts made from them, see usage_analytics.py. Returns a dict of
+    # row lists: categories and products (rates), at_risk (lots expected to
+    # expire unused, at most `limit`) and orders (units to order to last
+    # `horizon_days`).
+    def usage_forecast(self, today=None, window_days=RATE_WINDOW_DAYS, horizon_days=ORDER_HORIZON_DAYS,
+                       limit=200):
+        self.update_usage_analytics()
+        day = epoch_day(today or datetime.now().date())
+        c = self.c
+        try:
+            project_lots(c, self.expiry_day_sql, day, window_days)
+            forecast = {
+                'categories': category_rates(c, day, window_days),
+                'products': product_rates(c, day, window_days, limit),
+                'at_risk': lots_at_risk(c, limit),
+                'orders': order_suggestions(c, day, window_days, horizon_days),
+            }
+            # Only the temp table was written; this ends the read
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return forecast
+
+    # Differences between the summary tables and a full recount, as
+    # (table, key, stored count, actual count). Empty when consistent.
+    def check_statistics(self):
+        self.usage_log.flush()
+        c = self.c
+        mismatches = []
+        for table, (key, count, recount) in STATS_TABLES.items():
+            c.execute(f"SELECT {key}, {count} FROM {table}")
+            stored = dict(c.fetchall())
+            c.execute(recount.format(units=LOT_UNITS.format(row='')))
+            actual = dict(c.fetchall())
+            for value in stored.keys() | actual.keys():
+                if stored.get(value, 0) != actual.get(value, 0):
+                    mismatches.append((table, value, stored.get(value, 0), actual.get(value, 0)))
+        return mismatches
+
+    def rebuild_statistics(self):
+        self.c.execute("BEGIN IMMEDIATE")
+        try:
+            fill_statistics(self.c)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    # Rebuild the database file to give back the space of deleted rows; this
+    # also turns on incremental vacuum for databases made before it was.
+    # Returns the file size in bytes (before, after).
+    def vacuum(self):
+        self.usage_log.flush()
+        before = os.path.getsize(self.path)
+        self.c.execute("VACUUM")
+        # In WAL mode the rebuilt pages are in the -wal file until checkpointed
+        self.c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return before, os.path.getsize(self.path)
+
+    # Size of the database file and its write-ahead log, in bytes
+    def database_bytes(self):
+        wal_path = self.path + "-wal"
+        return os.path.getsize(self.path) + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+
+    # Copy the database to `target_path` with the SQLite backup API, `pages`
+    # at a time, calling progress(pages remaining, page count) after each
+    # step. In WAL mode the copy is read from one snapshot: other stations
+    # keep writing meanwhile, and their commits cannot restart it. In the
+    # other journal modes the lock is let go between steps instead, see
+    # BACKUP_STEP_PAUSE_SECONDS. The file appears under its name once
+    # complete; a failed copy is removed. Returns the page count.
+    def backup(self, target_path, pages=BACKUP_STEP_PAGES, progress=None):
+        self.usage_log.flush()
+        self.c.execute("PRAGMA journal_mode")
+        wal = self.c.fetchone()[0] == "wal"
+        partial_path = target_path + ".part"
+        try:
+            try:
+                page_count = copy_database(self.conn, partial_path, pages, progress, hold_lock=wal)
+            except BackupRestarted:
+                page_count = copy_database(self.conn, partial_path, pages, progress, hold_lock=True)
+        except BaseException:
+            for path in (partial_path, partial_path + "-journal"):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        os.replace(partial_path, target_path)
+        return page_count
+
+    # Refresh the statistics the query planner uses to pick indexes,
+    # sampling at most `limit` rows per index
+    def analyze(self, limit=ANALYZE_LIMIT):
+        self.c.execute(f"PRAGMA analysis_limit = {int(limit)}")
+        self.c.execute("ANALYZE")
+        self.conn.commit()
+
+    # Give the free pages left by deletes back to the file system, without
+    # the rebuild vacuum() does. A database made before incremental vacuum
+    # was turned on is rebuilt once. Returns (pages freed, rebuilt).
+    def incremental_vacuum(self):
+        self.usage_log.flush()
+        c = self.c
+        c.execute("PRAGMA auto_vacuum")
+        if c.fetchone()[0] != 2:
+            self.vacuum()
+            return 0, True
+        c.execute("PRAGMA freelist_count")
+        free_pages = c.fetchone()[0]
+        # executescript() runs the pragma to completion, execute() would
+        # free one page per step
+        self.conn.executescript("PRAGMA incremental_vacuum")
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        c.execute("PRAGMA freelist_count")
+        return free_pages - c.fetchone()[0], False
+
+    # Add one step of a maintenance run to maintenance_log
+    def record_maintenance(self, run_at, step, seconds, file_bytes, detail=""):
+        try:
+            self.c.execute("INSERT INTO maintenance_log (run_at, step, seconds, file_bytes, detail) "
+                           "VALUES (?, ?, ?, ?, ?)", (run_at, step, seconds, file_bytes, detail))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    # Start time of the latest maintenance run as text, or None
+    def last_maintenance(self):
+        self.c.execute("SELECT MAX(run_at) FROM maintenance_log")
+        return self.c.fetchone()[0]
+
+    # Steps of the last `runs` maintenance runs as (run_at, step, seconds,
+    # file_bytes, detail), newest run first
+    def maintenance_history(self, runs=5):
+        self.c.execute("SELECT run_at, step, seconds, file_bytes, detail FROM maintenance_log "
+                       "WHERE run_at IN (SELECT DISTINCT run_at FROM maintenance_log ORDER BY run_at DESC LIMIT ?) "
+                       "ORDER BY run_at DESC, id", (runs,))
+        return self.c.fetchall()
+
+    # Write items to a CSV file, see export_items()
+    def export_csv(self, file_path, ids=None, progress=None, cancel_event=None):
+        return export_items(self.conn, file_path, ids, progress, cancel_event)
+
+
+# Verify the statistics summary tables against a full recount:
+#     python inventory_store.py --check-stats [--repair] [--db food_database.db]
+def main():
+    parser = argparse.ArgumentParser(description="Food inventory database maintenance")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file")
+    parser.add_argument("--check-stats", action="store_true",
+                        help="compare the statistics summary tables with a full recount of units and log events")
+    parser.add_argument("--repair", action="store_true", help="rebuild the summary tables if they differ")
+    args = parser.parse_args()
+    if not args.check_stats:
+        parser.print_help()
+        return 0
+
+    store = InventoryStore(args.db)
+    try:
+        mismatches = store.check_statistics()
+        for table, value, stored, actual in mismatches:
+            print(f"{table}: {value!r} counted {stored}, actually {actual}")
+        if not mismatches:
+            print("Statistics are consistent")
+            return 0
+        if args.repair:
+            store.rebuild_statistics()
+            print(f"Rebuilt statistics ({len(mismatches)} differences)")
+            return 0
+        return 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_store import InventoryStore
+
+
+# A store on a new database, once keeping expiry dates as text and once
+# with day numbers
+@pytest.fixture(params=[False, True], ids=["text", "epoch_days"])
+def store(request, tmp_path):
+    store = InventoryStore(str(tmp_path / "inventory.db"), use_epoch_days=request.param)
+    yield store
+    store.close()
@@ -0,0 +1,74 @@
+"""Page cursors of the HTTP API, decoded and through request dispatch."""
+import asyncio
+from datetime import date
+
+import pytest
+
+from inventory_server import ApiError, InventoryServer, StorePool, decode_cursor, encode_cursor
+from inventory_store import InventoryStore
+
+BAD_CURSORS = [
+    ("id", "not base64!"),
+    ("id", encode_cursor({'value': 1, 'id': 1})),
+    ("id", encode_cursor([1])),
+    ("id", encode_cursor([1, 2, 3])),
+    ("id", encode_cursor(["5", 5])),
+    ("id", encode_cursor([True, 1])),
+    ("id", encode_cursor([1, 1.5])),
+    ("id", encode_cursor([1, "1"])),
+    ("name", encode_cursor([["Milk"], 1])),
+    ("name", encode_cursor([{'name': "Milk"}, 1])),
+    ("name", encode_cursor([3, 1])),
+    ("expiry_date", encode_cursor([2.5, 1])),
+    ("category", encode_cursor(["Dairy", None])),
+]
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "server.db")
+    store = InventoryStore(path)
+    for n in range(5):
+        store.add_item(f"Item {n}", "Dairy", date(2030, 1, 1 + n))
+    store.close()
+    pool = StorePool(path, workers=1)
+    yield InventoryServer(pool)
+    pool.close()
+
+def get(server, target):
+    status, payload, _ = asyncio.run(server.dispatch("GET", target, {}, b""))
+    return status, payload
+
+
+@pytest.mark.parametrize("sort_by, cursor", [
+    ("id", [7, 7]),
+    ("name", ["Milk", 3]),
+    ("name", [None, 3]),
+    ("category", ["Dairy", 4]),
+    ("expiry_date", ["2030-01-05", 2]),
+    ("expiry_date", [21919, 2]),
+    ("expiry_date", [None, 2]),
+])
+def test_cursor_round_trip(sort_by, cursor):
+    assert decode_cursor(encode_cursor(cursor), sort_by) == tuple(cursor)
+
+@pytest.mark.parametrize("sort_by, text", BAD_CURSORS)
+def test_bad_cursor_rejected(sort_by, text):
+    with pytest.raises(ApiError) as error:
+        decode_cursor(text, sort_by)
+    assert error.value.status == 400
+
+@pytest.mark.parametrize("sort_by, text", BAD_CURSORS)
+def test_bad_cursor_answers_400(server, sort_by, text):
+    assert get(server, f"/items?sort={sort_by}&after={text}") == (400, {'error': "Invalid cursor"})
+
+@pytest.mark.parametrize("sort_by", ["id", "name", "expiry_date"])
+def test_pages_follow_cursors(server, sort_by):
+    names = []
+    target = f"/items?sort={sort_by}&limit=2"
+    while target:
+        status, payload = get(server, target)
+        assert status == 200
+        names += [item['name'] for item in payload['items']]
+        target = payload['next'] and f"/items?sort={sort_by}&limit=2&after={payload['next']}"
+    assert names == [f"Item {n}" for n in range(5)]
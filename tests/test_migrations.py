@@ -0,0 +1,118 @@
+"""Schema migrations on new databases and on ones made by older versions."""
+import sqlite3
+from datetime import date
+
+import inventory_store
+from inventory_store import MIGRATIONS, InventoryStore, epoch_day
+
+
+# A database as the first version of the tracker left it: no schema
+# version, a row per item received and free-form expiry dates
+def make_legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE food_items (id INTEGER PRIMARY KEY, name TEXT, expiry_date DATE)")
+    conn.execute("ALTER TABLE food_items ADD COLUMN category TEXT DEFAULT 'Other'")
+    conn.execute("ALTER TABLE food_items ADD COLUMN notes TEXT")
+    conn.execute("CREATE TABLE usage_log (id INTEGER PRIMARY KEY, item_name TEXT, action TEXT, timestamp TEXT)")
+    conn.executemany("INSERT INTO food_items (name, expiry_date, category, notes) VALUES (?, ?, ?, ?)", [
+        ("Milk", "2030-01-05", "Dairy", None),
+        ("Milk", "2030-01-05", "Dairy", None),
+        ("Milk", "2030-01-05", "Dairy", "organic"),
+        ("Bread", "2030-1-7", "Bakery", ""),
+        ("Jam", "soon", "Pantry", ""),
+        ("Milk", "2030-01-05", "Dairy", None),
+    ])
+    conn.executemany("INSERT INTO usage_log (item_name, action, timestamp) VALUES (?, ?, ?)",
+                     [("Milk", "add", "2025-01-01 10:00:00")] * 4 + [("Jam", "delete", "2025-01-02 10:00:00")])
+    conn.commit()
+    conn.close()
+
+def schema_version(store):
+    store.c.execute("PRAGMA user_version")
+    return store.c.fetchone()[0]
+
+def lots(store):
+    store.c.execute("SELECT name, category, expiry_date, notes, quantity FROM food_items ORDER BY id")
+    return store.c.fetchall()
+
+
+def test_new_database(tmp_path):
+    store = InventoryStore(str(tmp_path / "new.db"))
+    try:
+        assert schema_version(store) == len(MIGRATIONS)
+        assert lots(store) == []
+        assert store.check_statistics() == []
+    finally:
+        store.close()
+
+def test_legacy_database(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    make_legacy_database(path)
+    store = InventoryStore(path)
+    try:
+        assert schema_version(store) == len(MIGRATIONS)
+        # The three plain Milk rows became one lot at the first one's id
+        assert lots(store) == [
+            ("Milk", "Dairy", "2030-01-05", None, 3),
+            ("Milk", "Dairy", "2030-01-05", "organic", 1),
+            ("Bread", "Bakery", "2030-1-7", "", 1),
+            ("Jam", "Pantry", "soon", "", 1),
+        ]
+        assert store.check_statistics() == []
+        stats = store.statistics()
+        assert dict(stats['categories']) == {"Dairy": 4, "Bakery": 1, "Pantry": 1}
+        assert dict(stats['actions']) == {"add": 4, "delete": 1}
+    finally:
+        store.close()
+
+def test_reopening_runs_no_migrations(tmp_path, capsys):
+    path = str(tmp_path / "legacy.db")
+    make_legacy_database(path)
+    InventoryStore(path).close()
+    assert "Merged 2 duplicate items into lots" in capsys.readouterr().out
+    store = InventoryStore(path)
+    try:
+        assert "Upgraded" not in capsys.readouterr().out
+        assert schema_version(store) == len(MIGRATIONS)
+        assert len(lots(store)) == 4
+    finally:
+        store.close()
+
+def test_day_numbers_report_malformed_dates(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    make_legacy_database(path)
+    store = InventoryStore(path, use_epoch_days=True)
+    try:
+        store.c.execute("SELECT id FROM food_items WHERE name = 'Jam'")
+        assert store.malformed_expiry_rows == [(store.c.fetchone()[0], "Jam", "soon")]
+        # Dates strptime reads are rewritten as ISO text
+        store.c.execute("SELECT expiry_date, expiry_day FROM food_items WHERE name = 'Bread'")
+        assert store.c.fetchone() == ("2030-01-07", epoch_day(date(2030, 1, 7)))
+        store.c.execute("SELECT expiry_day FROM food_items WHERE name = 'Jam'")
+        assert store.c.fetchone() == (None,)
+        assert store.check_statistics() == []
+    finally:
+        store.close()
+
+# Before migration 9 the summary tables counted a row per lot
+def test_lot_units_counted_after_upgrade(tmp_path, monkeypatch):
+    path = str(tmp_path / "v8.db")
+    monkeypatch.setattr(inventory_store, "MIGRATIONS", MIGRATIONS[:8])
+    store = InventoryStore(path)
+    store.add_item("Milk", "Dairy", date(2030, 1, 5), quantity=5)
+    store.add_item("Eggs", "Dairy", date(2030, 1, 9), quantity=12)
+    assert schema_version(store) == 8
+    assert dict(store.statistics()['categories']) == {"Dairy": 2}
+    store.close()
+
+    monkeypatch.setattr(inventory_store, "MIGRATIONS", MIGRATIONS)
+    store = InventoryStore(path)
+    try:
+        assert schema_version(store) == len(MIGRATIONS)
+        assert store.check_statistics() == []
+        assert dict(store.statistics()['categories']) == {"Dairy": 17}
+        store.consume("Eggs", "Dairy", 4, today=date(2030, 1, 1))
+        assert store.check_statistics() == []
+        assert dict(store.statistics()['categories']) == {"Dairy": 13}
+    finally:
+        store.close()
@@ -0,0 +1,122 @@
+"""The trigger-maintained summary tables against a full recount after
+every kind of write."""
+from datetime import date, timedelta
+
+import pytest
+
+from inventory_store import LOG_INSERT_SQL
+
+TODAY = date.today()
+
+
+# Lots of three products, one of them in two lots, and an expired lot
+def stock(store):
+    ids = {
+        'milk': store.add_item("Milk", "Dairy", TODAY + timedelta(days=2), quantity=3),
+        'milk_later': store.add_item("Milk", "Dairy", TODAY + timedelta(days=9), quantity=4),
+        'bread': store.add_item("Bread", "Bakery", TODAY + timedelta(days=1), quantity=2),
+        'ham': store.add_item("Ham", "Meat", TODAY - timedelta(days=1)),
+    }
+    assert store.check_statistics() == []
+    return ids
+
+def category_counts(store):
+    return dict(store.statistics(TODAY)['categories'])
+
+def action_counts(store):
+    return dict(store.statistics(TODAY)['actions'])
+
+
+def test_add_counts_units(store):
+    stock(store)
+    assert category_counts(store) == {"Dairy": 7, "Bakery": 2, "Meat": 1}
+    assert store.statistics(TODAY)['expired'] == 1
+    assert action_counts(store) == {"add": 4}
+
+def test_add_to_existing_lot(store):
+    ids = stock(store)
+    assert store.add_item("Milk", "Dairy", TODAY + timedelta(days=2), quantity=5) == ids['milk']
+    assert store.check_statistics() == []
+    assert category_counts(store)["Dairy"] == 12
+
+def test_update_item(store):
+    ids = stock(store)
+    assert store.update_item(ids['bread'], "Bread", "Pantry", TODAY + timedelta(days=5), quantity=6)
+    assert store.check_statistics() == []
+    assert category_counts(store) == {"Dairy": 7, "Pantry": 6, "Meat": 1}
+
+def test_delete_item(store):
+    ids = stock(store)
+    assert store.delete_item(ids['ham'], "Ham")
+    assert not store.delete_item(ids['ham'], "Ham")
+    assert store.check_statistics() == []
+    assert category_counts(store) == {"Dairy": 7, "Bakery": 2}
+    assert action_counts(store) == {"add": 4, "delete": 1}
+
+def test_delete_items(store):
+    ids = stock(store)
+    assert sorted(store.delete_items([ids['milk'], ids['bread'], 9999])) == sorted([ids['milk'], ids['bread']])
+    assert store.check_statistics() == []
+    assert category_counts(store) == {"Dairy": 4, "Meat": 1}
+
+@pytest.mark.parametrize("units, dairy", [(2, 5), (3, 4), (5, 2), (7, 0)])
+def test_consume(store, units, dairy):
+    stock(store)
+    store.consume("Milk", "Dairy", units)
+    assert store.check_statistics() == []
+    assert category_counts(store).get("Dairy", 0) == dairy
+
+def test_consume_too_many_changes_nothing(store):
+    stock(store)
+    with pytest.raises(ValueError):
+        store.consume("Milk", "Dairy", 8)
+    assert store.check_statistics() == []
+    assert category_counts(store)["Dairy"] == 7
+
+def test_shift_expiry(store):
+    ids = stock(store)
+    store.shift_expiry([ids['milk'], ids['ham']], 7)
+    assert store.check_statistics() == []
+    assert store.statistics(TODAY)['expired'] == 0
+
+def test_recategorize_items(store):
+    ids = stock(store)
+    store.recategorize_items([ids['milk'], ids['ham']], "Fridge")
+    assert store.check_statistics() == []
+    assert category_counts(store) == {"Dairy": 4, "Fridge": 4, "Bakery": 2}
+
+def test_import_items(store):
+    stock(store)
+    expiry = (TODAY + timedelta(days=2)).isoformat()
+    records = [
+        (1, {'name': "Milk", 'category': "Dairy", 'expiry_date': expiry, 'quantity': "2"}),
+        (2, {'name': "Eggs", 'category': "Dairy", 'expiry_date': expiry, 'quantity': "12"}),
+        (3, {'name': "Eggs", 'category': "Dairy", 'expiry_date': expiry}),
+        (4, {'name': "Jam", 'expiry_date': "not a date"}),
+    ]
+    for read, imported, errors in store.import_items(iter(records), chunk_size=2):
+        pass
+    assert (read, imported, len(errors)) == (4, 3, 1)
+    assert store.check_statistics() == []
+    assert category_counts(store)["Dairy"] == 7 + 2 + 13
+
+
+def test_log_retention(store):
+    stock(store)
+    old = (TODAY - timedelta(days=100)).isoformat() + " 12:00:00"
+    with store.conn:
+        store.conn.executemany(LOG_INSERT_SQL, [("Milk", "consume", old, "Dairy", None, 1, None)] * 3 +
+                                               [("Ham", "delete", old, "Meat", None, 1, None)])
+    assert action_counts(store) == {"add": 4, "consume": 3, "delete": 1}
+    store.c.execute("PRAGMA schema_version")
+    schema_version = store.c.fetchone()[0]
+
+    assert store.apply_log_retention(TODAY, days=90) == 4
+    assert store.check_statistics() == []
+    assert action_counts(store) == {"add": 4}
+    # The delete trigger stayed in place rather than being swapped out
+    store.c.execute("PRAGMA schema_version")
+    assert store.c.fetchone()[0] == schema_version
+    store.c.execute("SELECT action, category, event_count FROM usage_daily ORDER BY action")
+    assert store.c.fetchall() == [("consume", "Dairy", 3), ("delete", "Meat", 1)]
+    assert store.apply_log_retention(TODAY, days=90) == 0
@@ -0,0 +1,159 @@
+"""Consumption and waste rates from the usage log, and forecasts built on them.
+
+Consumption is what consume() took plus lots deleted on or before their
+expiry date; waste is lots deleted after it. Both are kept per product (a
+name and category) and day in usage_product_daily, which update_daily_usage()
+brings up to date from the log events added since its last run only:
+usage_analytics_state holds the id of the last event read. Events logged
+before quantities and expiry dates were recorded count as one unit, and
+deletes among them are left out, as they cannot be told apart.
+
+Rates are units per day over the last RATE_WINDOW_DAYS days. The forecasts
+come from one SQL statement over every lot at once, with window functions
+for the running totals per product: each product's lots are used up first
+expired first out at its daily rate, which gives the units of every lot
+expected to expire unused and what to order to cover the next
+ORDER_HORIZON_DAYS days.
+"""
+import math
+
+RATE_WINDOW_DAYS = 28
+ORDER_HORIZON_DAYS = 7
+
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+# Units consumed and wasted by each usage_log event, and its day number
+# (days since 1970-01-01)
+EVENT_DAY_SQL = "CAST(julianday(substr(timestamp, 1, 10)) - 2440587.5 AS INTEGER)"
+CONSUMED_SQL = ("CASE WHEN action = 'consume' OR expiry_date >= substr(timestamp, 1, 10) "
+                "THEN COALESCE(quantity, 1) ELSE 0 END")
+WASTED_SQL = ("CASE WHEN action = 'delete' AND expiry_date < substr(timestamp, 1, 10) "
+              "THEN COALESCE(quantity, 1) ELSE 0 END")
+
+# Units per day of each product over the window ending on day :today
+RATES_SQL = '''SELECT name, category, SUM(consumed) * 1.0 / :window AS daily_use,
+                      SUM(wasted) * 1.0 / :window AS daily_waste
+               FROM usage_product_daily WHERE day > :today - :window AND day <= :today
+               GROUP BY name, category'''
+
+
+# Fold the usage_log events added since the last update into
+# usage_product_daily, within the caller's transaction. Returns the number
+# of product days written.
+def update_daily_usage(c):
+    c.execute("SELECT last_log_id FROM usage_analytics_state")
+    last_id = c.fetchone()[0]
+    c.execute("SELECT MAX(id) FROM usage_log")
+    newest = c.fetchone()[0]
+    if newest is None or newest <= last_id:
+        return 0
+    c.execute(f'''INSERT INTO usage_product_daily (name, category, day, consumed, wasted)
+                  SELECT COALESCE(item_name, ''), COALESCE(category, ''), {EVENT_DAY_SQL},
+                         SUM({CONSUMED_SQL}), SUM({WASTED_SQL})
+                  FROM usage_log
+                  WHERE id > ? AND id <= ? AND (action = 'consume'
+                        OR (action = 'delete' AND expiry_date GLOB '{ISO_DATE_GLOB}'))
+                  GROUP BY 1, 2, 3
+                  ON CONFLICT (day, name, category) DO UPDATE
+                  SET consumed = consumed + excluded.consumed, wasted = wasted + excluded.wasted''',
+              (last_id, newest))
+    written = c.rowcount
+    c.execute("UPDATE usage_analytics_state SET last_log_id = ?", (newest,))
+    return written
+
+# Call after deleting log events, within the same transaction. Once the
+# log is empty SQLite hands out ids from 1 again, so reading starts over.
+def reset_if_log_empty(c):
+    c.execute("SELECT 1 FROM usage_log LIMIT 1")
+    if c.fetchone() is None:
+        c.execute("UPDATE usage_analytics_state SET last_log_id = 0")
+
+# (category, units consumed per day, units wasted per day, share wasted or
+# None) over the window ending on day number `today`
+def category_rates(c, today, window_days=RATE_WINDOW_DAYS):
+    c.execute('''SELECT category, SUM(consumed) * 1.0 / :window, SUM(wasted) * 1.0 / :window,
+                        SUM(wasted) * 1.0 / NULLIF(SUM(consumed) + SUM(wasted), 0)
+                 FROM usage_product_daily WHERE day > :today - :window AND day <= :today
+                 GROUP BY category ORDER BY category''', {'today': today, 'window': window_days})
+    return c.fetchall()
+
+# (name, category, units consumed per day, units wasted per day, share
+# wasted or None), most consumed first
+def product_rates(c, today, window_days=RATE_WINDOW_DAYS, limit=None):
+    query = f'''SELECT name, category, daily_use, daily_waste,
+                       daily_waste / NULLIF(daily_use + daily_waste, 0)
+                FROM ({RATES_SQL}) ORDER BY daily_use DESC, name, category'''
+    params = {'today': today, 'window': window_days}
+    if limit is not None:
+        query += " LIMIT :limit"
+        params['limit'] = limit
+    c.execute(query, params)
+    return c.fetchall()
+
+# Fill the temp table projected_lots with the unexpired lots of every
+# product with a rate, in consume() order, and `used_through`: the units of
+# the lot and those before it expected to be used before they expire. With
+# D(j) the product's demand up to lot j's expiry day and Q(j) its quantity
+# through lot j, the units used through lot k follow
+# U(k) = min(D(k), U(k-1) + q(k)), which unrolls to
+# Q(k) + min(0, min over j <= k of D(j) - Q(j)): a running minimum. The
+# reports below read the table; run this first, within a transaction the
+# caller then ends. Returns the number of lots.
+def project_lots(c, expiry_day_sql, today, window_days=RATE_WINDOW_DAYS):
+    c.execute("CREATE TEMP TABLE IF NOT EXISTS projected_lots (id INTEGER, name TEXT, category TEXT, "
+              "expiry_date TEXT, expiry_day INTEGER, quantity INTEGER, daily_use REAL, used_through REAL, "
+              "unused REAL)")
+    c.execute("DELETE FROM projected_lots")
+    c.execute(f'''INSERT INTO projected_lots
+        WITH rates AS ({RATES_SQL}),
+        lots AS (
+            SELECT f.id, f.name, f.category, f.expiry_date, {expiry_day_sql} AS expiry_day, f.quantity,
+                   r.daily_use, r.daily_use * ({expiry_day_sql} - :today + 1) AS demand,
+                   SUM(f.quantity) OVER (PARTITION BY f.name, f.category
+                                         ORDER BY {expiry_day_sql}, f.id) AS through
+            FROM food_items f JOIN rates r ON r.name = f.name AND r.category = f.category
+            WHERE {expiry_day_sql} >= :today
+        ),
+        projected AS (
+            SELECT *, through + MIN(0, MIN(demand - through) OVER lot_order) AS used_through
+            FROM lots
+            WINDOW lot_order AS (PARTITION BY name, category ORDER BY expiry_day, id)
+        )
+        SELECT id, name, category, expiry_date, expiry_day, quantity, daily_use, used_through,
+               quantity - used_through + COALESCE(LAG(used_through) OVER lot_order, 0)
+        FROM projected
+        WINDOW lot_order AS (PARTITION BY name, category ORDER BY expiry_day, id)''',
+              {'today': today, 'window': window_days})
+    return c.rowcount
+
+# Lots expected to expire before they are used up, as (id, name, category,
+# expiry_date, quantity, units expected unused), soonest expiry first.
+# Only products with log events in the window are forecast. Needs
+# project_lots().
+def lots_at_risk(c, limit=None):
+    query = ("SELECT id, name, category, expiry_date, quantity, ROUND(unused, 1) FROM projected_lots "
+             "WHERE unused > 0.05 ORDER BY expiry_day, unused DESC, id")
+    params = []
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    c.execute(query, params)
+    return c.fetchall()
+
+# Products whose stock is not expected to last the next `horizon_days`,
+# as (name, category, units used per day, units in stock, units to
+# order), largest order first. Stock counts unexpired lots only, and only
+# the units expected to be used before they expire cover the demand.
+# Needs project_lots() for the same day and window.
+def order_suggestions(c, today, window_days=RATE_WINDOW_DAYS, horizon_days=ORDER_HORIZON_DAYS):
+    c.execute(f'''WITH rates AS ({RATES_SQL}),
+                  stock AS (SELECT name, category, SUM(quantity) AS in_stock, MAX(used_through) AS usable
+                            FROM projected_lots GROUP BY name, category)
+                  SELECT r.name, r.category, r.daily_use, COALESCE(s.in_stock, 0),
+                         r.daily_use * :horizon - COALESCE(s.usable, 0) AS shortfall
+                  FROM rates r LEFT JOIN stock s ON s.name = r.name AND s.category = r.category
+                  WHERE r.daily_use * :horizon - COALESCE(s.usable, 0) > 0.05
+                  ORDER BY shortfall DESC, r.name, r.category''',
+              {'today': today, 'window': window_days, 'horizon': horizon_days})
+    return [(name, category, daily_use, in_stock, math.ceil(shortfall - 1e-9))
+            for name, category, daily_use, in_stock, shortfall in c.fetchall()]
@@ -0,0 +1,73 @@
+import sqlite3
+import time
+from datetime import datetime
+
+# A batch is written once this many events are buffered, or once the oldest
+# buffered event is this old (checked by flush_if_due())
+LOG_FLUSH_ROWS = 200
+LOG_FLUSH_SECONDS = 5.0
+
+# Events kept in memory while the database cannot be written; the oldest
+# are dropped beyond this
+LOG_BUFFER_LIMIT = 10000
+
+
+LOG_INSERT_SQL = ("INSERT INTO usage_log (item_name, action, timestamp, category, item_id, quantity, expiry_date) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+# A usage_log row for LOG_INSERT_SQL, stamped now. quantity is the units
+# added, taken or deleted and expiry_date the lot's, for usage_analytics.
+def usage_event(item_name, action, category=None, item_id=None, quantity=None, expiry_date=None):
+    return (item_name, action, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), category, item_id,
+            quantity, expiry_date)
+
+
+class UsageLogWriter:
+    """Append-only writer for usage_log that buffers events.
+
+    Events are written in one executemany and commit per batch instead of
+    one commit per event. A failed batch stays buffered for the next flush.
+    Call flush() before closing the connection.
+    """
+
+    def __init__(self, conn, max_rows=LOG_FLUSH_ROWS, max_age=LOG_FLUSH_SECONDS,
+                 limit=LOG_BUFFER_LIMIT, clock=time.monotonic):
+        self.conn = conn
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.limit = limit
+        self.clock = clock
+        self.buffer = []        # usage_event() rows
+        self.first_at = None    # clock() when the oldest buffered event was added
+        self.dropped = 0
+
+    def add(self, item_name, action, category=None, item_id=None, quantity=None, expiry_date=None):
+        if not self.buffer:
+            self.first_at = self.clock()
+        self.buffer.append(usage_event(item_name, action, category, item_id, quantity, expiry_date))
+        if len(self.buffer) > self.limit:
+            del self.buffer[0]
+            self.dropped += 1
+
+    def due(self):
+        return bool(self.buffer) and (len(self.buffer) >= self.max_rows
+                                      or self.clock() - self.first_at >= self.max_age)
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    # Write the buffered events in one transaction; returns how many
+    def flush(self):
+        if not self.buffer:
+            return 0
+        rows = self.buffer
+        try:
+            self.conn.executemany(LOG_INSERT_SQL, rows)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self.buffer = []
+        self.first_at = None
+        return len(rows)